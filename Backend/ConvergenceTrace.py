@@ -0,0 +1,93 @@
+import collections
+import queue
+import threading
+
+
+class PyConvergenceTrace:
+    """
+    Convergence of a LogitSUE run, the last `size` iterations in a ring buffer
+
+    Attributes:
+        - rows: (iteration, NormD, CPU time, UE gap, relative gap) of the iterations kept, oldest first
+        - iterations: Number of iterations appended, including those dropped from the buffer
+    """
+    columns = ("iteration", "normD", "cpuTime", "ueGap", "relGap")
+
+    def __init__(self, size=4096):
+        self.rows = collections.deque(maxlen=size)
+        self.iterations = 0
+
+    def append(self, iteration, norm_d, cpu_time, ue_gap, rel_gap):
+        self.rows.append((iteration, float(norm_d), cpu_time, float(ue_gap), float(rel_gap)))
+        self.iterations += 1
+
+    @property
+    def dropped(self):
+        """
+        Number of first iterations no longer in the buffer
+        """
+        return self.iterations - len(self.rows)
+
+    def to_dict(self):
+        """
+        The trace as one list per column, e.g. to plot it
+        """
+        columns = list(zip(*self.rows)) or [()] * len(self.columns)
+        return {"dropped": self.dropped, **{name: list(column) for name, column in zip(self.columns, columns)}}
+
+    def text(self):
+        """
+        The trace as "K,NormD,CPUTime" lines, the format of the former output.txt
+        """
+        return "".join(f"{iteration},{norm_d},{cpu_time}\n" for iteration, norm_d, cpu_time, _, _ in self.rows)
+
+
+class PyTraceWriter:
+    """
+    Thread writing convergence traces to files off the solver threads
+
+    Traces are queued by write and written in batches: a batch writes every file once, with the
+    last trace queued for it, so a file that is behind only gets the latest trace.
+    """
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def write(self, path, trace):
+        """
+        Queue the write of a finished trace to path, replacing the file
+        """
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+                self.thread.start()
+        self.queue.put((path, trace))
+
+    def flush(self):
+        """
+        Wait until every trace queued so far is written
+        """
+        self.queue.join()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while not self.queue.empty():
+                batch.append(self.queue.get())
+            latest = {}
+            for path, trace in batch:
+                latest[path] = trace
+            for path, trace in latest.items():
+                try:
+                    with open(path, "w") as f:
+                        f.write(trace.text())
+                except OSError as error:
+                    print(f"[Warning] convergence trace not written to {path}: {error}")
+            for _ in batch:
+                self.queue.task_done()
+
+
+# Writer of this process, see PyNetwork.output_path
+trace_writer = PyTraceWriter()
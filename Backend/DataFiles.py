@@ -0,0 +1,114 @@
+import warnings
+import numpy as np
+
+
+def read_columns(data_path, columns):
+    """
+    Parse a tab separated data file in one pass
+
+    Parameters:
+        - data_path: Path to the file
+        - columns: {column index: dtype} of the columns to read, the other columns are skipped
+
+    Blank lines are skipped. A malformed value or a missing column raises a ValueError naming
+    the file and the row.
+
+    Return:
+        - One array per column, in the order of columns
+    """
+    dtype = [(f"c{col}", col_dtype) for col, col_dtype in columns.items()]
+    with warnings.catch_warnings():
+        # An empty file is an empty network
+        warnings.filterwarnings("ignore", message="loadtxt: input contained no data")
+        try:
+            table = np.loadtxt(data_path, delimiter="\t", dtype=dtype, usecols=list(columns), ndmin=1)
+        except ValueError as error:
+            raise ValueError(f"{data_path}: {error}") from None
+    return [table[name] for name, _ in dtype]
+
+
+def check_ids(ids, count, data_path, what, rows=None):
+    """
+    Raise a ValueError naming the first row of a data file that refers to an ID outside 1..count
+
+        - ids: IDs read from the file, starting from one
+        - what: Name of the IDs in the message
+        - rows: Row of each ID in the file, starting from zero, the index of the ID by default
+    """
+    bad = np.flatnonzero((ids < 1) | (ids > count))
+    if len(bad) > 0:
+        row = bad[0] if rows is None else rows[bad[0]]
+        raise ValueError(f"{data_path}: {what} {ids[bad[0]]} at row {row + 1} is not between 1 and {count}")
+
+
+def read_path_file(data_path, n_od_pairs, in_node_ids, out_node_ids):
+    """
+    Parse a path file in one pass
+
+    Parameters:
+        - data_path: Path to the file
+        - n_od_pairs: Number of OD pairs the file may refer to
+        - in_node_ids, out_node_ids: Starting and ending node ID of each segment
+
+    The file has, for every OD pair, a header row "OD pair ID, origin, destination, number of
+    paths" followed by one row of node IDs per path, all starting from one. Each step between two
+    nodes becomes the first segment joining them, steps without a segment are dropped.
+
+    Return:
+        - links, offsets: Segments of all paths, those of path i are links[offsets[i]:offsets[i+1]]
+        - od_pair_id: OD pair ID of each path, starting from zero
+    """
+    with open(data_path, "rb") as f:
+        data = f.read()
+    try:
+        values = np.array(data.split(), dtype=np.int64)
+    except ValueError as error:
+        raise ValueError(f"{data_path}: {error}") from None
+    # Number of values of each non-blank row, from the byte offsets of the values
+    raw = np.frombuffer(data, dtype=np.uint8)
+    space = np.isin(raw, np.frombuffer(b" \t\r\n\v\f", dtype=np.uint8))
+    value_start = np.flatnonzero(~space & np.concatenate([[True], space[:-1]]))
+    _, lengths = np.unique(np.cumsum(raw == ord("\n"))[value_start], return_counts=True)
+    n_rows = len(lengths)
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+
+    # Header rows, each followed by the rows of its paths
+    header_rows, od_ids, path_counts = [], [], []
+    row = 0
+    while row < n_rows:
+        if lengths[row] < 4 or values[starts[row] + 3] < 0:
+            raise ValueError(f"{data_path}: row {row + 1} is not an OD pair header")
+        header_rows.append(row)
+        od_ids.append(int(values[starts[row]]))
+        path_counts.append(int(values[starts[row] + 3]))
+        row += 1 + path_counts[-1]
+    if row > n_rows:
+        raise ValueError(f"{data_path}: the paths of the last OD pair are missing")
+    od_ids = np.array(od_ids, dtype=np.int64)
+    check_ids(od_ids, n_od_pairs, data_path, "OD pair", header_rows)
+
+    is_path = np.ones(n_rows, dtype=bool)
+    is_path[header_rows] = False
+    row_of_value = np.repeat(np.arange(n_rows), lengths)
+    path_of_row = np.cumsum(is_path) - 1
+
+    # Steps between consecutive nodes of the same path row
+    step = np.flatnonzero((row_of_value[:-1] == row_of_value[1:]) & is_path[row_of_value[:-1]])
+    node_base = int(max(in_node_ids.max(initial=0), out_node_ids.max(initial=0))) + 1
+    path_value = is_path[row_of_value]
+    check_ids(values[path_value], node_base, data_path, "Node", row_of_value[path_value])
+    step_keys = (values[step] - 1) * node_base + (values[step + 1] - 1)
+
+    # First segment of each (starting node, ending node) pair
+    link_keys, first_link = np.unique(
+        np.asarray(in_node_ids, dtype=np.int64) * node_base + np.asarray(out_node_ids, dtype=np.int64),
+        return_index=True)
+    pos = np.minimum(np.searchsorted(link_keys, step_keys), max(len(link_keys) - 1, 0))
+    found = link_keys[pos] == step_keys if len(link_keys) > 0 else np.zeros(len(step_keys), dtype=bool)
+
+    n_path = int(is_path.sum())
+    links = first_link[pos[found]].astype(np.int32)
+    offsets = np.zeros(n_path + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(path_of_row[row_of_value[step[found]]], minlength=n_path))
+    od_pair_id = np.repeat(od_ids - 1, path_counts)
+    return links, offsets, od_pair_id
@@ -0,0 +1,287 @@
+import numpy as np
+
+
+class PyGlobalRegistry:
+    """
+    Nodes and segments shared by all networks, each with a stable global ID
+
+    Attributes:
+        - nodes: [lat, lon] of every global node, indexed by global ID
+        - links: [in node global ID, out node global ID] of every global segment, indexed by global ID
+
+    The lists keep the registration order, which is the order of `globalNodes` / `globalLinks` in
+    the responses. Lookups go through dicts keyed on (lat, lon) and (in, out), so registering the
+    new entities of a network costs O(new entities) instead of a scan of the lists.
+    """
+    __slots__ = ("nodes", "links", "node_index", "link_index")
+
+    def __init__(self):
+        self.nodes = []
+        self.links = []
+        self.node_index = {}
+        self.link_index = {}
+
+    def node_id(self, lat, lon):
+        """
+        Global ID of the node at (lat, lon), registering it if it is new
+        """
+        key = (lat, lon)
+        global_id = self.node_index.get(key)
+        if global_id is None:
+            global_id = len(self.nodes)
+            self.node_index[key] = global_id
+            self.nodes.append([lat, lon])
+        return global_id
+
+    def link_id(self, in_node, out_node):
+        """
+        Global ID of the segment between the global nodes in_node and out_node, registering it if it is new
+        """
+        key = (in_node, out_node)
+        global_id = self.link_index.get(key)
+        if global_id is None:
+            global_id = len(self.links)
+            self.link_index[key] = global_id
+            self.links.append([in_node, out_node])
+        return global_id
+
+
+class PyGlobalLinkStats:
+    """
+    Minimum, maximum and mean of the segment values over all networks, per global segment
+
+    Attributes:
+        - contributions: {network: (global segment IDs, values, fingerprint)} as last added, values has
+          one row per stat
+        - count: Number of segments of all networks per global segment
+        - sums: Sum of the values per stat and global segment
+        - minimum / maximum: Minimum / maximum of the values per stat and global segment
+        - values: {value: count} per stat and global segment, to find the next minimum / maximum
+          when the current one is retracted
+        - version: Bumped whenever the aggregates change
+
+    Only the networks passed as changed, new networks and removed networks are subtracted and
+    re-added, so an edit costs O(segments of the edited network) whatever the number of networks.
+    """
+    stats = ("fftt", "travelTime", "speed", "flow", "capacity", "flowRatio")
+
+    def __init__(self):
+        self.contributions = {}
+        self.count = np.zeros(0, dtype=np.int64)
+        self.sums = np.zeros((len(self.stats), 0))
+        self.minimum = np.zeros((len(self.stats), 0))
+        self.maximum = np.zeros((len(self.stats), 0))
+        self.values = [[] for _ in self.stats]
+        self.version = 0
+
+    @staticmethod
+    def fingerprint(network):
+        """
+        Objects and version that change whenever the segment values of a network change
+        """
+        return (network.links_flow, network.m_link, network.m_link.version)
+
+    @classmethod
+    def is_current(cls, contribution, network):
+        flow_list, link_table, version = cls.fingerprint(network)
+        return (contribution[2][0] is flow_list and contribution[2][1] is link_table
+                and contribution[2][2] == version)
+
+    @classmethod
+    def link_values(cls, network):
+        """
+        Global segment IDs and the values of every stat of the segments of a network, and its fingerprint
+
+        Segments without a global ID yet (an edit that failed before _global_info_set) are left out.
+        """
+        link_table = network.m_link
+        fftt = link_table.free_flow_travel_time
+        travel_time = link_table.travel_time
+        capacity = link_table.capacity
+        flow = np.asarray(network.links_flow, dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = np.array([fftt, travel_time, fftt / travel_time, flow, capacity, flow / capacity])
+        registered = link_table.global_id >= 0
+        return link_table.global_id[registered], values[:, registered], cls.fingerprint(network)
+
+    def resize(self, n_global_link):
+        """
+        Make room for global segments registered since the last update
+        """
+        grow = n_global_link - len(self.count)
+        if grow <= 0:
+            return
+        self.version += 1
+        self.count = np.concatenate((self.count, np.zeros(grow, dtype=np.int64)))
+        self.sums = np.hstack((self.sums, np.zeros((len(self.stats), grow))))
+        self.minimum = np.hstack((self.minimum, np.full((len(self.stats), grow), np.inf)))
+        self.maximum = np.hstack((self.maximum, np.full((len(self.stats), grow), -np.inf)))
+        for stat_values in self.values:
+            stat_values.extend({} for _ in range(grow))
+
+    def rebuild(self, networks, n_global_link):
+        """
+        Recompute all aggregates from scratch, vectorized over the segments of all networks
+        """
+        self.contributions = {tmpNetwork: self.link_values(tmpNetwork) for tmpNetwork in networks}
+        self.version += 1
+        self.count = np.zeros(0, dtype=np.int64)
+        self.sums = np.zeros((len(self.stats), 0))
+        self.minimum = np.zeros((len(self.stats), 0))
+        self.maximum = np.zeros((len(self.stats), 0))
+        self.values = [[] for _ in self.stats]
+        self.resize(n_global_link)
+        if not self.contributions:
+            return
+
+        global_ids = np.concatenate([ids for ids, _, _ in self.contributions.values()])
+        values = np.hstack([vals for _, vals, _ in self.contributions.values()])
+        self.count = np.bincount(global_ids, minlength=n_global_link)
+        for s in range(len(self.stats)):
+            self.sums[s] = np.bincount(global_ids, weights=values[s], minlength=n_global_link)
+            np.minimum.at(self.minimum[s], global_ids, values[s])
+            np.maximum.at(self.maximum[s], global_ids, values[s])
+            pairs, counts = np.unique(np.column_stack((global_ids, values[s])), axis=0, return_counts=True)
+            stat_values = self.values[s]
+            for (global_id, value), count in zip(pairs.tolist(), counts.tolist()):
+                stat_values[int(global_id)][value] = count
+
+    def update(self, networks, changed, n_global_link):
+        """
+        Bring the aggregates up to date
+
+            - networks: All current networks
+            - changed: Networks whose segments changed since the last update
+            - n_global_link: Number of global segments
+        """
+        if not self.contributions:
+            self.rebuild(networks, n_global_link)
+            return
+        self.resize(n_global_link)
+
+        current = set(networks)
+        replaced = [(tmpNetwork, self.contributions[tmpNetwork], None)
+                    for tmpNetwork in self.contributions if tmpNetwork not in current]
+        for tmpNetwork in networks:
+            old = self.contributions.get(tmpNetwork)
+            # Every solve replaces links_flow and every edit changes the segment table, so a network
+            # solved or edited without being passed as changed is caught too
+            if old is None or tmpNetwork in changed or not self.is_current(old, tmpNetwork):
+                replaced.append((tmpNetwork, old, self.link_values(tmpNetwork)))
+
+        # An infinite or NaN value cannot be retracted from the sums (inf - inf is NaN) nor found again
+        # among the values, so the aggregates are recomputed whenever one comes or goes
+        if not all(self.finite(old) and self.finite(new) for _, old, new in replaced):
+            self.rebuild(networks, n_global_link)
+            return
+        for tmpNetwork, old, new in replaced:
+            self._apply(old, new)
+            if new is None:
+                del self.contributions[tmpNetwork]
+            else:
+                self.contributions[tmpNetwork] = new
+            self.version += 1
+
+    @staticmethod
+    def finite(contribution):
+        """
+        Whether all values of a contribution (see link_values) are finite, True for None
+        """
+        return contribution is None or bool(np.isfinite(contribution[1]).all())
+
+    def _apply(self, old, new):
+        """
+        Replace the contribution old of a network by new, either can be None
+        """
+        n_global_link = len(self.count)
+        empty = (np.zeros(0, dtype=np.int64), np.zeros((len(self.stats), 0)), None)
+        old_ids, old_values, _ = old if old is not None else empty
+        new_ids, new_values, _ = new if new is not None else empty
+        self.count += np.bincount(new_ids, minlength=n_global_link) - np.bincount(old_ids, minlength=n_global_link)
+
+        for s in range(len(self.stats)):
+            # Segments whose global ID and value are unchanged cancel out
+            if len(old_ids) == len(new_ids):
+                removed = added = np.flatnonzero((old_ids != new_ids) | (old_values[s] != new_values[s]))
+            else:
+                removed, added = np.arange(len(old_ids)), np.arange(len(new_ids))
+            removed_ids, removed_values = old_ids[removed], old_values[s][removed]
+            added_ids, added_values = new_ids[added], new_values[s][added]
+            self.sums[s] += np.bincount(added_ids, weights=added_values, minlength=n_global_link)
+            self.sums[s] -= np.bincount(removed_ids, weights=removed_values, minlength=n_global_link)
+
+            stat_values = self.values[s]
+            minimum = self.minimum[s]
+            maximum = self.maximum[s]
+            retracted = set()
+            for global_id, value in zip(removed_ids.tolist(), removed_values.tolist()):
+                counts = stat_values[global_id]
+                count = counts.get(value, 0)
+                if count > 1:
+                    counts[value] = count - 1
+                    continue
+                counts.pop(value, None)
+                if value == minimum[global_id] or value == maximum[global_id]:
+                    retracted.add(global_id)
+            for global_id, value in zip(added_ids.tolist(), added_values.tolist()):
+                counts = stat_values[global_id]
+                counts[value] = counts.get(value, 0) + 1
+                if value < minimum[global_id]:
+                    minimum[global_id] = value
+                if value > maximum[global_id]:
+                    maximum[global_id] = value
+            for global_id in retracted:
+                counts = stat_values[global_id]
+                minimum[global_id] = min(counts) if counts else np.inf
+                maximum[global_id] = max(counts) if counts else -np.inf
+
+    def frame(self, networks, stats, n_global_link, out=None):
+        """
+        Values of the segments of every network aligned on the global segment IDs
+
+            - stats: Names of the stats to get, see PyGlobalLinkStats.stats
+            - out: Array [stat, network, global segment] to fill, a new float32 one if None
+
+        NaN where a network has no segment on a global segment, the mean where it has several. The
+        values come from the contributions kept for the updates, networks changed since are read again.
+        """
+        if out is None:
+            out = np.empty((len(stats), len(networks), n_global_link), dtype=np.float32)
+        out[...] = np.nan
+        stat_rows = [self.stats.index(stat) for stat in stats]
+        for row, tmpNetwork in enumerate(networks):
+            contribution = self.contributions.get(tmpNetwork)
+            if contribution is None or not self.is_current(contribution, tmpNetwork):
+                contribution = self.link_values(tmpNetwork)
+            global_ids, values, _ = contribution
+            count = np.bincount(global_ids, minlength=n_global_link)
+            if count.max(initial=0) <= 1:
+                out[:, row, global_ids] = values[stat_rows]
+                continue
+            present = count > 0
+            for s, stat_row in enumerate(stat_rows):
+                sums = np.bincount(global_ids, weights=values[stat_row], minlength=n_global_link)
+                out[s, row, present] = sums[present] / count[present]
+        return out
+
+    def table(self):
+        """
+        The aggregates as an array [stat, global segment, (min, max, mean)], 0 for global segments no network has
+        """
+        table = np.stack((self.minimum, self.maximum, self.sums / np.maximum(self.count, 1)), axis=-1)
+        table[:, self.count == 0] = 0
+        return table
+
+    def scope(self):
+        """
+        The aggregates as {stat: [[min, max, mean], ...]}, [0, 0, 0] for global segments no network has
+        """
+        empty = (self.count == 0).nonzero()[0].tolist()
+        table = self.table().tolist()
+        scope = {}
+        for s, stat in enumerate(self.stats):
+            rows = table[s]
+            for global_id in empty:
+                rows[global_id] = [0, 0, 0]
+            scope[stat] = rows
+        return scope
@@ -0,0 +1,188 @@
+import bisect
+import math
+import threading
+import time
+
+
+class PyPhaseTimer:
+    """
+    Seconds spent in each phase of a computation
+
+    Every lap closes the phase that started at the previous lap (or at start), so timing a loop
+    costs one clock read per phase.
+
+    Attributes:
+        - seconds: {phase: seconds}, in the order the phases were first seen
+    """
+
+    def __init__(self):
+        self.seconds = {}
+        self.last = time.perf_counter()
+
+    def start(self):
+        """
+        Start the next phase now, leaving the time since the last lap out of every phase
+        """
+        self.last = time.perf_counter()
+
+    def lap(self, phase):
+        """
+        Add the time since the last lap to phase
+        """
+        now = time.perf_counter()
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + now - self.last
+        self.last = now
+
+
+class PyMetrics:
+    """
+    Counters and histograms of a process, rendered in the Prometheus text format
+
+    Attributes:
+        - families: {name: (type, help)} of every metric, see family
+        - counters: {(name, labels): value}, labels being a sorted tuple of (label, value)
+        - histograms: {(name, labels): [count per bucket, sum, count]}
+        - buckets: {name: upper bounds of the buckets of a histogram}
+        - lock: Held while the metrics are changed or rendered, requests and solves run in threads
+    """
+    latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+    size_buckets = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+
+    def __init__(self):
+        self.families = {}
+        self.counters = {}
+        self.histograms = {}
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+        self.family("trasculptor_solves_total", "counter", "LogitSUE runs, by solver mode and stop reason")
+        self.family("trasculptor_solve_iterations_total", "counter", "LogitSUE iterations")
+        self.family("trasculptor_solve_paths_total", "counter", "Paths of the networks solved, summed over the solves")
+        self.family("trasculptor_solve_phase_seconds_total", "counter", "Seconds of LogitSUE spent in each phase")
+        self.family("trasculptor_solve_seconds", "histogram", "Duration of a LogitSUE run", self.latency_buckets)
+        self.family("trasculptor_path_updates_total", "counter", "Path set updates, by kind (full or incremental)")
+        self.family("trasculptor_path_update_od_pairs_total", "counter", "OD pairs whose paths were searched")
+        self.family("trasculptor_path_update_seconds", "histogram", "Duration of a path set update",
+                    self.latency_buckets)
+        self.family("trasculptor_requests_total", "counter", "HTTP requests, by route, method and status")
+        self.family("trasculptor_request_seconds", "histogram", "Latency of an HTTP request, until its response is built",
+                    self.latency_buckets)
+        self.family("trasculptor_response_bytes", "histogram", "Body size of an HTTP response, streams excluded",
+                    self.size_buckets)
+
+    def family(self, name, metric_type, help_text, buckets=None):
+        """
+        Declare a metric, buckets being the upper bounds of the buckets of a histogram
+        """
+        self.families[name] = (metric_type, help_text)
+        if buckets is not None:
+            self.buckets[name] = tuple(buckets)
+
+    def inc(self, name, value=1, **labels):
+        """
+        Add value to a counter
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """
+        Count value in the buckets of a histogram
+        """
+        key = (name, tuple(sorted(labels.items())))
+        buckets = self.buckets[name]
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * len(buckets), 0.0, 0]
+            bucket = bisect.bisect_left(buckets, value)
+            if bucket < len(buckets):
+                histogram[0][bucket] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def observe_solve(self, report):
+        """
+        Record a LogitSUE run from its report, see PyNetwork._set_solve_report
+        """
+        self.inc("trasculptor_solves_total", mode=report["solverMode"], stop_reason=report["stopReason"])
+        self.inc("trasculptor_solve_iterations_total", report["iterations"], mode=report["solverMode"])
+        self.inc("trasculptor_solve_paths_total", report["paths"])
+        for phase, seconds in report["phases"].items():
+            self.inc("trasculptor_solve_phase_seconds_total", seconds, mode=report["solverMode"], phase=phase)
+        self.observe("trasculptor_solve_seconds", report["cpuTime"], mode=report["solverMode"])
+
+    def observe_path_update(self, kind, od_pairs, seconds):
+        """
+        Record a path set update, kind being "full" or "incremental"
+        """
+        self.inc("trasculptor_path_updates_total", kind=kind)
+        self.inc("trasculptor_path_update_od_pairs_total", od_pairs, kind=kind)
+        self.observe("trasculptor_path_update_seconds", seconds, kind=kind)
+
+    def observe_request(self, route, method, status, seconds, size=None):
+        """
+        Record an HTTP request, size being the body size of its response, None for a stream
+        """
+        self.inc("trasculptor_requests_total", route=route, method=method, status=str(status))
+        self.observe("trasculptor_request_seconds", seconds, route=route)
+        if size is not None:
+            self.observe("trasculptor_response_bytes", size, route=route)
+
+    @staticmethod
+    def _sample(name, labels, value):
+        if labels:
+            label_text = ",".join(f'{label}="{_escape(label_value)}"' for label, label_value in labels)
+            name = f"{name}{{{label_text}}}"
+        return f"{name} {_number(value)}"
+
+    def render(self, gauges=()):
+        """
+        The metrics in the Prometheus text format
+
+            - gauges: Extra (name, help, [(labels dict, value)]) gauges, e.g. read from the networks when scraped
+        """
+        lines = []
+        with self.lock:
+            for name, (metric_type, help_text) in self.families.items():
+                counters = [(labels, value) for (counter, labels), value in self.counters.items() if counter == name]
+                histograms = [(labels, histogram) for (counter, labels), histogram in self.histograms.items()
+                              if counter == name]
+                if not counters and not histograms:
+                    continue
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in counters:
+                    lines.append(self._sample(name, labels, value))
+                for labels, (bucket_counts, total, count) in histograms:
+                    cumulative = 0
+                    for bound, bucket_count in zip(self.buckets[name], bucket_counts):
+                        cumulative += bucket_count
+                        lines.append(self._sample(f"{name}_bucket", labels + (("le", _number(bound)),), cumulative))
+                    lines.append(self._sample(f"{name}_bucket", labels + (("le", "+Inf"),), count))
+                    lines.append(self._sample(f"{name}_sum", labels, total))
+                    lines.append(self._sample(f"{name}_count", labels, count))
+        for name, help_text, samples in gauges:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                lines.append(self._sample(name, tuple(sorted(labels.items())), value))
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
+
+
+# Metrics of this process, filled by the networks and by the server. The worker processes of
+# sweeps have their own, which are not collected.
+metrics = PyMetrics()
@@ -1,74 +1,22 @@
+import logging
 import math
 import time
+import copy
+import hashlib
 import os
+import shutil
+import tempfile
 import numpy as np
 import tqdm
+from DataFiles import read_columns, check_ids, read_path_file
+from SolverConfig import PySolverConfig
+from Metrics import PyPhaseTimer, metrics
+from ConvergenceTrace import PyConvergenceTrace, trace_writer
+from ShortestPath import build_csr_adjacency, dijkstra, distance_bounds, multi_source_dijkstra, k_shortest_paths
+from NetworkCore import (PyNode, PyLink, PyPath, PyNodeTable, PyLinkTable, PyPathTable, PyLinkNodeDemand, bind_topology,
+                         deletion_remap)
 
-class PyNode:
-    """
-    Node
-
-    Attributes:
-        - id: The node's ID, starting from zero;
-        - position_x: The X coordinate of the node;
-        - position_y: The Y coordinate of the node;
-        - origin_id: The ID of the corresponding origin node, -1 indicates it is not an origin;
-        - incoming_link: Set of segment IDs that enter the node;
-        - outgoing_link: Set of segment IDs that leave the node;
-
-        - global_id: A unique ID across all global networks
-        - is_od: Whether it is part of an OD pair
-        - lon: Longitude
-        - lat: Latitude
-        - binary_ways: Whether it can only lead to two nodes
-    """
-    def __init__(self) -> None:
-        self.id = 0  # The node's ID, starting from 0
-        self.position_x = 0.0  # The X coordinate of the node
-        self.position_y = 0.0  # The Y coordinate of the node
-        # The ID of the corresponding origin node, -1 indicates it is not an origin
-        self.origin_id = -1
-        self.incoming_link = []  # Set of segment IDs that enter the node
-        self.outgoing_link = []  # Set of segment IDs that leave the node
-
-        # Longitude and Latitude
-        self.lon = 0  # Longitude
-        self.lat = 0  # Latitude
-
-        # Global ID
-        self.global_id = -1
-        self.is_od = False
-        self.binary_ways = True
-
-
-class PyLink:
-    """
-    Segment
-
-    Attributes:
-        - id: The segment's ID, starting from zero
-        - p_in_node: The starting node of the segment
-        - p_out_node: The ending node of the segment
-        - free_flow_travel_time: Free flow travel time
-        - travel_time: Travel time
-        - capacity: The capacity of the segment
-        - alpha: BPR function parameter, typically set to 0.15
-        - power: BPR function parameter, typically set to 4.0
-        - od_demand_satisfied: Demand satisfied for OD pairs, an array containing the total demand satisfied for each node as origin and destination
-        - global_id: A unique ID across all global networks
-    """
-    def __init__(self) -> None:
-        self.id = 0  # The segment's ID, starting from zero
-        self.p_in_node = None  # The starting node of the segment
-        self.p_out_node = None  # The ending node of the segment
-        self.free_flow_travel_time = 0.0  # Free flow travel time
-        self.travel_time = 0.0  # Travel time
-        self.capacity = 0.0  # The capacity of the segment
-        self.alpha = 0.15  # BPR function parameter, typically set to 0.15
-        self.power = 4.0  # BPR function parameter, typically set to 4.0
-
-        self.global_id = -1
-        self.od_demand_satisfied = []
+logger = logging.getLogger(__name__)
 
 class PyODPairs:
     """
@@ -82,6 +30,8 @@ class PyODPairs:
         - p_od_path: Set of paths between OD pairs
         - choice_prob: Probability of all paths being chosen between OD pairs
     """
+    __slots__ = ("id", "p_od_node", "od_demand", "m_n_od_path", "p_od_path", "choice_prob")
+
     def __init__(self):
         self.id = 0  # The node's ID, starting from zero
         self.p_od_node = []  # List of OD pair starting and ending points [O, D]
@@ -91,23 +41,226 @@ class PyODPairs:
         self.choice_prob = []  # Probability of all paths being chosen between OD pairs
 
 
-class PyPath:
+class PyPathIncidence:
+    """
+    Path set of a network compiled into a CSR path x link incidence matrix
+
+    Rows are the paths grouped by OD pair, so the rows of OD pair k are the
+    segment od_offsets[k]:od_offsets[k+1].
+
+    Attributes:
+        - path_ids: Path ID of each row
+        - indptr: Row offsets, the links of row i are indices[indptr[i]:indptr[i+1]]
+        - indices: Segment IDs of all rows
+        - row_of_entry: Row index of each entry in indices
+        - od_offsets: Row offsets of each OD pair
+        - od_of_row: OD pair index of each row
+        - od_demand: Demand of each OD pair
+        - seg_starts: Start row of each OD pair that has paths
+        - seg_of_row: Index into seg_starts of each row
+        - n_row: Number of rows (paths)
+        - n_link: Number of segments (columns)
+    """
+    def __init__(self, network):
+        path_ids = []
+        od_offsets = [0]
+        for od_pair in network.m_od_pairs:
+            path_ids.extend(od_pair.p_od_path)
+            od_offsets.append(len(path_ids))
+
+        self.path_ids = np.array(path_ids, dtype=np.int64)
+        row_start = network.m_path.offsets[self.path_ids]
+        row_len = network.m_path.offsets[self.path_ids + 1] - row_start
+        self.indptr = np.zeros(len(path_ids) + 1, dtype=np.int64)
+        self.indptr[1:] = np.cumsum(row_len)
+        self.indices = network.m_path.links[
+            np.repeat(row_start - self.indptr[:-1], row_len) + np.arange(self.indptr[-1])].astype(np.int64)
+        self.n_row = len(path_ids)
+        self.n_link = network.m_n_link
+        self.row_of_entry = np.repeat(np.arange(self.n_row), row_len)
+
+        self.od_offsets = np.array(od_offsets, dtype=np.int64)
+        self.od_of_row = np.repeat(np.arange(network.m_n_od_pairs), np.diff(self.od_offsets))
+        self.od_demand = np.array([od_pair.od_demand for od_pair in network.m_od_pairs], dtype=float)
+
+        # Start row of every non-empty OD segment, used by the segmented reductions
+        non_empty = np.diff(self.od_offsets) > 0
+        self.seg_starts = self.od_offsets[:-1][non_empty]
+        self.seg_of_row = np.cumsum(non_empty)[self.od_of_row] - 1
+
+        if self.indices.size and self.indices.max() >= self.n_link:
+            raise ValueError(f"path segment {self.indices.max()} out of range for {self.n_link} segments")
+
+    def path_cost(self, link_cost):
+        """
+        Cost of each row: the sum of the costs of its segments
+        """
+        return np.bincount(self.row_of_entry, weights=link_cost[self.indices], minlength=self.n_row)
+
+    def choice_prob(self, path_cost, theta):
+        """
+        Logit choice probability of each row, a log-sum-exp softmax over each OD segment
+        """
+        utility = -theta * path_cost
+        if self.n_row == 0:
+            return utility
+
+        seg_max = np.maximum.reduceat(utility, self.seg_starts)[self.seg_of_row]
+        with np.errstate(invalid='ignore'):
+            prob = np.exp(utility - seg_max)
+        prob[np.isnan(prob)] = 0
+        return prob / np.add.reduceat(prob, self.seg_starts)[self.seg_of_row]
+
+    def link_flow(self, path_flow):
+        """
+        Load the flow of each row onto its segments
+        """
+        return np.bincount(self.indices, weights=path_flow[self.row_of_entry], minlength=self.n_link)
+
+
+class PyPathManager:
     """
-    Path
+    Incremental maintenance of the path set
+
+    compute_path_bfs selects the paths of every OD pair. After an edit, only the OD pairs the
+    edit can affect need to be searched again:
+        - a deleted segment, or one whose fftt changed, affects the OD pairs whose search found a
+          path using it;
+        - a new segment, or one whose fftt changed, affects the OD pairs with a path through it
+          no longer than the path that stopped their selection (see PyNetwork._od_path_search).
+    All other OD pairs would get exactly the same paths from a full computation.
 
     Attributes:
-        - id: The path's ID, starting from zero
-        - link_in_path: Set of segments in the path
-        - path_flow: Flow of the path
-        - cost_of_path: Cost of the path
-        - od_pair_id: ID of the associated OD pair
+        - ready: Whether the index was built by a full path computation
+        - hit_links: Segment IDs used by the paths found (one entry per OD pair and segment)
+        - hit_od: OD pair ID of each entry of hit_links
+        - len_cap: Length of the path that stopped the selection of each OD pair, inf if its search ran out of paths
+        - dirty_od: OD pairs to search again
+        - changed_links: Segments added or with a modified fftt since the last update
+        - link_remap: Current ID of every segment ID of the paths, -1 for the deleted segments,
+          None if no segment was deleted since the last update
     """
     def __init__(self):
-        self.id = 0  # The path's ID, starting from zero
-        self.link_in_path = []  # Set of segments in the path
-        self.path_flow = 0.0  # Flow of the path
-        self.cost_of_path = 0.0  # Cost of the path
-        self.od_pair_id = -1  # ID of the associated OD pair
+        self.ready = False
+        self.hit_links = np.array([], dtype=np.int64)
+        self.hit_od = np.array([], dtype=np.int64)
+        self.len_cap = np.array([])
+        self.dirty_od = set()
+        self.changed_links = []
+        self.link_remap = None
+
+    @staticmethod
+    def _flatten(od_ids, searches):
+        """
+        Flat index entries of the search results of some OD pairs
+        """
+        hit_links = np.array([link for search in searches for link in search[1]], dtype=np.int64)
+        hit_od = np.repeat(np.array(od_ids, dtype=np.int64), [len(search[1]) for search in searches])
+        return hit_links, hit_od
+
+    def reset(self, searches):
+        """
+        Rebuild the index after a full path computation
+
+            - searches: Result of PyNetwork._od_path_search for every OD pair
+        """
+        self.hit_links, self.hit_od = self._flatten(range(len(searches)), searches)
+        self.len_cap = np.array([search[2] for search in searches], dtype=float)
+        self.dirty_od = set()
+        self.changed_links = []
+        self.link_remap = None
+        self.ready = True
+
+    def replace(self, od_ids, searches):
+        """
+        Replace the index entries of enumerated OD pairs and clear the recorded edits
+
+            - od_ids: IDs of the enumerated OD pairs
+            - searches: Result of PyNetwork._od_path_search for each of them
+        """
+        hit_links, hit_od = self._flatten(od_ids, searches)
+        keep = ~np.isin(self.hit_od, od_ids)
+        self.hit_links = np.concatenate([self.hit_links[keep], hit_links])
+        self.hit_od = np.concatenate([self.hit_od[keep], hit_od])
+        self.len_cap[od_ids] = [search[2] for search in searches]
+        self.dirty_od = set()
+        self.changed_links = []
+        self.link_remap = None
+
+    def od_pairs_using_link(self, link_id):
+        """
+        IDs of the OD pairs whose searched paths use a segment
+        """
+        return np.unique(self.hit_od[self.hit_links == link_id])
+
+    def links_deleted(self, remap):
+        """
+        Record the deletion of segments
+
+            - remap: New ID of every segment ID before the deletion, -1 for the deleted segments
+        """
+        if self.link_remap is None:
+            self.link_remap = remap
+        else:
+            self.link_remap = np.where(self.link_remap >= 0, remap[np.maximum(self.link_remap, 0)], -1)
+        if not self.ready:
+            return
+        hit_links = remap[self.hit_links]
+        self.dirty_od.update(np.unique(self.hit_od[hit_links < 0]).tolist())
+        keep = hit_links >= 0
+        self.hit_links = hit_links[keep]
+        self.hit_od = self.hit_od[keep]
+        changed_links = remap[np.array(self.changed_links, dtype=np.int64)]
+        self.changed_links = changed_links[changed_links >= 0].tolist()
+
+    def link_changed(self, link_id):
+        """
+        Record a new segment or a modification of the fftt of a segment
+        """
+        if not self.ready:
+            return
+        self.dirty_od.update(self.od_pairs_using_link(link_id).tolist())
+        self.changed_links.append(link_id)
+
+    def remap_links(self, links):
+        """
+        Map segment IDs from before the recorded deletions to the current IDs
+
+            - links: Array of segment IDs, none of them deleted
+        """
+        return links if self.link_remap is None else self.link_remap[links]
+
+    def paths_remapped(self):
+        """
+        Record that the segment IDs of the paths were already updated after the deletions
+        """
+        self.link_remap = None
+
+    def affected_od_pairs(self, network):
+        """
+        IDs of the OD pairs to enumerate again
+
+            - network: The network the index belongs to
+        """
+        affected = set(self.dirty_od)
+        if len(self.changed_links) == 0:
+            return sorted(affected)
+
+        fftt, _, in_node, out_node = network.link_arrays()
+        indptr, heads, weights = build_csr_adjacency(network.m_n_node, in_node, out_node, fftt)
+        r_indptr, r_heads, r_weights = build_csr_adjacency(network.m_n_node, out_node, in_node, fftt)
+        indptr, heads, weights = indptr.tolist(), heads.tolist(), weights.tolist()
+        r_indptr, r_heads, r_weights = r_indptr.tolist(), r_heads.tolist(), r_weights.tolist()
+        od_node = np.array([od_pair.p_od_node for od_pair in network.m_od_pairs], dtype=np.int64).reshape(-1, 2)
+        origin, destination = od_node[:, 0], od_node[:, 1]
+
+        for link_id in set(self.changed_links):
+            # Shortest length of a path through the segment, a loopless one uses it once
+            dist_to_link = np.array(dijkstra(r_indptr, r_heads, r_weights, int(in_node[link_id])))
+            dist_from_link = np.array(dijkstra(indptr, heads, weights, int(out_node[link_id])))
+            through = dist_to_link[origin] + fftt[link_id] + dist_from_link[destination]
+            affected.update(np.nonzero(np.isfinite(through) & (through <= self.len_cap * (1 + 1e-9)))[0].tolist())
+        return sorted(affected)
 
 
 class PyNetwork:
@@ -125,20 +278,39 @@ class PyNetwork:
         - cpu_time: CPU Time
         - shortest_path_cost: Shortest distance
         - shortest_path_parent: Predecessor segment of the shortest path
-        - output_path: Output path
-
-        - m_node: Set of network nodes
-        - node_distance_matrix: Distance matrix of network nodes
-
-        - m_link: Set of network segments
-        - m_path: Set of network paths
+        - output_path: File the convergence trace of every solve is written to, off the solver
+          thread (see PyTraceWriter), None to keep it in memory only
+        - trace_size: Number of last iterations kept in the convergence trace of a solve
+        - solver_mode: LogitSUE implementation, "loop" or "vectorized" (sparse path-link incidence)
+        - shortest_path_backend: Shortest path algorithm of the gap function, "dijkstra" or "floyd"
+        - shortest_path_processes: Worker processes used by the Dijkstra backend, 0 runs in-process
+        - warm_start: Seed LogitSUE with the segment flows of the previous solve
+        - warm_start_beta: Initial Beta (inverse step) of a warm-started LogitSUE
+        - solver_config: Step rule and stopping criteria of LogitSUE (PySolverConfig)
+        - solve_report: Iterations, CPU time, final NormD / relative / UE gap and stop reason of the last LogitSUE,
+          and the seconds spent in each of its phases
+        - convergence_trace: Iterations of the last LogitSUE (PyConvergenceTrace)
+        - solve_history: Reports of the last solve_history_size LogitSUE runs with the version they
+          produced and their wall clock time, oldest first
+        - progress: Called with (K, NormD, UE gap) after every LogitSUE iteration, None to skip
+
+        - m_node: Set of network nodes (PyNodeTable, indexing gives PyNode views)
+        - node_distance_matrix: Distance matrix of network nodes, only built by the Floyd backend
+
+        - m_link: Set of network segments (PyLinkTable, indexing gives PyLink views)
+        - m_path: Set of network paths (PyPathTable, indexing gives PyPath views)
         - m_od_pairs: Set of OD pairs in the network
         - m_n_node: Number of nodes
         - m_n_link: Number of segments
         - m_n_od_pairs: Number of origins
         - m_n_path: Number of paths
+        - path_manager: Index used to update the paths incrementally after edits
+        - shared_parts: Parts still shared with the network it was forked from (or its other forks),
+          "topology" (nodes, segments, segment flows) and "paths" (paths, OD pairs, path index)
+        - version: Number of modifications, bumped by make_writable and by every solve, so that
+          responses encoded for a version can be reused until it changes
 
-        - links_flow: Flow of each segment
+        - links_flow: Flow of each segment, kept aligned with the segment IDs across edits
         - title: Network title
         - desc: Network description
 
@@ -170,20 +342,34 @@ class PyNetwork:
         self.cpu_time = 0.0  # CPU Time
         self.shortest_path_cost = []  # Shortest distance
         self.shortest_path_parent = []  # Predecessor segment of the shortest path
-        self.output_path = "./output.txt"  # Output path
+        self.output_path = None  # File the convergence traces are written to, None for none
+        self.trace_size = 4096  # Iterations kept in the convergence trace
+        self.solver_mode = "loop"  # LogitSUE implementation: "loop" or "vectorized"
+        self.shortest_path_backend = "dijkstra"  # "dijkstra" from OD origins, or "floyd" for validation
+        self.shortest_path_processes = 0  # Worker processes of the Dijkstra backend
+        self.warm_start = False  # Seed LogitSUE with the previous segment flows
+        self.warm_start_beta = 4.0  # Initial Beta of a warm start, i.e. a smaller first step
+        self.solver_config = PySolverConfig()  # Step rule and stopping criteria of LogitSUE
+        self.solve_report = {}  # Report of the last LogitSUE
+        self.convergence_trace = PyConvergenceTrace(0)  # Iterations of the last LogitSUE, a new trace per solve
+        self.solve_history = ()  # Reports of the last solves, a tuple so that forks never share an append
+        self.progress = None  # Progress callback of LogitSUE, see solve jobs in app.py
 
         # Related to the four classes
-        self.m_node = []  # Set of network nodes
-        # Distance matrix of network nodes
+        # Sets of network nodes and segments
+        self.m_node, self.m_link = bind_topology(PyNodeTable(), PyLinkTable())
+        # Distance matrix of network nodes (built on demand by the Floyd backend)
         self.node_distance_matrix = np.array([])
 
-        self.m_link = []  # Set of network segments
-        self.m_path = []  # Set of network paths
+        self.m_path = PyPathTable()  # Set of network paths
         self.m_od_pairs = []  # Set of OD pairs in the network
         self.m_n_node = 0  # Number of nodes
         self.m_n_link = 0  # Number of segments
         self.m_n_od_pairs = 0  # Number of origins
         self.m_n_path = 0  # Number of paths
+        self.path_manager = PyPathManager()  # Incremental path maintenance
+        self.shared_parts = set()  # Parts shared with forked networks, copied before the first write
+        self.version = 0  # Bumped before every modification
 
         self.links_flow = []  # Flow of each segment
         self.title = "Network"  # Title
@@ -199,6 +385,63 @@ class PyNetwork:
         self.tunnel_num = 0
 
 
+    def fork(self):
+        """
+        Copy-on-write duplicate of the network
+
+        The child shares the nodes, segments, paths and OD pairs of this network. Both networks
+        copy a part before they first modify it (see make_writable), so forking is O(1) and an
+        edit on one side is never seen by the other.
+        """
+        child = copy.copy(self)
+        self.shared_parts = {"topology", "paths"}
+        child.shared_parts = {"topology", "paths"}
+        return child
+
+    # Attributes that are settings rather than state, kept by adopt
+    settings = ("theta", "ita", "gama", "max_ue_gap", "output_path", "trace_size", "solver_mode", "shortest_path_backend",
+                "shortest_path_processes", "warm_start", "warm_start_beta", "solver_config", "progress", "title", "desc")
+
+    def adopt(self, other):
+        """
+        Take over the state of other, a fork of this network that was edited and solved meanwhile
+
+        Edits are done on a fork so that the network can still be read while they are solved. The
+        network keeps its identity and its settings (solver mode, warm start, ...), which may have
+        been changed since the fork.
+        """
+        settings = {name: getattr(self, name) for name in self.settings}
+        self.__dict__.update(other.__dict__)
+        self.__dict__.update(settings)
+
+    def make_writable(self, *parts):
+        """
+        Copy the given parts if they are still shared with a forked network
+
+            - parts: "topology" and / or "paths"
+
+        The tables are copied column by column. Of the OD pairs only the objects are copied, the
+        lists that are always replaced rather than modified in place (choice_prob, p_od_node)
+        stay shared. Every mutating method calls it first, so it also bumps the version.
+        """
+        self.version += 1
+        if "topology" in parts and "topology" in self.shared_parts:
+            self.m_node, self.m_link = bind_topology(self.m_node.copy(), self.m_link.copy())
+            self.links_flow = list(self.links_flow)
+            self.shared_parts.discard("topology")
+
+        if "paths" in parts and "paths" in self.shared_parts:
+            m_path = self.m_path.copy()
+            m_od_pairs = []
+            for od_pair in self.m_od_pairs:
+                od_pair_copy = copy.copy(od_pair)
+                od_pair_copy.p_od_path = od_pair.p_od_path[:]
+                m_od_pairs.append(od_pair_copy)
+            self.m_path = m_path
+            self.m_od_pairs = m_od_pairs
+            self.path_manager = copy.deepcopy(self.path_manager)
+            self.shared_parts.discard("paths")
+
     def read_node(self, DataPath):
         """
         Read node file
@@ -206,43 +449,26 @@ class PyNetwork:
 
         File format: Node ID X coordinate Y coordinate
         """
+        self.make_writable("topology")
         # Check if the path exists
         if not os.path.exists(DataPath):
             print(f"Node Read Error: {DataPath} does not exist!")
             return
 
         # Start reading the file
-        self.m_node = []
-        self.m_n_node = 0
-        with open(DataPath, 'r') as f1:
-            for row in f1:
-                if row == "":
-                    continue
-                Data = row.split('\t')
-                pNode = PyNode()
-                pNode.id = self.m_n_node
-                pNode.position_x = float(Data[1])
-                pNode.position_y = float(Data[2])
-                pNode.lat = float(Data[3])
-                pNode.lon = float(Data[4])
-                self.m_n_node += 1
-                self.m_node.append(pNode)
-
-            # Initialize the node distance matrix
-            self.node_distance_matrix = np.full(
-                (self.m_n_node, self.m_n_node), float('inf'))
-            np.fill_diagonal(self.node_distance_matrix, 0)
+        position_x, position_y, lat, lon = read_columns(DataPath, {1: float, 2: float, 3: float, 4: float})
+        self.m_n_node = len(position_x)
+        self.m_node, self.m_link = bind_topology(
+            PyNodeTable(id=range(self.m_n_node), position_x=position_x, position_y=position_y, lat=lat, lon=lon),
+            self.m_link)
 
     def get_network_center(self):
         """
         Obtain the latitude and longitude of the network center point.
         """
-        lat_sum = 0
-        lon_sum = 0
         nodes_num = len(self.m_node)
-        for now_node in self.m_node:
-            lat_sum += now_node.lat
-            lon_sum += now_node.lon
+        lat_sum = sum(self.m_node.lat.tolist())
+        lon_sum = sum(self.m_node.lon.tolist())
 
         if nodes_num != 0:
             lat_sum /= nodes_num
@@ -257,28 +483,17 @@ class PyNetwork:
         
         Link file format: Incoming node of the segment, outgoing node of the segment, free flow travel time, capacity of the segment
         """
+        self.make_writable("topology")
         # Check if the path exists
         if not os.path.exists(DataPath):
             print(f"{DataPath} does not exist!")
             return
-        self.m_link = []
-        self.m_n_link = 0
-        with open(DataPath, 'r') as f2:
-            # Read the file content line by line
-            for row in f2:
-                if row == "":
-                    continue
-                Data = row.split('\t')
-                p_link = PyLink()
-                p_link.id = self.m_n_link
-                p_link.p_in_node = self.m_node[int(Data[0]) - 1]
-                p_link.p_out_node = self.m_node[int(Data[1]) - 1]
-                p_link.free_flow_travel_time = float(Data[2])
-                p_link.capacity = float(Data[3])
-                p_link.p_in_node.outgoing_link.append(p_link.id)
-                p_link.p_out_node.incoming_link.append(p_link.id)
-                self.m_n_link += 1
-                self.m_link.append(p_link)
+        in_node, out_node, fftt, capacity = read_columns(DataPath, {0: np.int64, 1: np.int64, 2: float, 3: float})
+        check_ids(in_node, self.m_n_node, DataPath, "Node")
+        check_ids(out_node, self.m_n_node, DataPath, "Node")
+        self.m_n_link = len(in_node)
+        self.m_node, self.m_link = bind_topology(self.m_node, PyLinkTable(
+            in_node=in_node - 1, out_node=out_node - 1, free_flow_travel_time=fftt, capacity=capacity))
 
     def read_od_pairs(self, DataPath):
         """
@@ -287,34 +502,33 @@ class PyNetwork:
 
         OD pairs file format: Origin point, Destination point, OD demand
         """
+        self.make_writable("topology", "paths")
         if not os.path.exists(DataPath):
             print(f"{DataPath} does not exist!")
             return
+        origin, destination, demand = read_columns(DataPath, {0: np.int64, 1: np.int64, 2: float})
+        check_ids(origin, self.m_n_node, DataPath, "Node")
+        check_ids(destination, self.m_n_node, DataPath, "Node")
         self.m_od_pairs = []
-        self.m_n_od_pairs = 0
-        with open(DataPath, 'r') as f3:
-            for row in f3:
-                if row == "":
-                    continue
-                Data = row.split('\t')
-                pOrigin = PyODPairs()
-                pOrigin.id = self.m_n_od_pairs
-                ONode = int(Data[0]) - 1
-                pOrigin.p_od_node.append(ONode)
-                DNode = int(Data[1]) - 1
-                pOrigin.p_od_node.append(DNode)
-                pOrigin.od_demand = float(Data[2])
-                self.m_n_od_pairs += 1
-                self.m_od_pairs.append(pOrigin)
-
-                # Mark nodes as part of an OD pair
-                self.m_node[ONode].is_od = True
-                self.m_node[DNode].is_od = True
+        for od_pair_id, (ONode, DNode, od_demand) in enumerate(
+                zip((origin - 1).tolist(), (destination - 1).tolist(), demand.tolist())):
+            pOrigin = PyODPairs()
+            pOrigin.id = od_pair_id
+            pOrigin.p_od_node = [ONode, DNode]
+            pOrigin.od_demand = od_demand
+            self.m_od_pairs.append(pOrigin)
+        self.m_n_od_pairs = len(self.m_od_pairs)
+
+        # Mark nodes as part of an OD pair
+        self.m_node.is_od[origin - 1] = True
+        self.m_node.is_od[destination - 1] = True
+        self.m_node.changed()
 
     def check_nodes_access(self):
         """
         Get the points reachable from each point
         """
+        self.make_writable("topology")
         for node_id in range(self.m_n_node):
             out_links = self.m_node[node_id].outgoing_link
             in_links = self.m_node[node_id].incoming_link
@@ -332,115 +546,255 @@ class PyNetwork:
         tmp = [node.binary_ways for node in self.m_node]
         print(tmp)
 
-    def _bfs(self, start, end):
-        """
-        Calculate the segments between any two points using BFS
-
-            - start: Node ID of the starting node
-            - end: Node ID of the ending node
-        """
-        end_paths_idx = []
-        former_nodes_tree = [start]
-        from_links_tree = [-1]
-        from_idxs_in_tree = [-1]
-        visited_nodes = [[start]]
-        paths_len = [0]
-        now_pos = 0
-        min_path_len = float('inf')
-
-        max_path = 20
-        while now_pos < len(former_nodes_tree):
-            # If the current node is the endpoint
-            now_node_id = former_nodes_tree[now_pos]
-            if now_node_id == end:
-                # print("end")
-                end_paths_idx.append(now_pos)
-                if paths_len[now_pos] < min_path_len:
-                    min_path_len = paths_len[now_pos]
-
-                if len(end_paths_idx) > max_path:
+    # Most paths selected per OD pair, as many as the former BFS search could reach
+    max_od_paths = 21
+
+    def _od_path_search(self, od_pair, dist_to_target):
+        """
+        Select the shortest paths of an OD pair, generated in order of length by k_shortest_paths
+
+            - od_pair: The OD pair
+            - dist_to_target: Shortest length from every node to the destination, see distance_bounds
+
+        Paths of the same length are taken together. The next longer path stops the selection once
+        more than 8 paths are taken, or once at least 5 are and it is longer than twice the
+        shortest. So the selection is every path up to some length, whatever the order of equal
+        paths, except past max_od_paths, where equal paths are cut in search order.
+
+        Return:
+            - links_paths: Segments of each selected path from the destination back, sorted by length
+            - hit_links: Segments used by any path found by the search
+            - len_cap: Length of the path that stopped the selection (of the last path taken if
+              max_od_paths did), inf if the search ran out of paths
+        """
+        start_node_id = od_pair.p_od_node[0]
+        end_node_id = od_pair.p_od_node[1]
+        outgoing, head_ids, fftt = self.m_link.search_lists()
+        found = []
+        paths = k_shortest_paths(outgoing, head_ids, fftt, start_node_id, end_node_id, dist_to_target, found)
+        selected = []
+        len_cap = float('inf')
+        for path_len, links in paths:
+            if len(selected) > 0 and path_len > selected[-1][0]:
+                if len(selected) > 8 or (len(selected) >= 5 and path_len > 2 * selected[0][0]):
+                    len_cap = path_len
                     break
-            elif len(end_paths_idx) > 0 and paths_len[now_pos] > 2*min_path_len:
-                now_pos += 1
-                continue
-            else:
-                # Traverse all outgoing nodes
-                # now_node = self.m_node[now_node_id]
-                for out_link_id in self.m_node[now_node_id].outgoing_link:
-                    neighbor = self.m_link[out_link_id].p_out_node.id
-                    # Avoid visiting nodes that are already in the path to prevent forming cycle
-                    if neighbor not in visited_nodes[now_pos]:
-                        # Update the recorded array
-                        former_nodes_tree.append(neighbor)
-                        from_links_tree.append(out_link_id)
-                        from_idxs_in_tree.append(now_pos)
-                        visited_nodes.append(visited_nodes[now_pos] + [neighbor])
-                        paths_len.append(
-                            paths_len[now_pos] + self.m_link[out_link_id].free_flow_travel_time)
-
-            now_pos += 1
-
-        return former_nodes_tree, from_links_tree, from_idxs_in_tree, end_paths_idx, paths_len
+            selected.append((path_len, links))
+            if len(selected) >= self.max_od_paths:
+                len_cap = path_len
+                break
+        paths.close()
+        if len(selected) == 0:
+            print(f"[Error] No way from node \"{start_node_id}\" to node \"{end_node_id}\"!")
+            return [], set(), float('inf')
+
+        # Equal paths in a fixed order, so that the result does not depend on the search order
+        selected.sort()
+        hit_links = {link for links in found for link in links}
+        return [links[::-1] for _, links in selected], hit_links, len_cap
+
+    def _search_od_pairs(self, od_pairs, desc=None):
+        """
+        Run _od_path_search for several OD pairs, grouped by destination so that the distances to
+        each destination are computed once
+
+            - od_pairs: The OD pairs
+            - desc: Label of the progress bar, None for no progress bar
+
+        Return:
+            - {OD pair ID: search result}
+        """
+        fftt, _, in_node, out_node = self.link_arrays()
+        r_indptr, r_heads, r_fftt = build_csr_adjacency(self.m_n_node, out_node, in_node, fftt)
+        r_indptr, r_heads, r_fftt = r_indptr.tolist(), r_heads.tolist(), r_fftt.tolist()
+        od_pairs = sorted(od_pairs, key=lambda od_pair: od_pair.p_od_node[1])
+        origins = {}
+        for od_pair in od_pairs:
+            origins.setdefault(od_pair.p_od_node[1], []).append(od_pair.p_od_node[0])
+
+        searches = {}
+        destination, dist_to_target = None, None
+        for od_pair in tqdm.tqdm(od_pairs, desc=desc, disable=desc is None):
+            if od_pair.p_od_node[1] != destination:
+                destination = od_pair.p_od_node[1]
+                dist_to_target = distance_bounds(r_indptr, r_heads, r_fftt, destination, origins[destination])
+            searches[od_pair.id] = self._od_path_search(od_pair, dist_to_target)
+        return searches
+
+    def _set_od_paths(self, od_pair, links_paths, new_paths):
+        """
+        Create the paths of an OD pair and append them to a path set being built
+
+            - od_pair: The OD pair
+            - links_paths: Segments of each path
+            - new_paths: Columns of the path set being built (see _new_path_columns)
+        """
+        od_pair.p_od_path = list(range(len(new_paths["link_in_path"]),
+                                       len(new_paths["link_in_path"]) + len(links_paths)))
+        od_pair.m_n_od_path = len(links_paths)
+        new_paths["link_in_path"].extend(links_paths)
+        new_paths["od_pair_id"].extend([od_pair.id] * len(links_paths))
+        new_paths["path_flow"].extend([0.0] * len(links_paths))
+        new_paths["cost_of_path"].extend([0.0] * len(links_paths))
+
+    @staticmethod
+    def _new_path_columns():
+        """
+        Empty columns of a path set being built, turned into a PyPathTable once complete
+        """
+        return {"link_in_path": [], "od_pair_id": [], "path_flow": [], "cost_of_path": []}
 
     def compute_path_bfs(self):
         """
-        Calculate path information using OD pairs and segment information
-        """
-        self.m_path = []
-        self.m_n_path = 0
-        num_in_b = 0
-
-        for od_pair in tqdm.tqdm(self.m_od_pairs, desc="compute path"):
-            start_node_id = od_pair.p_od_node[0]
-            end_node_id = od_pair.p_od_node[1]
-            former_nodes_tree, from_links_tree, from_idxs_in_tree, end_paths_idx, paths_len =\
-                self._bfs(start_node_id, end_node_id)
-            # Sort all paths
-            paths_len_info = [{"l": paths_len[end_pos], "p": end_pos} for end_pos in end_paths_idx]
-            sorted_paths = sorted(paths_len_info, key=lambda x: x["l"])
-
-            # Modify information in OD pairs
-            # Initialize information
-            min_path_len = sorted_paths[0]['l']
-            od_pair.p_od_path = []
-            od_pair.m_n_od_path = 0
-
-            num_in_b += len(end_paths_idx)
-            if len(end_paths_idx) == 0:
-                print(f"[Error] No way from node \"{start_node_id}\" to node \"{end_node_id}\"!")
-            
-            # Traverse to create paths
-            # print(sorted_paths[0]['l'], end=' ')
-            for path_len_info_idx in range(len(sorted_paths)):
-                path_len_info = sorted_paths[path_len_info_idx]
-
-                if path_len_info['l'] > sorted_paths[path_len_info_idx-1]['l']:
-                    if od_pair.m_n_od_path > 8:
-                        break
-                    elif od_pair.m_n_od_path >= 5 and path_len_info['l'] > 2*min_path_len:
-                        break
-
-                # Calculate links in the path
-                links_path = []
-                now_pos = path_len_info['p']
-                while from_links_tree[now_pos] != -1:
-                    links_path.append(from_links_tree[now_pos])
-                    now_pos = from_idxs_in_tree[now_pos]
-
-                # Create path information
-                p_path = PyPath()
-                p_path.id = self.m_n_path
-                p_path.link_in_path = links_path
-
-                # Record path information in the OD pairs
-                od_pair.p_od_path.append(p_path.id)
-                p_path.od_pair_id = od_pair.id
-
-                self.m_path.append(p_path)
-                self.m_n_path += 1
-                od_pair.m_n_od_path += 1
-
-        print(f"path_num: {self.m_n_path}, num_in_b: {num_in_b}")
+        Calculate path information using OD pairs and segment information, see _od_path_search
+        """
+        self.make_writable("paths")
+        begtime = time.time()
+        new_paths = self._new_path_columns()
+        searched = self._search_od_pairs(self.m_od_pairs, "compute path")
+        searches = [searched[od_pair.id] for od_pair in self.m_od_pairs]
+        for od_pair, search in zip(self.m_od_pairs, searches):
+            self._set_od_paths(od_pair, search[0], new_paths)
+
+        self.m_path = PyPathTable(**new_paths)
+        self.m_n_path = len(self.m_path)
+        self.path_manager.reset(searches)
+        metrics.observe_path_update("full", self.m_n_od_pairs, time.time() - begtime)
+        print(f"path_num: {self.m_n_path}, links_found: {sum(len(search[1]) for search in searches)}")
+
+    # Bumped whenever the path search changes, so that path sets cached by an older search are not reused
+    path_cache_version = 2
+
+    def path_set_key(self):
+        """
+        Hash of everything the path search depends on: the segments in order, their fftt and the OD pairs
+        """
+        digest = hashlib.sha256(f"paths-v{self.path_cache_version}-{self.m_n_node}".encode())
+        digest.update(np.ascontiguousarray(self.m_link.in_node_ids(), dtype=np.int64).tobytes())
+        digest.update(np.ascontiguousarray(self.m_link.out_node_ids(), dtype=np.int64).tobytes())
+        digest.update(np.ascontiguousarray(self.m_link.free_flow_travel_time, dtype=np.float64).tobytes())
+        digest.update(np.array([od_pair.p_od_node for od_pair in self.m_od_pairs], dtype=np.int64).tobytes())
+        return digest.hexdigest()[:32]
+
+    def save_path_cache(self, cache_dir):
+        """
+        Store the path set and its search index in cache_dir, under path_set_key
+
+        One .npy file per array in a folder per key, written aside and renamed into place so that
+        concurrent writers and readers never see a partial folder.
+        """
+        folder = os.path.join(cache_dir, self.path_set_key())
+        if os.path.isdir(folder):
+            return
+        manager = self.path_manager
+        arrays = {
+            "links": self.m_path.links,
+            "offsets": self.m_path.offsets,
+            "od_pair_id": self.m_path.od_pair_id,
+            "od_paths": np.array([path_id for od_pair in self.m_od_pairs for path_id in od_pair.p_od_path], dtype=np.int64),
+            "od_offsets": np.cumsum([0] + [len(od_pair.p_od_path) for od_pair in self.m_od_pairs], dtype=np.int64),
+            "hit_links": manager.hit_links,
+            "hit_od": manager.hit_od,
+            "len_cap": manager.len_cap,
+        }
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_folder = tempfile.mkdtemp(prefix=".tmp-", dir=cache_dir)
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_folder, f"{name}.npy"), array)
+        try:
+            os.rename(tmp_folder, folder)
+        except OSError:
+            # Stored meanwhile by another process
+            shutil.rmtree(tmp_folder, ignore_errors=True)
+
+    def load_path_cache(self, cache_dir):
+        """
+        Take the path set and its search index from cache_dir if it holds them for this network
+
+        The arrays are memory-mapped copy-on-write: pages are read when used and edits stay private.
+
+        Return:
+            - Whether the cache had them
+        """
+        folder = os.path.join(cache_dir, self.path_set_key())
+        if not os.path.isdir(folder):
+            return False
+        arrays = {name[:-4]: np.load(os.path.join(folder, name), mmap_mode="c") for name in os.listdir(folder)}
+
+        self.make_writable("paths")
+        self.m_path = PyPathTable.from_flat(arrays["links"], arrays["offsets"], od_pair_id=arrays["od_pair_id"])
+        self.m_n_path = len(self.m_path)
+        od_paths, od_offsets = arrays["od_paths"].tolist(), arrays["od_offsets"].tolist()
+        for od_pair in self.m_od_pairs:
+            od_pair.p_od_path = od_paths[od_offsets[od_pair.id]:od_offsets[od_pair.id + 1]]
+            od_pair.m_n_od_path = len(od_pair.p_od_path)
+
+        manager = PyPathManager()
+        for name in ("hit_links", "hit_od", "len_cap"):
+            setattr(manager, name, arrays[name])
+        manager.ready = True
+        self.path_manager = manager
+        return True
+
+    def load_paths(self, cache_dir=None):
+        """
+        Path set of the network, from cache_dir if it was enumerated before for the same segments
+        and OD pairs, else enumerated with compute_path_bfs and stored in cache_dir
+
+            - cache_dir: Folder of the cached path sets, None to always enumerate
+        """
+        if cache_dir is not None and self.load_path_cache(cache_dir):
+            return
+        self.compute_path_bfs()
+        if cache_dir is not None:
+            try:
+                self.save_path_cache(cache_dir)
+            except OSError as error:
+                print(f"[Warning] path set not cached: {error}")
+
+    def update_paths(self):
+        """
+        Bring the path set up to date after edits, enumerating only the OD pairs the edits can affect
+        """
+        self.make_writable("paths")
+        if not self.path_manager.ready:
+            self.compute_path_bfs()
+            return
+
+        begtime = time.time()
+        od_to_update = self.path_manager.affected_od_pairs(self)
+        if len(od_to_update) == 0 and self.path_manager.link_remap is None:
+            self.path_manager.replace([], [])
+            return
+        searched = self._search_od_pairs([self.m_od_pairs[od_id] for od_id in od_to_update])
+
+        # Kept paths still use the segment IDs from before the deletions
+        former_paths = self.m_path
+        former_links = former_paths.links
+        if self.path_manager.link_remap is not None:
+            former_links = self.path_manager.remap_links(former_links)
+        former_links = former_paths.link_lists(former_links)
+        former_flow = former_paths.path_flow.tolist()
+        former_cost = former_paths.cost_of_path.tolist()
+
+        # Rebuild the path set in OD order, keeping the paths of unaffected OD pairs
+        new_paths = self._new_path_columns()
+        for od_pair in self.m_od_pairs:
+            if od_pair.id in searched:
+                self._set_od_paths(od_pair, searched[od_pair.id][0], new_paths)
+                continue
+            od_paths = od_pair.p_od_path
+            od_pair.p_od_path = list(range(len(new_paths["link_in_path"]),
+                                           len(new_paths["link_in_path"]) + len(od_paths)))
+            new_paths["link_in_path"].extend(former_links[path_id] for path_id in od_paths)
+            new_paths["od_pair_id"].extend([od_pair.id] * len(od_paths))
+            new_paths["path_flow"].extend(former_flow[path_id] for path_id in od_paths)
+            new_paths["cost_of_path"].extend(former_cost[path_id] for path_id in od_paths)
+        self.m_path = PyPathTable(**new_paths)
+        self.m_n_path = len(self.m_path)
+
+        self.path_manager.replace(od_to_update, [searched[od_id] for od_id in od_to_update])
+        metrics.observe_path_update("incremental", len(od_to_update), time.time() - begtime)
 
     def read_path(self, DataPath):
         """
@@ -448,78 +802,42 @@ class PyNetwork:
             - DataPath: Path to the path file
 
         """
+        self.make_writable("paths")
         # Check if the path exists
         if not os.path.exists(DataPath):
             print(f"{DataPath} does not exist!")
             return
 
-        # Set of network paths
-        self.m_path = []
-        # Number of paths
-        self.m_n_path = 0
-        
-        with open(DataPath, 'r') as f4:
-            p_od_pairs = PyODPairs()
-            num_of_row = 1
-            num_of_path = 0
-            num = 0
-            for row in f4:
-                if row == "":
-                    continue
-                Data = row.split('\t')
-
-                # Header Data: OD Pair ID, O Point, D Point, Number of Paths Between OD.
-                if num_of_row == 1:
-                    od_pairsID = int(Data[0]) - 1
-                    num_of_path = int(Data[3])
-                    p_od_pairs = self.m_od_pairs[od_pairsID]
-                    p_od_pairs.m_n_od_path = num_of_path
-                    num_of_row += 1
-
-                    # print(f"{row}", end='')
-                    continue
-
-                # Each path in the OD pair
-                if num < num_of_path:
-                    num += 1
-                    p_path = PyPath()
-                    p_path.id = self.m_n_path
-                    p_od_pairs.p_od_path.append(p_path.id)
-                    
-                    # id of the associated OD pair
-                    p_path.od_pair_id = od_pairsID
-                    link_in_n = int(Data[0]) - 1
-                    for node in range(1, len(Data)):
-                        link_out_n = int(Data[node]) - 1
-                        for link in range(self.m_n_link):
-                            p_link = self.m_link[link]
-                            if (link_in_n == p_link.p_in_node.id) and (link_out_n == p_link.p_out_node.id):
-                                p_path.link_in_path.append(link)
-                                break
-                        link_in_n = link_out_n
-                    self.m_path.append(p_path)
-                    self.m_n_path += 1
-                    continue
-                else:
-                    # All paths for the OD pair have been read; now reading the header information for the next OD pair
-                    num = 0
-                    od_pairsID = int(Data[0]) - 1
-                    num_of_path = int(Data[3])
-                    p_od_pairs = self.m_od_pairs[od_pairsID]
-                    p_od_pairs.m_n_od_path = num_of_path
-                    
-                    # print(f"{row}", end='')
-
-    def route_choice_prob(self, od_pairs):
+        links, offsets, od_pair_id = read_path_file(
+            DataPath, self.m_n_od_pairs, self.m_link.in_node_ids(), self.m_link.out_node_ids())
+        self.m_path = PyPathTable.from_flat(links, offsets, od_pair_id=od_pair_id)
+        self.m_n_path = len(self.m_path)
+        # The paths are not searched, so the first edit enumerates them again
+        self.path_manager = PyPathManager()
+
+        od_paths = [[] for _ in range(self.m_n_od_pairs)]
+        for path_id, od_pair in enumerate(od_pair_id.tolist()):
+            od_paths[od_pair].append(path_id)
+        for od_pair in self.m_od_pairs:
+            od_pair.p_od_path = od_paths[od_pair.id]
+            od_pair.m_n_od_path = len(od_pair.p_od_path)
+
+    def route_choice_prob(self, od_pairs, path_cost=None):
         """
         Calculate path selection probability
+
+            - path_cost: Cost of each path, the stored cost_of_path by default
         """
+        if path_cost is None:
+            path_cost = self.m_path.cost_of_path.tolist()
         p_od_pairs = self.m_od_pairs[od_pairs]
         choice_prob = []
         Sum = 0
+        # Costs relative to the cheapest path, so that the exponentials of far off flows (e.g. of a
+        # warm start after a capacity cut) do not all underflow; the probabilities are the same
+        min_cost = min((path_cost[path] for path in p_od_pairs.p_od_path), default=0)
         for path in p_od_pairs.p_od_path:
-            p_path = self.m_path[path]
-            LogitPara = math.exp(-self.theta * p_path.cost_of_path)
+            LogitPara = math.exp(-self.theta * (path_cost[path] - min_cost))
             Sum += LogitPara
             choice_prob.append(LogitPara)
             # if LogitPara == 0:
@@ -541,31 +859,28 @@ class PyNetwork:
             - Value of the gap function
         """
         num1 = 0
+        fftt = self.m_link.free_flow_travel_time.tolist()
+        capacity = self.m_link.capacity.tolist()
+        travel_time = [0.0] * self.m_n_link
         # Calculate the denominator of the subtracted term + update segment travel time (travel cost: TravelTime)
         for link in range(self.m_n_link):
-            p_link = self.m_link[link]
-
             # Update travel_time
-            p_link.travel_time = self.BPR(
-                p_link.free_flow_travel_time, link_flow[link], p_link.capacity)
+            travel_time[link] = self.BPR(fftt[link], link_flow[link], capacity[link])
 
             # Calculate single summation term
-            num1 += (p_link.travel_time * link_flow[link])
+            num1 += (travel_time[link] * link_flow[link])
+        self.m_link.travel_time[:] = travel_time
 
         num2 = 0
-        self.floyd_algorithm()
+        od_cost = self.get_od_shortest_cost(
+            self.m_link.travel_time, self.m_link.in_node_ids(), self.m_link.out_node_ids())
         # Calculate the numerator of the subtracted term
         for od_pairs in range(self.m_n_od_pairs):
-            # Loop through OD pairs
-            p_od_pairs = self.m_od_pairs[od_pairs]
-            OriginNode = p_od_pairs.p_od_node[0]
-            DestinationNode = p_od_pairs.p_od_node[1]
-            Demand = p_od_pairs.od_demand
-            # ODCost = self.get_shortest_cost(OriginNode, DestinationNode)
-
-            # Use Floyd's algorithm to calculate the shortest path
-            ODCost = self.node_distance_matrix[OriginNode, DestinationNode]
-            num2 += (Demand * ODCost)
+            # Loop through OD pairs, the demand of disconnected ones is not assigned
+            if od_cost[od_pairs] == float('inf'):
+                continue
+            Demand = self.m_od_pairs[od_pairs].od_demand
+            num2 += (Demand * od_cost[od_pairs])
 
         # Calculate the gap function value
         UEGap = 1 - num2 / num1
@@ -650,6 +965,37 @@ class PyNetwork:
         return ShortestPathCost[End]
 
 
+    def get_od_shortest_cost(self, travel_time, in_node, out_node):
+        """
+        Shortest travel time between the origin and destination of every OD pair
+
+        Parameters:
+            - travel_time: Travel time of each segment
+            - in_node: Starting node ID of each segment
+            - out_node: Ending node ID of each segment
+
+        Return:
+            - Array of the shortest travel time of each OD pair
+        """
+        od_node = np.array([od_pair.p_od_node for od_pair in self.m_od_pairs], dtype=np.int64).reshape(-1, 2)
+
+        if self.shortest_path_backend == "floyd":
+            # Initialize the distance matrix with the current segment travel times
+            self.node_distance_matrix = np.full((self.m_n_node, self.m_n_node), float('inf'))
+            np.fill_diagonal(self.node_distance_matrix, 0)
+            np.minimum.at(self.node_distance_matrix, (in_node, out_node), travel_time)
+            self.floyd_algorithm()
+            return self.node_distance_matrix[od_node[:, 0], od_node[:, 1]]
+
+        # Dijkstra from each distinct origin, stopping once its destinations are settled
+        indptr, heads, weights = build_csr_adjacency(self.m_n_node, in_node, out_node, travel_time)
+        order = np.argsort(od_node[:, 0], kind='stable')
+        origins, first_idx = np.unique(od_node[order, 0], return_index=True)
+        targets = [dest.tolist() for dest in np.split(od_node[order, 1], first_idx[1:])]
+        dists = multi_source_dijkstra(indptr, heads, weights, origins, targets,
+                                      self.shortest_path_processes)
+        return np.array([dists[origin][destination] for origin, destination in od_node.tolist()], dtype=float)
+
     def floyd_algorithm(self):
         """
         Floyd's algorithm to compute the global optimal paths
@@ -662,183 +1008,388 @@ class PyNetwork:
 
         self.node_distance_matrix = d
 
+    def link_arrays(self):
+        """
+        Segment attributes used by the vectorized solver
+
+        Return:
+            - fftt, capacity, in node ID and out node ID of each segment as NumPy arrays
+        """
+        return self.m_link.free_flow_travel_time, self.m_link.capacity, \
+            self.m_link.in_node_ids(), self.m_link.out_node_ids()
+
+    def BPR_array(self, fftt, flow, capacity):
+        """
+        Vectorized BPR function, segments with zero capacity get an infinite travel time
+        """
+        travel_time = np.full(len(fftt), float('inf'))
+        open_links = capacity != 0
+        travel_time[open_links] = fftt[open_links] * \
+            (1 + 0.15 * (flow[open_links] / capacity[open_links]) ** 4)
+        return travel_time
+
+    def _warm_start_flow(self):
+        """
+        Segment flows of the previous solve, used to seed a warm-started LogitSUE
+
+        Return:
+            - List of flows aligned with the current segment IDs, or None for a cold start
+        """
+        if not self.warm_start or self.alg_cnt == 0 or len(self.links_flow) != self.m_n_link:
+            return None
+        return [float(flow) for flow in self.links_flow]
+
+    # Number of reports kept in solve_history
+    solve_history_size = 32
+    def _set_solve_report(self, iterations, begtime, NormD, warm_start, stop_reason, rel_gap, beta, phases, trace):
+        """
+        Record the report of a LogitSUE run, in solve_history and in the metrics of the process, and its trace
+
+            - beta: Inverse of the next step, the warm_start_beta that resumes the solve
+            - phases: {phase: seconds} of the run, see PyPhaseTimer
+            - trace: Convergence trace of the run, also queued for output_path if set
+        """
+        self.convergence_trace = trace
+        if self.output_path is not None:
+            trace_writer.write(self.output_path, trace)
+        self.alg_cnt += 1
+        self.solve_report = {
+            "iterations": iterations,
+            "cpuTime": time.time() - begtime,
+            "normD": float(NormD),
+            "relGap": float(rel_gap),
+            "ueGap": float(self.ue_gap),
+            "stopReason": stop_reason,
+            "stepRule": self.solver_config.step_rule,
+            "beta": float(beta),
+            "warmStart": warm_start,
+            "solverMode": self.solver_mode,
+            "paths": self.m_n_path,
+            "phases": phases,
+        }
+        self.solve_history = (self.solve_history + (
+            {"version": self.version, "time": time.time(), **self.solve_report},))[-self.solve_history_size:]
+        metrics.observe_solve(self.solve_report)
+
     def LogitSUE(self):
         """
         Use the adaptive average method to solve the SUE traffic assignment problem
+
+        The step rule and the stopping criteria besides max_ue_gap come from solver_config.
         """
+        self.make_writable("topology", "paths")
+        if self.solver_mode == "vectorized":
+            return self.LogitSUE_vectorized()
 
         # init
         K = 1 # iteration timer
         Beta = 1
         begtime = time.time()
+        timer = PyPhaseTimer()
 
-        # init od_demand_satisfied for each link
-        for link in self.m_link:
-            link.od_demand_satisfied = [[0,0] for _ in self.m_node]
+        # Segment and path attributes as lists for the loops below
+        fftt = self.m_link.free_flow_travel_time.tolist()
+        capacity = self.m_link.capacity.tolist()
+        path_links = self.m_path.link_lists()
+        path_flow = self.m_path.path_flow.tolist()
+        path_cost = self.m_path.cost_of_path.tolist()
 
         # Update path travel costs based on free flow travel time
-        for path in self.m_path:
-            path.cost_of_path = 0
-            for link in path.link_in_path:
+        for path in range(self.m_n_path):
+            path_cost[path] = 0
+            for link in path_links[path]:
                 if link >= self.m_n_link:
                     print(f"error: {link}, {self.m_n_link}")
-                p_link = self.m_link[link]
-                path.cost_of_path += p_link.free_flow_travel_time
+                path_cost[path] += fftt[link]
 
         # Calculate path selection probability
         for od_pairs in range(self.m_n_od_pairs):
             p_od_pairs = self.m_od_pairs[od_pairs]
-            p_od_pairs.choice_prob = self.route_choice_prob(od_pairs)
+            p_od_pairs.choice_prob = self.route_choice_prob(od_pairs, path_cost)
 
         # Calculate path flow
         for od_pairs in range(self.m_n_od_pairs):
             p_od_pairs = self.m_od_pairs[od_pairs]
             Demand = p_od_pairs.od_demand
             for path in range(p_od_pairs.m_n_od_path):
-                p_path = self.m_path[p_od_pairs.p_od_path[path]]
                 Prob = p_od_pairs.choice_prob[path]
-                p_path.path_flow = Demand * Prob
+                path_flow[p_od_pairs.p_od_path[path]] = Demand * Prob
 
         # Calculate initial segment flow
         link_flow = [0] * self.m_n_link
         for path in range(self.m_n_path):
-            p_path = self.m_path[path]
-            for link in p_path.link_in_path:
-                link_flow[link] += p_path.path_flow
+            for link in path_links[path]:
+                link_flow[link] += path_flow[path]
+
+        # Warm start from the flows of the previous solve with a smaller first step
+        warm_start_flow = self._warm_start_flow()
+        if warm_start_flow is not None:
+            link_flow = warm_start_flow
+            Beta = self.warm_start_beta
 
         # Initialize the descent direction DescentDirection
         DescentDirection = link_flow[:]
 
         NormD = self.get_vector_norm(DescentDirection)
+        rel_gap = 1.0 if NormD > 0 else 0.0
+        step_rule = self.solver_config.make_step_rule(self, Beta)
+        stop_reason = "converged"
+        trace = PyConvergenceTrace(self.trace_size)
 
         nowtime = time.time()
         start_time = nowtime
         CPUTime = start_time - begtime
-
-        with open(self.output_path, 'w') as tw:
-            iter_num = 0
-            while NormD > self.max_ue_gap:
-                # print(f"iter{iter_num}: {NormD}")
-                iter_num += 1
-
-                last_now_time = nowtime
-                nowtime = time.time()
-                # Update path impedance based on segment flow
-                for link in range(self.m_n_link):
-                    p_link = self.m_link[link]
-                    p_link.travel_time = self.BPR(p_link.free_flow_travel_time, link_flow[link], p_link.capacity)
-
-                    in_node_id = p_link.p_in_node.id
-                    out_node_id = p_link.p_out_node.id
-
-                    # init distance matrix
-                    if p_link.travel_time < self.node_distance_matrix[in_node_id, out_node_id]:
-                        self.node_distance_matrix[in_node_id, out_node_id] = p_link.travel_time
-
-                for path in range(self.m_n_path):
-                    p_path = self.m_path[path]
-                    p_path.cost_of_path = 0
-                    for link in p_path.link_in_path:
-                        p_link = self.m_link[link]
-                        p_path.cost_of_path += p_link.travel_time
-
-                # Calculate path selection probability
-                for od_pairs in range(self.m_n_od_pairs):
-                    p_od_pairs = self.m_od_pairs[od_pairs]
-                    p_od_pairs.choice_prob = self.route_choice_prob(od_pairs)
-
-                # calculate flow for paths
-                for od_pairs in range(self.m_n_od_pairs):
-                    p_od_pairs = self.m_od_pairs[od_pairs]
-                    Demand = p_od_pairs.od_demand
-                    for path in range(p_od_pairs.m_n_od_path):
-                        p_path = self.m_path[p_od_pairs.p_od_path[path]]
-                        Prob = p_od_pairs.choice_prob[path]
-                        p_path.path_flow = Demand * Prob
-
-                # Calculate feasible descent direction using the formula
-                new_link_flow = [0] * self.m_n_link
-
-                for path in self.m_path:
-                    for link in path.link_in_path:
-                        new_link_flow[link] += path.path_flow
-
-                DescentDirection = [link_flow[i] - new_link_flow[i] for i in range(self.m_n_link)]
-                NewNormD = self.get_vector_norm(DescentDirection)
-
-                if NewNormD >= NormD:
-                    Beta += self.ita
-                else:
-                    Beta += self.gama
-
-                last_NormD = NormD
-                NormD = NewNormD
-                Lamuda = 1 / Beta # update step
-
-                # Update segment flow
-                for link in range(self.m_n_link):
-                    link_flow[link] -= Lamuda * DescentDirection[link]
-
-                K += 1
-
-                # if K%100 == 0:
-                #     print(f"K: {K:05d}, NormD: {NormD}, max_ue_gap: {self.max_ue_gap}")
-                # print()
-
-                self.ue_gap = self.get_ue_gap(link_flow)
+        timer.lap("setup")
+
+        iter_num = 0
+        while NormD > self.max_ue_gap:
+            # print(f"iter{iter_num}: {NormD}")
+            iter_num += 1
+
+            last_now_time = nowtime
+            nowtime = time.time()
+            # Update path impedance based on segment flow
+            travel_time = [self.BPR(fftt[link], link_flow[link], capacity[link])
+                           for link in range(self.m_n_link)]
+            timer.lap("bpr")
+
+            for path in range(self.m_n_path):
+                path_cost[path] = 0
+                for link in path_links[path]:
+                    path_cost[path] += travel_time[link]
+            timer.lap("pathCost")
+
+            # Calculate path selection probability
+            for od_pairs in range(self.m_n_od_pairs):
+                p_od_pairs = self.m_od_pairs[od_pairs]
+                p_od_pairs.choice_prob = self.route_choice_prob(od_pairs, path_cost)
+            timer.lap("choiceProb")
+
+            # calculate flow for paths
+            for od_pairs in range(self.m_n_od_pairs):
+                p_od_pairs = self.m_od_pairs[od_pairs]
+                Demand = p_od_pairs.od_demand
+                for path in range(p_od_pairs.m_n_od_path):
+                    Prob = p_od_pairs.choice_prob[path]
+                    path_flow[p_od_pairs.p_od_path[path]] = Demand * Prob
+
+            # Calculate feasible descent direction using the formula
+            new_link_flow = [0] * self.m_n_link
+
+            for path in range(self.m_n_path):
+                for link in path_links[path]:
+                    new_link_flow[link] += path_flow[path]
+            timer.lap("linkLoading")
+
+            DescentDirection = [link_flow[i] - new_link_flow[i] for i in range(self.m_n_link)]
+            NewNormD = self.get_vector_norm(DescentDirection)
+
+            last_NormD = NormD
+            NormD = NewNormD
+            Lamuda = step_rule.step(link_flow, DescentDirection, NormD, last_NormD) # update step
+
+            # Update segment flow
+            for link in range(self.m_n_link):
+                link_flow[link] -= Lamuda * DescentDirection[link]
+            timer.lap("step")
+
+            K += 1
+
+            # if K%100 == 0:
+            #     print(f"K: {K:05d}, NormD: {NormD}, max_ue_gap: {self.max_ue_gap}")
+            # print()
+
+            self.ue_gap = self.get_ue_gap(link_flow)
+            flow_norm = self.get_vector_norm(link_flow)
+            rel_gap = NormD / flow_norm if flow_norm > 0 else 0.0
+            timer.lap("gap")
                 
-                if (last_NormD == NormD): break
-                nowtime = time.time()
-                CPUTime = nowtime - begtime
-                tw.write(f"{K},{NormD},{CPUTime}\n")
+            if (last_NormD == NormD):
+                stop_reason = "stalled"
+                break
+            nowtime = time.time()
+            CPUTime = nowtime - begtime
+            trace.append(K, NormD, CPUTime, self.ue_gap, rel_gap)
+            if self.progress is not None:
+                self.progress(K, NormD, self.ue_gap)
+            timer.lap("progress")
+            stop_reason = self.solver_config.stop_reason(iter_num, rel_gap, CPUTime) or stop_reason
+            if stop_reason != "converged":
+                break
+
+        self.m_path.path_flow[:] = path_flow
+        self.m_path.cost_of_path[:] = path_cost
 
         Z = 0
         # compute od_demand_satisfied for each link
-        for path in self.m_path:
-            p_od_pairs = self.m_od_pairs[path.od_pair_id]
-            for link in path.link_in_path:
-                p_link = self.m_link[link]
-                p_link.od_demand_satisfied[p_od_pairs.p_od_node[0]
-                                         ][0] += int(path.path_flow)
-                p_link.od_demand_satisfied[p_od_pairs.p_od_node[1]
-                                         ][1] += int(path.path_flow)
+        demand_link, demand_node, demand_dir, demand_value = [], [], [], []
+        od_pair_id = self.m_path.od_pair_id.tolist()
+        for path in range(self.m_n_path):
+            p_od_pairs = self.m_od_pairs[od_pair_id[path]]
+            for link in path_links[path]:
+                demand_link += [link, link]
+                demand_node += p_od_pairs.p_od_node[:2]
+                demand_dir += [0, 1]
+                demand_value += [int(path_flow[path])] * 2
+        self.m_link.od_demand_satisfied = PyLinkNodeDemand.from_entries(
+            self.m_n_link, len(self.m_node), demand_link, demand_node, demand_dir, demand_value)
 
         # results
         # print("Algorithm Result")
         # print("Link:", self.m_n_link)
         # print("ID\t\tFlow\t\tCost")
         self.links_flow = link_flow  # Flow of each segment
+        self.version += 1
+        travel_time = self.m_link.travel_time.tolist()
         for link in range(self.m_n_link):
-            p_link = self.m_link[link]
             flow = round(link_flow[link], 0)
-            cost = round(p_link.travel_time, 2)
+            cost = round(travel_time[link], 2)
             # print(f"{link}\t\t{flow}\t\t{cost}")
-            if p_link.capacity != 0:
-                Z += p_link.free_flow_travel_time * (link_flow[link] + 0.03 * (link_flow[link] ** 5) / (p_link.capacity ** 4))
+            if capacity[link] != 0:
+                Z += fftt[link] * (link_flow[link] + 0.03 * (link_flow[link] ** 5) / (capacity[link] ** 4))
 
-        print()
         SumCost = 0
-        for path in self.m_path:
-            flow = round(path.path_flow, 0)
-            cost = round(path.cost_of_path, 2)
-            O = self.m_link[path.link_in_path[0]].p_in_node.id + 1
-            D = self.m_link[path.link_in_path[-1]].p_out_node.id + 1
-            SumCost += path.path_flow * path.cost_of_path
+        for path in range(self.m_n_path):
+            SumCost += path_flow[path] * path_cost[path]
         self.cost_sum = SumCost
 
         for link_idx in range(self.m_n_link):
             self.avg_flow += self.links_flow[link_idx]
-            self.avg_speed += self.m_link[link_idx].free_flow_travel_time/self.m_link[link_idx].travel_time
+            self.avg_speed += fftt[link_idx]/travel_time[link_idx]
         self.avg_flow /= self.m_n_link
         self.avg_speed /= self.m_n_link
+        timer.lap("results")
 
+        self._set_solve_report(iter_num, begtime, NormD, warm_start_flow is not None, stop_reason, rel_gap,
+                               step_rule.beta, timer.seconds, trace)
         endtime = time.time()
         CPUTime = endtime - begtime
         # print()
         # print("Number of Iterations:", K)
-        print("Objective Function:", Z)
-        print("Total Impedance:", SumCost)
-        print(f"LogitSUE End, CPUTime: {CPUTime} seconds")
+        logger.debug("Objective Function: %s", Z)
+        logger.debug("Total Impedance: %s", SumCost)
+        logger.debug("LogitSUE End, CPUTime: %s seconds", CPUTime)
+
+    def LogitSUE_vectorized(self):
+        """
+        Vectorized LogitSUE
+
+        Same adaptive average method as LogitSUE, but the path set is compiled once into a
+        PyPathIncidence and every iteration is done with sparse mat-vecs over NumPy arrays.
+        """
+        self.make_writable("topology", "paths")
+        K = 1  # iteration timer
+        Beta = 1
+        begtime = time.time()
+        timer = PyPhaseTimer()
+
+        incidence = PyPathIncidence(self)
+        fftt, capacity, in_node, out_node = self.link_arrays()
+        od_node = np.array([od_pair.p_od_node for od_pair in self.m_od_pairs], dtype=np.int64).reshape(-1, 2)
+
+        # Initial loading based on free flow travel time
+        path_cost = incidence.path_cost(fftt)
+        choice_prob = incidence.choice_prob(path_cost, self.theta)
+        path_flow = incidence.od_demand[incidence.od_of_row] * choice_prob
+        link_flow = incidence.link_flow(path_flow)
+
+        # Warm start from the flows of the previous solve with a smaller first step
+        warm_start_flow = self._warm_start_flow()
+        if warm_start_flow is not None:
+            link_flow = np.array(warm_start_flow, dtype=float)
+            Beta = self.warm_start_beta
+
+        NormD = math.sqrt(np.dot(link_flow, link_flow))
+        rel_gap = 1.0 if NormD > 0 else 0.0
+        step_rule = self.solver_config.make_step_rule(self, Beta)
+        stop_reason = "converged"
+        trace = PyConvergenceTrace(self.trace_size)
+        travel_time = None
+        timer.lap("setup")
+
+        iter_num = 0
+        while NormD > self.max_ue_gap:
+            iter_num += 1
+            # Update path impedance based on segment flow
+            link_travel_time = self.BPR_array(fftt, link_flow, capacity)
+            timer.lap("bpr")
+
+            path_cost = incidence.path_cost(link_travel_time)
+            timer.lap("pathCost")
+            choice_prob = incidence.choice_prob(path_cost, self.theta)
+            timer.lap("choiceProb")
+            path_flow = incidence.od_demand[incidence.od_of_row] * choice_prob
+
+            # Feasible descent direction
+            DescentDirection = link_flow - incidence.link_flow(path_flow)
+            NewNormD = math.sqrt(np.dot(DescentDirection, DescentDirection))
+            timer.lap("linkLoading")
+
+            last_NormD = NormD
+            NormD = NewNormD
+            Lamuda = step_rule.step(link_flow, DescentDirection, NormD, last_NormD)  # update step
+
+            link_flow = link_flow - Lamuda * DescentDirection
+            K += 1
+            timer.lap("step")
+
+            # Gap function on the updated segment flow
+            travel_time = self.BPR_array(fftt, link_flow, capacity)
+            num1 = np.dot(travel_time, link_flow)
+            # The demand of disconnected OD pairs is not assigned
+            od_cost = self.get_od_shortest_cost(travel_time, in_node, out_node)
+            connected = np.isfinite(od_cost)
+            num2 = np.dot(incidence.od_demand[connected], od_cost[connected])
+            self.ue_gap = 1 - num2 / num1
+            flow_norm = math.sqrt(np.dot(link_flow, link_flow))
+            rel_gap = NormD / flow_norm if flow_norm > 0 else 0.0
+            timer.lap("gap")
+
+            if (last_NormD == NormD):
+                stop_reason = "stalled"
+                break
+            CPUTime = time.time() - begtime
+            trace.append(K, NormD, CPUTime, self.ue_gap, rel_gap)
+            if self.progress is not None:
+                self.progress(K, NormD, self.ue_gap)
+            timer.lap("progress")
+            stop_reason = self.solver_config.stop_reason(iter_num, rel_gap, CPUTime) or stop_reason
+            if stop_reason != "converged":
+                break
+
+        # Write the results back to the network tables
+        self.m_path.cost_of_path[incidence.path_ids] = path_cost
+        self.m_path.path_flow[incidence.path_ids] = path_flow
+        for od_pairs in range(self.m_n_od_pairs):
+            self.m_od_pairs[od_pairs].choice_prob = \
+                choice_prob[incidence.od_offsets[od_pairs]:incidence.od_offsets[od_pairs + 1]].tolist()
+        if travel_time is None:
+            travel_time = self.m_link.travel_time.copy()
+        self.m_link.travel_time[:] = travel_time
+
+        # compute od_demand_satisfied for each link
+        entry_flow = path_flow.astype(np.int64)[incidence.row_of_entry]
+        entry_od = incidence.od_of_row[incidence.row_of_entry]
+        n_entry = len(entry_flow)
+        self.m_link.od_demand_satisfied = PyLinkNodeDemand.from_entries(
+            self.m_n_link, len(self.m_node),
+            np.concatenate([incidence.indices, incidence.indices]),
+            np.concatenate([od_node[entry_od, 0], od_node[entry_od, 1]]),
+            np.repeat([0, 1], n_entry), np.concatenate([entry_flow, entry_flow]))
+
+        self.links_flow = link_flow.tolist()  # Flow of each segment
+        self.version += 1
+
+        SumCost = float(np.dot(path_flow, path_cost))
+        self.cost_sum = SumCost
+
+        # Same accumulation as LogitSUE
+        self.avg_flow = (self.avg_flow + float(np.sum(link_flow))) / self.m_n_link
+        self.avg_speed = (self.avg_speed + float(np.sum(fftt / travel_time))) / self.m_n_link
+        timer.lap("results")
+
+        self._set_solve_report(iter_num, begtime, NormD, warm_start_flow is not None, stop_reason, rel_gap,
+                               step_rule.beta, timer.seconds, trace)
 
     def change_link_capcity(self, link_idx: int, new_capacity: float):
         """
@@ -848,6 +1399,7 @@ class PyNetwork:
             - link_idx: Segment index
             - new_capacity: Target value to modify
         """
+        self.make_writable("topology")
         res = self.m_link[link_idx].capacity - new_capacity
         if res == 0:
             return -1
@@ -866,11 +1418,13 @@ class PyNetwork:
             - link_idx: Segment index
             - free_flow_travel_time: Target value to modify
         """
+        self.make_writable("topology", "paths")
         res = self.m_link[link_idx].free_flow_travel_time - free_flow_travel_time
         self.m_link[link_idx].free_flow_travel_time = free_flow_travel_time
         if res == 0:
             return -1
-        elif res > 0:
+        self.path_manager.link_changed(link_idx)
+        if res > 0:
             return 7
         else: return 8
         
@@ -893,87 +1447,76 @@ class PyNetwork:
         """
         new a link
         """
+        self.make_writable("topology", "paths")
         # Determine whether this segment already exists
-        for now_link in self.m_link:
-            if now_link.p_in_node.id == start_pt_id and now_link.p_out_node.id == end_pt_id:
-                new_edits = []
-                if capacity > now_link.capacity:
-                    now_link.capacity = capacity
-                    new_edits.append(1)
-                if now_link.free_flow_travel_time < free_flow_travel_time:
-                    now_link.free_flow_travel_time = free_flow_travel_time
-                    new_edits.append(7)
-                return now_link.id, new_edits
-
-        p_link = PyLink()
-        p_link.id = self.m_n_link
-        p_link.p_in_node = self.m_node[start_pt_id]
-        p_link.p_out_node = self.m_node[end_pt_id]
-        p_link.free_flow_travel_time = free_flow_travel_time
-        p_link.capacity = capacity
-        p_link.p_in_node.outgoing_link.append(p_link.id)
-        p_link.p_out_node.incoming_link.append(p_link.id)
+        existing = np.nonzero((self.m_link.in_node_ids() == start_pt_id) &
+                              (self.m_link.out_node_ids() == end_pt_id))[0]
+        if len(existing) > 0:
+            now_link = self.m_link[existing[0]]
+            new_edits = []
+            if capacity > now_link.capacity:
+                now_link.capacity = capacity
+                new_edits.append(1)
+            if now_link.free_flow_travel_time < free_flow_travel_time:
+                now_link.free_flow_travel_time = free_flow_travel_time
+                self.path_manager.link_changed(now_link.id)
+                new_edits.append(7)
+                if recompute_paths:
+                    self.update_paths()
+            return now_link.id, new_edits
+
+        p_link = self.m_link.append(
+            in_node=self.m_node[start_pt_id].idx, out_node=self.m_node[end_pt_id].idx,
+            free_flow_travel_time=free_flow_travel_time, capacity=capacity)
         self.m_n_link += 1
-        self.m_link.append(p_link)
+        self.path_manager.link_changed(p_link.id)
+        if len(self.links_flow) == p_link.id:
+            # No flow on the new segment until the next solve
+            self.links_flow.append(0.0)
 
         # update paths
         if recompute_paths:
-            self.compute_path_bfs()
+            self.update_paths()
         # self.add_path_from_link(p_link.id)
         return p_link.id, [5]
 
     def del_link(self, links_to_del: list, recompute_paths=True):
         """
-        Delete existing nodes
-            - links_to_del: List of IDs of segments to be deleted
+        Delete existing segments
+            - links_to_del: List of IDs of segments to be deleted, unknown IDs are ignored
+
+        The segments are deleted in one pass, the IDs of the following segments move down. The
+        other segments keep their handle, and the paths that avoid the deleted segments are kept.
+
+        Return:
+            - New ID of every former segment ID, -1 for the deleted segments
         """
-        links_to_del.sort(reverse=True)
-        for link_id_to_del in links_to_del:
-            if link_id_to_del >= self.m_n_link:
-                continue
+        self.make_writable("topology", "paths")
+        rows = sorted(set(link_id for link_id in links_to_del if 0 <= link_id < self.m_n_link))
+        remap = deletion_remap(self.m_n_link, rows)
+        if len(rows) == 0:
+            return remap
+
+        self.m_link.delete(rows)
+        self.m_n_link -= len(rows)
+        self.path_manager.links_deleted(remap)
+        for link_id in reversed(rows):
+            if link_id < len(self.links_flow):
+                self.links_flow.pop(link_id)
 
-            link_to_del = self.m_link[link_id_to_del]
-            node_a = link_to_del.p_in_node
-            node_b = link_to_del.p_out_node
-
-            # Delete the stored information of the node
-            node_a.outgoing_link.remove(link_id_to_del)
-            node_b.incoming_link.remove(link_id_to_del)
-
-            # Modify ID information
-            for node in self.m_node:
-                for i in range(len(node.outgoing_link)):
-                    if node.outgoing_link[i] > link_id_to_del:
-                        node.outgoing_link[i] -= 1
-                for i in range(len(node.incoming_link)):
-                    if node.incoming_link[i] > link_id_to_del:
-                        node.incoming_link[i] -= 1
-            self.m_link.remove(self.m_link[link_id_to_del])
-            for link in self.m_link:
-                if link.id > link_id_to_del:
-                    link.id -= 1
-            self.m_n_link -= 1
-
-        # print(self.m_n_link)
-        # print(len(self.m_link))
         if recompute_paths:
-            self.compute_path_bfs()
+            self.update_paths()
+        return remap
 
-    def add_node(self, node_lat, node_lng, former_link_a_id, linka_fftt, former_link_b_id=-1, linkb_fftt=[-1,-1]):
+    def add_node(self, node_lat, node_lng, former_link_a_id, linka_fftt, former_link_b_id=-1, linkb_fftt=[-1,-1],
+                 recompute_paths=True):
         """
         Add new nodes to the original road
         """
+        self.make_writable("topology", "paths")
         # Add the node to the network
-        pNode = PyNode()
-        pNode.id = self.m_n_node
-        pNode.lat = float(node_lat)
-        pNode.lon = float(node_lng)
+        pNode = self.m_node.append(id=self.m_n_node, lat=float(node_lat), lon=float(node_lng))
         self.m_n_node += 1
-        self.m_node.append(pNode)
-
-        # Initialize the node distance matrix
-        self.node_distance_matrix = np.full((self.m_n_node, self.m_n_node), float('inf'))
-        np.fill_diagonal(self.node_distance_matrix, 0)
 
         # Save the information of the old road segments
         link_a = self.m_link[former_link_a_id]
@@ -988,6 +1531,17 @@ class PyNetwork:
         node_a_id = link_a.p_in_node.id
         node_b_id = link_a.p_out_node.id
 
+        # Splitting a segment without changing its length keeps the paths, their segment IDs are
+        # replaced below and must not still wait for the update of deferred deletions
+        remap_paths = former_link_a_id != former_link_b_id and former_a_fftt == linka_fftt[0]+linka_fftt[1]
+        if remap_paths and self.path_manager.link_remap is not None:
+            self.update_paths()
+
+        # Flows of the old road segments, carried over to the new ones for a warm start
+        links_flow_aligned = len(self.links_flow) == self.m_n_link
+        a_dir_flow = self.links_flow[former_link_a_id] if links_flow_aligned else 0.0
+        b_dir_flow = self.links_flow[former_link_b_id] if links_flow_aligned and former_link_b_id != -1 else a_dir_flow
+
         # delete old road info
         links_to_del = []
         if former_link_b_id != -1 and former_link_a_id != former_link_b_id:
@@ -998,47 +1552,44 @@ class PyNetwork:
             links_to_del = [former_link_a_id]
             
         # new links
-        self.add_link(node_a_id, pNode.id,
-                      a_dir_capacity, linka_fftt[0], False)
-        self.add_link(pNode.id, node_b_id,
-                      a_dir_capacity, linka_fftt[1], False)
+        new_links = []
+        new_links.append(self.add_link(node_a_id, pNode.id,
+                      a_dir_capacity, linka_fftt[0], False) + (a_dir_flow,))
+        new_links.append(self.add_link(pNode.id, node_b_id,
+                      a_dir_capacity, linka_fftt[1], False) + (a_dir_flow,))
         if former_link_b_id != -1:
-            self.add_link(node_b_id, pNode.id,
-                        b_dir_capacity, linkb_fftt[0], False)
-            self.add_link(pNode.id, node_a_id,
-                        b_dir_capacity, linkb_fftt[1], False)
+            new_links.append(self.add_link(node_b_id, pNode.id,
+                        b_dir_capacity, linkb_fftt[0], False) + (b_dir_flow,))
+            new_links.append(self.add_link(pNode.id, node_a_id,
+                        b_dir_capacity, linkb_fftt[1], False) + (b_dir_flow,))
+        for new_link_id, new_edits, new_link_flow in new_links:
+            if links_flow_aligned and new_edits == [5]:
+                self.links_flow[new_link_id] = new_link_flow
             
         # reset paths
-        if former_link_a_id != former_link_b_id and former_a_fftt == linka_fftt[0]+linka_fftt[1]:
+        if remap_paths:
             links_new = [pNode.incoming_link, pNode.outgoing_link]
-            for pPath in self.m_path:
-                links_in_path = pPath.link_in_path
-                for link_del_idx in range(len(links_to_del)):
-                    if links_to_del[link_del_idx] in links_in_path:
-                        link_idx_in_path = links_in_path.index(
-                            links_to_del[link_del_idx])
-                        pPath.link_in_path = links_in_path[:link_idx_in_path] + [
-                            links_new[0][link_del_idx]+len(links_to_del), 
-                            links_new[1][link_del_idx]+len(links_to_del)] + \
-                            links_in_path[link_idx_in_path+1:]
-                        
-                # Update the IDs of the original links in the path
-                links_in_path = pPath.link_in_path
-                for link_idx_in_path in range(len(links_in_path)):
-                    for link_del_idx in range(len(links_to_del)):
-                        if links_in_path[link_idx_in_path] > links_to_del[link_del_idx]:
-                            pPath.link_in_path[link_idx_in_path] -= 1
+            for link_del_idx in range(len(links_to_del)):
+                self.m_path.replace_link(links_to_del[link_del_idx], [
+                    links_new[0][link_del_idx]+len(links_to_del),
+                    links_new[1][link_del_idx]+len(links_to_del)])
+
+            # Update the IDs of the original links in the path
+            for link_del_idx in range(len(links_to_del)):
+                self.m_path.links[self.m_path.links > links_to_del[link_del_idx]] -= 1
+            self.path_manager.paths_remapped()
             return False
-        else:
+        elif recompute_paths:
             # Recompute the path through calculations
-            self.compute_path_bfs()
+            self.update_paths()
         return True
 
-    def del_node(self, node_id):
+    def del_node(self, node_id, recompute_paths=True):
         """
         Delete node
             - node_id: ID of the node to be deleted
         """
+        self.make_writable("topology", "paths")
         # 获取该点可达的点
         out_links = self.m_node[node_id].outgoing_link
         in_links = self.m_node[node_id].incoming_link
@@ -1069,7 +1620,8 @@ class PyNetwork:
         self.m_node.pop(node_id)
 
         # Recalculate the paths between OD pairs
-        self.compute_path_bfs()
+        if recompute_paths:
+            self.update_paths()
 
         return True
 
@@ -1077,18 +1629,19 @@ class PyNetwork:
         """
         Add paths associated with the link
         """
+        self.make_writable("paths")
         # Obtain the link and its starting and ending points
         from_p_link = self.m_link[from_link_id]
         start_node_id = from_p_link.p_in_node
         end_node_id = from_p_link.p_out_node
 
         paths_to_add = []
+        paths_od = []
         for origin_path in self.m_path:
             node_start_on = False
             node_end_on = False
 
-            path_to_push = PyPath()
-            path_to_push.od_pair_id = origin_path.od_pair_id
+            path_to_push = []
             # Search for the presence of the starting and ending segments
             for alink_in_path_idx in origin_path.link_in_path:
                 alink_in_path = self.m_link[alink_in_path_idx]
@@ -1099,31 +1652,27 @@ class PyNetwork:
 
                 # Copy the segments of the original path
                 if not node_start_on or node_end_on:
-                    path_to_push.link_in_path.append(alink_in_path_idx)
+                    path_to_push.append(alink_in_path_idx)
 
                 # Determine whether it is possible to end the connection of the segment
                 if node_start_on and not node_end_on:
                     if alink_in_path.p_out_node == from_p_link.p_out_node:
-                        path_to_push.link_in_path.append(from_link_id)
+                        path_to_push.append(from_link_id)
                         node_end_on = True
             
             # Determine whether it is possible to insert the segment into the original path to form a new path
             if node_end_on:
                 paths_to_add.append(path_to_push)
+                paths_od.append(origin_path.od_pair_id)
     
         # Insert the new path into the original map
-        for new_path in paths_to_add:
-            new_path.id = self.m_n_path
-            od_pairsID = new_path.od_pair_id
-
+        for od_pairsID in paths_od:
             # Add to the network
-            self.m_od_pairs[od_pairsID].p_od_path.append(new_path.id)
+            self.m_od_pairs[od_pairsID].p_od_path.append(self.m_n_path)
             self.m_od_pairs[od_pairsID].m_n_od_path += 1
                     # p_od_pairs = self.m_od_pairs[od_pairsID]
                     # p_od_pairs.m_n_od_path = num_of_path
-            self.m_path.append(new_path)
-
             self.m_n_path += 1
+        self.m_path.extend(paths_to_add, od_pair_id=paths_od)
 
         return
-
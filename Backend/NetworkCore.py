@@ -0,0 +1,735 @@
+import copy
+import numpy as np
+
+
+def csr_rows_changed(old_indptr, old_values, new_indptr, new_values):
+    """
+    Rows of a CSR structure that differ from an older version of it
+
+        - old_indptr, old_values: Older version, values has one entry (or row of entries) per element
+        - new_indptr, new_values: Current version
+
+    Return:
+        - Boolean array, one per current row, rows beyond the older version are changed
+    """
+    n_new = len(new_indptr) - 1
+    n = min(len(old_indptr) - 1, n_new)
+    changed = np.ones(n_new, dtype=bool)
+    old_len = np.diff(old_indptr[:n + 1])
+    new_len = np.diff(new_indptr[:n + 1])
+    changed[:n] = old_len != new_len
+
+    # Compare the elements of the rows of equal length position by position
+    rows = np.flatnonzero(~changed[:n] & (new_len > 0))
+    if len(rows):
+        lengths = new_len[rows]
+        within = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        differ = (np.asarray(old_values)[np.repeat(old_indptr[rows], lengths) + within]
+                  != np.asarray(new_values)[np.repeat(new_indptr[rows], lengths) + within])
+        if differ.ndim > 1:
+            differ = differ.any(axis=1)
+        changed[rows[np.unique(np.repeat(np.arange(len(rows)), lengths)[differ])]] = True
+    return changed
+
+
+def deletion_remap(n, rows):
+    """
+    Row of every row of a table after deleting some of them
+
+        - n: Number of rows before the deletion
+        - rows: Deleted rows
+
+    Return:
+        - Array of n rows, -1 for the deleted ones
+    """
+    remap = np.ones(n, dtype=np.int64)
+    remap[np.asarray(rows, dtype=np.int64)] = 0
+    kept = remap.astype(bool)
+    remap = np.cumsum(remap) - 1
+    remap[~kept] = -1
+    return remap
+
+
+def handle_remap(old_handles, new_handles):
+    """
+    Row of every row of an older version of a table in the current one, matched by handle
+
+        - old_handles, new_handles: Sorted handles of the rows of each version
+
+    Return:
+        - Array with one row per old row, -1 for the rows deleted since, None if every old row
+          kept its row
+    """
+    old_handles = np.asarray(old_handles)
+    if len(old_handles) <= len(new_handles) and np.array_equal(old_handles, new_handles[:len(old_handles)]):
+        return None
+    pos = np.searchsorted(new_handles, old_handles)
+    found = pos < len(new_handles)
+    found[found] = new_handles[pos[found]] == old_handles[found]
+    return np.where(found, pos, -1)
+
+
+def _column(name, cast):
+    """
+    Attribute of a row view stored in the column `name` of its table
+    """
+    def get(self):
+        return cast(getattr(self.table, name)[self.idx])
+
+    def set(self, value):
+        getattr(self.table, name)[self.idx] = value
+        self.table.changed()
+
+    return property(get, set)
+
+
+class PyRowView:
+    """
+    Attribute-style access to one row of a table
+
+    Attributes:
+        - table: The table of the row
+        - idx: Index of the row
+    """
+    __slots__ = ("table", "idx")
+
+    def __init__(self, table, idx):
+        self.table = table
+        self.idx = idx
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.table is other.table and self.idx == other.idx
+
+    def __hash__(self):
+        return hash((id(self.table), self.idx))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.idx})"
+
+
+class PyNode(PyRowView):
+    """
+    Node, a row view of a PyNodeTable
+
+    Attributes:
+        - id: The node's ID, starting from zero;
+        - position_x: The X coordinate of the node;
+        - position_y: The Y coordinate of the node;
+        - origin_id: The ID of the corresponding origin node, -1 indicates it is not an origin;
+        - incoming_link: Set of segment IDs that enter the node;
+        - outgoing_link: Set of segment IDs that leave the node;
+
+        - global_id: A unique ID across all global networks
+        - is_od: Whether it is part of an OD pair
+        - lon: Longitude
+        - lat: Latitude
+        - binary_ways: Whether it can only lead to two nodes
+    """
+    __slots__ = ()
+
+    id = _column("id", int)
+    position_x = _column("position_x", float)
+    position_y = _column("position_y", float)
+    origin_id = _column("origin_id", int)
+    lon = _column("lon", float)
+    lat = _column("lat", float)
+    global_id = _column("global_id", int)
+    handle = _column("handle", int)
+    is_od = _column("is_od", bool)
+    binary_ways = _column("binary_ways", bool)
+
+    @property
+    def incoming_link(self):
+        return self.table.links.incoming(self.idx)
+
+    @property
+    def outgoing_link(self):
+        return self.table.links.outgoing(self.idx)
+
+
+class PyLink(PyRowView):
+    """
+    Segment, a row view of a PyLinkTable
+
+    Attributes:
+        - id: The segment's ID, starting from zero
+        - p_in_node: The starting node of the segment
+        - p_out_node: The ending node of the segment
+        - free_flow_travel_time: Free flow travel time
+        - travel_time: Travel time
+        - capacity: The capacity of the segment
+        - alpha: BPR function parameter, typically set to 0.15
+        - power: BPR function parameter, typically set to 4.0
+        - od_demand_satisfied: Demand satisfied for OD pairs, an array containing the total demand satisfied for each node as origin and destination
+        - global_id: A unique ID across all global networks
+        - handle: Stable ID of the segment within its network, kept when other segments are deleted
+    """
+    __slots__ = ()
+
+    free_flow_travel_time = _column("free_flow_travel_time", float)
+    travel_time = _column("travel_time", float)
+    capacity = _column("capacity", float)
+    alpha = _column("alpha", float)
+    power = _column("power", float)
+    global_id = _column("global_id", int)
+
+    @property
+    def id(self):
+        return self.idx
+
+    @property
+    def p_in_node(self):
+        return self.table.nodes[self.table.in_node[self.idx]]
+
+    @p_in_node.setter
+    def p_in_node(self, node):
+        self.table.in_node[self.idx] = node.idx
+        self.table.changed()
+
+    @property
+    def p_out_node(self):
+        return self.table.nodes[self.table.out_node[self.idx]]
+
+    @p_out_node.setter
+    def p_out_node(self, node):
+        self.table.out_node[self.idx] = node.idx
+        self.table.changed()
+
+    @property
+    def od_demand_satisfied(self):
+        demand_satisfied = self.table.od_demand_satisfied
+        if demand_satisfied is None:
+            return []
+        return demand_satisfied.row(self.idx)
+
+    @od_demand_satisfied.setter
+    def od_demand_satisfied(self, value):
+        demand_satisfied = self.table.od_demand_satisfied
+        if demand_satisfied is None or demand_satisfied.n_node != len(value):
+            demand_satisfied = PyLinkNodeDemand(self.table.n, len(value))
+        self.table.od_demand_satisfied = demand_satisfied.with_row(self.idx, value)
+
+
+class PyPath(PyRowView):
+    """
+    Path, a row view of a PyPathTable
+
+    Attributes:
+        - id: The path's ID, starting from zero
+        - link_in_path: Set of segments in the path
+        - path_flow: Flow of the path
+        - cost_of_path: Cost of the path
+        - od_pair_id: ID of the associated OD pair
+    """
+    __slots__ = ()
+
+    path_flow = _column("path_flow", float)
+    cost_of_path = _column("cost_of_path", float)
+    od_pair_id = _column("od_pair_id", int)
+
+    @property
+    def id(self):
+        return self.idx
+
+    @property
+    def link_in_path(self):
+        return self.table.path_links(self.idx).tolist()
+
+    @link_in_path.setter
+    def link_in_path(self, links):
+        self.table.set_path_links(self.idx, links)
+
+
+class PyLinkNodeDemand:
+    """
+    Demand satisfied of each segment for each node as origin and as destination
+
+    A sparse segment x node matrix in CSR form: only the nodes whose OD pairs have flow on a
+    segment are stored, instead of a dense [origin, destination] pair for every node.
+
+    Attributes:
+        - n_node: Number of node columns
+        - indptr: The entries of segment i are indptr[i]:indptr[i+1]
+        - nodes: Node ID of each entry, in ascending order within a segment
+        - values: Demand satisfied of each entry as origin and as destination
+    """
+    def __init__(self, n_link=0, n_node=0):
+        self.n_node = n_node
+        self.indptr = np.zeros(n_link + 1, dtype=np.int64)
+        self.nodes = np.zeros(0, dtype=np.int64)
+        self.values = np.zeros((0, 2), dtype=np.int64)
+
+    @classmethod
+    def from_entries(cls, n_link, n_node, link, node, direction, value):
+        """
+        Sum demand entries into a matrix
+
+            - link, node: Segment and node ID of each entry
+            - direction: 0 for demand as origin, 1 for demand as destination
+            - value: Demand of each entry
+        """
+        demand = cls(n_link, n_node)
+        if n_node == 0 or len(link) == 0:
+            return demand
+        link = np.asarray(link, dtype=np.int64)
+        direction = np.asarray(direction, dtype=np.int64)
+        value = np.asarray(value, dtype=np.int64)
+        keys, inverse = np.unique(link * n_node + np.asarray(node, dtype=np.int64), return_inverse=True)
+        values = np.zeros((len(keys), 2), dtype=np.int64)
+        np.add.at(values, (inverse, direction), value)
+
+        nonzero = np.any(values != 0, axis=1)
+        keys = keys[nonzero]
+        demand.nodes = keys % n_node
+        demand.values = values[nonzero]
+        demand.indptr[1:] = np.cumsum(np.bincount(keys // n_node, minlength=n_link))
+        return demand
+
+    @property
+    def n_link(self):
+        return len(self.indptr) - 1
+
+    def row(self, link):
+        """
+        Dense [origin, destination] demand of every node for a segment
+        """
+        start, end = self.indptr[link], self.indptr[link + 1]
+        dense = np.zeros((self.n_node, 2), dtype=np.int64)
+        dense[self.nodes[start:end]] = self.values[start:end]
+        return dense.tolist()
+
+    def to_lists(self, sparse=False, links=None):
+        """
+        Demand of every segment as lists
+
+            - sparse: [[node ID, origin, destination], ...] of the stored nodes only,
+              otherwise the dense [origin, destination] pair of every node
+            - links: Segment IDs to convert, all segments if None
+        """
+        links = range(self.n_link) if links is None else links
+        if not sparse:
+            return [self.row(link) for link in links]
+        entries = np.column_stack([self.nodes, self.values]).tolist()
+        indptr = self.indptr.tolist()
+        return [entries[indptr[link]:indptr[link + 1]] for link in links]
+
+    def with_row(self, link, value):
+        """
+        Copy of the matrix with the dense demand of a segment replaced
+        """
+        value = np.array(value, dtype=np.int64).reshape(-1, 2)
+        start, end = self.indptr[link], self.indptr[link + 1]
+        row_nodes = np.nonzero(np.any(value != 0, axis=1))[0]
+        demand = PyLinkNodeDemand(self.n_link, self.n_node)
+        demand.nodes = np.concatenate([self.nodes[:start], row_nodes, self.nodes[end:]])
+        demand.values = np.concatenate([self.values[:start], value[row_nodes], self.values[end:]])
+        demand.indptr = self.indptr.copy()
+        demand.indptr[link + 1:] += len(row_nodes) - (end - start)
+        return demand
+
+    def append_links(self, count=1):
+        """
+        Add segments without demand
+        """
+        self.indptr = np.concatenate([self.indptr, np.full(count, self.indptr[-1])])
+
+    def delete_links(self, links):
+        """
+        Delete segments, the following segments move down
+        """
+        keep_link = np.ones(self.n_link, dtype=bool)
+        keep_link[links] = False
+        row_len = np.diff(self.indptr)
+        keep = np.repeat(keep_link, row_len)
+        self.nodes = self.nodes[keep]
+        self.values = self.values[keep]
+        self.indptr = np.zeros(int(keep_link.sum()) + 1, dtype=np.int64)
+        self.indptr[1:] = np.cumsum(row_len[keep_link])
+
+    def copy(self):
+        demand = PyLinkNodeDemand(0, self.n_node)
+        demand.indptr = self.indptr.copy()
+        demand.nodes = self.nodes.copy()
+        demand.values = self.values.copy()
+        return demand
+
+
+class PyColumnTable:
+    """
+    Struct-of-arrays table, one NumPy array per attribute and one row per element
+
+    Indexing and iterating a table gives row views, so code written against the former
+    per-element objects keeps working, while the solver and the serializers use the columns.
+
+    Attributes:
+        - n: Number of rows
+        - cache: Values derived from the table, cleared whenever it changes
+        - version: Number of changes of the table, so that copies of values derived elsewhere can be checked
+    """
+    columns = {}  # Column name -> (dtype, default value)
+    view_class = PyRowView
+
+    def __init__(self, n=None, **values):
+        if n is None:
+            n = len(next(iter(values.values()))) if values else 0
+        self.n = n
+        for name, (dtype, default) in self.columns.items():
+            if name in values:
+                setattr(self, name, np.array(values[name], dtype=dtype).reshape(n))
+            else:
+                setattr(self, name, np.full(n, default, dtype=dtype))
+        self.cache = {}
+        self.version = 0
+
+    def __len__(self):
+        return self.n
+
+    def _row(self, idx):
+        idx = int(idx)
+        if idx < 0:
+            idx += self.n
+        if idx < 0 or idx >= self.n:
+            raise IndexError(f"{type(self).__name__} index out of range")
+        return idx
+
+    def __getitem__(self, idx):
+        return self.view_class(self, self._row(idx))
+
+    def __iter__(self):
+        view_class = self.view_class
+        return (view_class(self, idx) for idx in range(self.n))
+
+    def changed(self):
+        """
+        Drop the values derived from the table
+        """
+        self.cache = {}
+        self.version += 1
+
+    def append(self, **values):
+        """
+        Append a row, columns not given get their default value
+
+        Return:
+            - View of the new row
+        """
+        for name, (dtype, default) in self.columns.items():
+            row = np.array([values.get(name, default)], dtype=dtype)
+            setattr(self, name, np.concatenate([getattr(self, name), row]))
+        self.n += 1
+        self.changed()
+        return self[self.n - 1]
+
+    def delete(self, rows):
+        """
+        Delete rows, the following rows move down
+        """
+        for name in self.columns:
+            setattr(self, name, np.delete(getattr(self, name), rows))
+        self.n = len(getattr(self, next(iter(self.columns))))
+        self.changed()
+
+    def copy(self):
+        """
+        Copy of the table that shares no array with it
+        """
+        table = copy.copy(self)
+        for name in self.columns:
+            setattr(table, name, getattr(self, name).copy())
+        table.cache = {}
+        return table
+
+
+class PyNodeTable(PyColumnTable):
+    """
+    Nodes of a network
+
+    Attributes:
+        - id, position_x, position_y, origin_id, lon, lat, global_id, is_od, binary_ways: One column per PyNode attribute
+        - links: Segments of the network, used for the incoming and outgoing segments of each node
+    """
+    columns = {
+        "id": (np.int64, 0),
+        "position_x": (float, 0.0),
+        "position_y": (float, 0.0),
+        "origin_id": (np.int64, -1),
+        "lon": (float, 0.0),
+        "lat": (float, 0.0),
+        "global_id": (np.int64, -1),
+        "is_od": (bool, False),
+        "binary_ways": (bool, True),
+    }
+    view_class = PyNode
+
+    def __init__(self, n=None, **values):
+        super().__init__(n, **values)
+        self.links = None
+
+    def changed(self):
+        super().changed()
+        if self.links is not None:
+            self.links.changed()
+
+    def pop(self, idx):
+        """
+        Delete a node, the segments keep pointing to the same nodes
+        """
+        idx = self._row(idx)
+        self.delete(idx)
+        if self.links is not None:
+            self.links.in_node[self.links.in_node > idx] -= 1
+            self.links.out_node[self.links.out_node > idx] -= 1
+            self.links.changed()
+
+
+class PyLinkTable(PyColumnTable):
+    """
+    Segments of a network
+
+    The ID of a segment is its row, so deleting segments moves the IDs of the following ones down.
+    Its handle does not change: handles are given in increasing order and never reused, so the
+    handle column stays sorted and matches the rows of two versions of the table.
+
+    Attributes:
+        - in_node, out_node: Row of the starting / ending node of each segment in the node table
+        - free_flow_travel_time, travel_time, capacity, alpha, power, global_id, handle: One column per PyLink attribute
+        - od_demand_satisfied: Demand satisfied of each segment for each node (PyLinkNodeDemand), None before a solve
+        - nodes: Nodes of the network
+        - next_handle: Handle of the next new segment
+    """
+    columns = {
+        "in_node": (np.int64, -1),
+        "out_node": (np.int64, -1),
+        "free_flow_travel_time": (float, 0.0),
+        "travel_time": (float, 0.0),
+        "capacity": (float, 0.0),
+        "alpha": (float, 0.15),
+        "power": (float, 4.0),
+        "global_id": (np.int64, -1),
+        "handle": (np.int64, -1),
+    }
+    view_class = PyLink
+
+    def __init__(self, n=None, **values):
+        super().__init__(n, **values)
+        if "handle" not in values:
+            self.handle = np.arange(self.n, dtype=np.int64)
+        self.next_handle = int(self.handle.max(initial=-1)) + 1
+        self.nodes = None
+        self.od_demand_satisfied = None
+
+    def append(self, **values):
+        values["handle"] = self.next_handle
+        self.next_handle += 1
+        p_link = super().append(**values)
+        if self.od_demand_satisfied is not None:
+            # No demand on the new segment until the next solve
+            self.od_demand_satisfied.append_links()
+        return p_link
+
+    def delete(self, rows):
+        super().delete(rows)
+        if self.od_demand_satisfied is not None:
+            self.od_demand_satisfied.delete_links(rows)
+
+    def in_node_ids(self):
+        """
+        ID of the starting node of each segment
+        """
+        return self.nodes.id[self.in_node]
+
+    def out_node_ids(self):
+        """
+        ID of the ending node of each segment
+        """
+        return self.nodes.id[self.out_node]
+
+    def adjacency(self):
+        """
+        Segments grouped by starting and by ending node row, in ascending ID order
+
+        Return:
+            - out_ptr, out_links: The segments leaving node row i are out_links[out_ptr[i]:out_ptr[i+1]]
+            - in_ptr, in_links: The segments entering node row i are in_links[in_ptr[i]:in_ptr[i+1]]
+        """
+        if "adjacency" not in self.cache:
+            n_node = len(self.nodes)
+            adjacency = []
+            for node_rows in (self.in_node, self.out_node):
+                ptr = np.zeros(n_node + 1, dtype=np.int64)
+                ptr[1:] = np.cumsum(np.bincount(node_rows, minlength=n_node))
+                adjacency += [ptr, np.argsort(node_rows, kind='stable')]
+            self.cache["adjacency"] = tuple(adjacency)
+        return self.cache["adjacency"]
+
+    def outgoing(self, node_row):
+        """
+        IDs of the segments leaving a node
+        """
+        out_ptr, out_links, _, _ = self.adjacency()
+        return out_links[out_ptr[node_row]:out_ptr[node_row + 1]].tolist()
+
+    def incoming(self, node_row):
+        """
+        IDs of the segments entering a node
+        """
+        _, _, in_ptr, in_links = self.adjacency()
+        return in_links[in_ptr[node_row]:in_ptr[node_row + 1]].tolist()
+
+    def search_lists(self):
+        """
+        Plain lists used by the path search
+
+        Return:
+            - outgoing: IDs of the segments leaving each node row
+            - head_ids: ID of the ending node of each segment
+            - fftt: Free flow travel time of each segment
+        """
+        if "search_lists" not in self.cache:
+            out_ptr, out_links, _, _ = self.adjacency()
+            out_links = out_links.tolist()
+            out_ptr = out_ptr.tolist()
+            outgoing = [out_links[out_ptr[i]:out_ptr[i + 1]] for i in range(len(out_ptr) - 1)]
+            self.cache["search_lists"] = (outgoing, self.out_node_ids().tolist(),
+                                          self.free_flow_travel_time.tolist())
+        return self.cache["search_lists"]
+
+    def copy(self):
+        table = super().copy()
+        if self.od_demand_satisfied is not None:
+            table.od_demand_satisfied = self.od_demand_satisfied.copy()
+        return table
+
+
+class PyPathTable(PyColumnTable):
+    """
+    Paths of a network, the segments of all paths are stored in one flat array
+
+    The ID of a path is its row.
+
+    Attributes:
+        - od_pair_id, path_flow, cost_of_path: One column per PyPath attribute
+        - links: Segment IDs of all paths
+        - offsets: The segments of path i are links[offsets[i]:offsets[i+1]]
+    """
+    columns = {
+        "od_pair_id": (np.int64, -1),
+        "path_flow": (float, 0.0),
+        "cost_of_path": (float, 0.0),
+    }
+    view_class = PyPath
+
+    def __init__(self, link_in_path=(), **values):
+        super().__init__(len(link_in_path), **values)
+        self.offsets = np.zeros(self.n + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum([len(links) for links in link_in_path])
+        self.links = np.fromiter((link for links in link_in_path for link in links),
+                                 dtype=np.int32, count=int(self.offsets[-1]))
+
+    @classmethod
+    def from_flat(cls, links, offsets, **values):
+        """
+        Table from the flat segment array and offsets of another table, see links and offsets
+        """
+        table = cls.__new__(cls)
+        PyColumnTable.__init__(table, len(offsets) - 1, **values)
+        table.offsets = offsets
+        table.links = links
+        return table
+
+    def path_links(self, idx):
+        """
+        Segment IDs of a path
+        """
+        idx = self._row(idx)
+        return self.links[self.offsets[idx]:self.offsets[idx + 1]]
+
+    def link_lists(self, links=None):
+        """
+        Segment IDs of every path as a list of lists
+
+            - links: Flat segment IDs to split instead of the stored ones
+        """
+        links = (self.links if links is None else links).tolist()
+        offsets = self.offsets.tolist()
+        return [links[offsets[i]:offsets[i + 1]] for i in range(self.n)]
+
+    def row_of_entry(self):
+        """
+        Path ID of each entry of links
+        """
+        return np.repeat(np.arange(self.n), np.diff(self.offsets))
+
+    def set_path_links(self, idx, links):
+        """
+        Replace the segments of a path
+        """
+        idx = self._row(idx)
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        self.links = np.concatenate([self.links[:start], np.array(links, dtype=np.int32), self.links[end:]])
+        self.offsets[idx + 1:] += len(links) - (end - start)
+        self.changed()
+
+    def replace_link(self, link_id, new_links):
+        """
+        Replace each use of a segment by a sequence of segments
+        """
+        hit = self.links == link_id
+        counts = np.where(hit, len(new_links), 1)
+        links = np.repeat(self.links, counts)
+        starts = (np.cumsum(counts) - counts)[hit]
+        for k, new_link in enumerate(new_links):
+            links[starts + k] = new_link
+        extra = np.bincount(self.row_of_entry()[hit], minlength=self.n) * (len(new_links) - 1)
+        self.offsets[1:] += np.cumsum(extra)
+        self.links = links
+        self.changed()
+
+    def append(self, link_in_path=(), **values):
+        path = super().append(**values)
+        self.links = np.concatenate([self.links, np.array(link_in_path, dtype=np.int32)])
+        self.offsets = np.append(self.offsets, len(self.links))
+        return path
+
+    def extend(self, link_in_path, **values):
+        """
+        Append several paths
+
+            - link_in_path: Segments of each new path
+            - values: Column values of each new path
+        """
+        added = PyPathTable(link_in_path, **values)
+        for name in self.columns:
+            setattr(self, name, np.concatenate([getattr(self, name), getattr(added, name)]))
+        self.links = np.concatenate([self.links, added.links])
+        self.offsets = np.concatenate([self.offsets, self.offsets[-1] + added.offsets[1:]])
+        self.n += added.n
+        self.changed()
+
+    def delete(self, rows):
+        keep = np.ones(self.n, dtype=bool)
+        keep[rows] = False
+        row_len = np.diff(self.offsets)
+        self.links = self.links[np.repeat(keep, row_len)]
+        self.offsets = np.zeros(int(keep.sum()) + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum(row_len[keep])
+        super().delete(rows)
+
+    def copy(self):
+        table = super().copy()
+        table.links = self.links.copy()
+        table.offsets = self.offsets.copy()
+        return table
+
+
+def bind_topology(nodes, links):
+    """
+    Attach a node table and a segment table to each other
+
+    Return:
+        - nodes, links
+    """
+    nodes.links = links
+    links.nodes = nodes
+    nodes.changed()
+    return nodes, links
@@ -0,0 +1,231 @@
+import copy
+import itertools
+import weakref
+import numpy as np
+from NetworkCore import csr_rows_changed, handle_remap
+
+
+class PyNetworkSnapshot:
+    """
+    Values of a network as a client holds them after one response, to find what changed since then
+
+    Attributes:
+        - links: Segment columns as serialized (in / out node IDs, times, flow, capacity, global ID)
+        - link_handles: Handle of each segment, to match the segments across deletions
+        - demand: (n_node, indptr, entries) of the segment demand matrix, entries are [node, origin, destination]
+        - nodes: Node columns as serialized
+        - adjacency: (out_ptr, out_links, in_ptr, in_links) of the nodes
+        - n_global_nodes / n_global_links: Number of global nodes / segments
+        - global_links_info: Global segment aggregates, see PyGlobalLinkStats.table
+    """
+    __slots__ = ("links", "link_handles", "demand", "nodes", "adjacency",
+                 "n_global_nodes", "n_global_links", "global_links_info")
+
+    # Segment columns compared with a tolerance, the others must be equal
+    float_link_columns = ("free_flow_travel_time", "travel_time", "capacity", "flow")
+    node_columns = ("id", "position_x", "position_y", "lon", "lat", "origin_id", "global_id", "is_od")
+
+    def __init__(self, network, registry, link_stats):
+        link_table = network.m_link
+        self.links = {
+            "in_node": link_table.in_node_ids(),
+            "out_node": link_table.out_node_ids(),
+            "global_id": link_table.global_id.copy(),
+            "free_flow_travel_time": link_table.free_flow_travel_time.copy(),
+            "travel_time": link_table.travel_time.copy(),
+            "capacity": link_table.capacity.copy(),
+            "flow": np.array(network.links_flow, dtype=float).reshape(-1),
+        }
+        self.link_handles = link_table.handle.copy()
+
+        # The demand matrix replaces its arrays rather than modifying them, so they are not copied
+        demand = link_table.od_demand_satisfied
+        if demand is None:
+            self.demand = None
+        else:
+            self.demand = (demand.n_node, demand.indptr, np.column_stack([demand.nodes, demand.values]))
+
+        self.nodes = {name: getattr(network.m_node, name).copy() for name in self.node_columns}
+        self.adjacency = link_table.adjacency()
+        self.n_global_nodes = len(registry.nodes)
+        self.n_global_links = len(registry.links)
+        self.global_links_info = link_stats.table()
+
+
+def align_links(old, new):
+    """
+    Match the segments of snapshot old with those of snapshot new after deletions
+
+    Deleting segments moves the IDs of the following ones down, and new segments are appended,
+    so the segments kept from old are, in order, the first ones of new. Their values are compared
+    at their current IDs this way, rather than sending every segment after a deleted one again.
+
+    Return:
+        - Snapshot old restricted to the kept segments, with the segment IDs of the nodes updated
+        - Current ID of every segment of old, -1 for the deleted ones, None if no segment of old
+          was deleted
+    """
+    remap = handle_remap(old.link_handles, new.link_handles)
+    if remap is None:
+        return old, None
+
+    kept = remap >= 0
+    aligned = copy.copy(old)
+    aligned.links = {name: column[kept] for name, column in old.links.items()}
+    aligned.link_handles = old.link_handles[kept]
+    if old.demand is not None:
+        n_node, indptr, entries = old.demand
+        row_len = np.diff(indptr)
+        aligned_indptr = np.zeros(int(kept.sum()) + 1, dtype=np.int64)
+        aligned_indptr[1:] = np.cumsum(row_len[kept])
+        aligned.demand = (n_node, aligned_indptr, entries[np.repeat(kept, row_len)])
+    # A node that lost a segment gets -1 among its segments and differs from new
+    out_ptr, out_links, in_ptr, in_links = old.adjacency
+    aligned.adjacency = (out_ptr, remap[out_links], in_ptr, remap[in_links])
+    return aligned, remap
+
+
+def _rows_changed(old, new, tolerance=0.0):
+    """
+    Rows of the current columns new that differ from the columns old, rows beyond old are changed
+
+        - tolerance: Relative tolerance of the float columns of a segment
+    """
+    n_new = len(next(iter(new.values())))
+    changed = np.ones(n_new, dtype=bool)
+    n = min(len(next(iter(old.values()))), n_new)
+    if any(len(old[name]) < n or len(column) < n for name, column in new.items()):
+        return changed
+
+    changed[:n] = False
+    for name, column in new.items():
+        if tolerance > 0 and name in PyNetworkSnapshot.float_link_columns:
+            changed[:n] |= ~np.isclose(column[:n], old[name][:n], rtol=tolerance, atol=0, equal_nan=True)
+        else:
+            changed[:n] |= old[name][:n] != column[:n]
+    return changed
+
+
+def changed_links(old, new, sparse_demand=False, tolerance=0.0):
+    """
+    IDs of the segments of snapshot new that differ from snapshot old, in their values or demand
+
+        - sparse_demand: The demand is sent sparse, so a change of the node count alone does not
+          change the demand of a segment
+        - tolerance: Relative change of times, capacity and flow below which a segment is unchanged
+    """
+    changed = _rows_changed(old.links, new.links, tolerance)
+    if old.demand is None or new.demand is None:
+        if new.demand is not None or old.demand is not None:
+            changed[:] = True
+    elif old.demand[0] != new.demand[0] and not sparse_demand:
+        changed[:] = True
+    else:
+        demand_changed = csr_rows_changed(old.demand[1], old.demand[2], new.demand[1], new.demand[2])
+        changed[:len(demand_changed)] |= demand_changed[:len(changed)]
+    return np.flatnonzero(changed)
+
+
+def changed_nodes(old, new):
+    """
+    IDs of the nodes of snapshot new that differ from snapshot old, in their values or segments
+    """
+    changed = _rows_changed(old.nodes, new.nodes)
+    old_out_ptr, old_out_links, old_in_ptr, old_in_links = old.adjacency
+    new_out_ptr, new_out_links, new_in_ptr, new_in_links = new.adjacency
+    changed |= csr_rows_changed(old_out_ptr, old_out_links, new_out_ptr, new_out_links)[:len(changed)]
+    changed |= csr_rows_changed(old_in_ptr, old_in_links, new_in_ptr, new_in_links)[:len(changed)]
+    return np.flatnonzero(changed)
+
+
+def changed_global_links(old, new, tolerance=0.0):
+    """
+    Global segment IDs whose aggregates differ between snapshot old and snapshot new
+    """
+    n = min(old.global_links_info.shape[1], new.global_links_info.shape[1])
+    changed = np.ones(new.global_links_info.shape[1], dtype=bool)
+    old_info, new_info = old.global_links_info[:, :n], new.global_links_info[:, :n]
+    if tolerance > 0:
+        differ = ~np.isclose(new_info, old_info, rtol=tolerance, atol=0, equal_nan=True)
+    else:
+        differ = old_info != new_info
+    changed[:n] = differ.any(axis=(0, 2))
+    return np.flatnonzero(changed)
+
+
+def client_view(old, new, link_ids, global_link_ids):
+    """
+    Snapshot of what a client holds after applying a delta from old to new
+
+    Segments and global segments left out of the delta keep their old values on the client. With
+    a tolerance these differ slightly from new, so the next delta is computed against them and the
+    differences never add up beyond the tolerance.
+    """
+    view = copy.copy(new)
+    unchanged = np.ones(len(new.links["flow"]), dtype=bool)
+    unchanged[link_ids] = False
+    unchanged = np.flatnonzero(unchanged)
+    view.links = dict(new.links)
+    for name in PyNetworkSnapshot.float_link_columns:
+        column = new.links[name].copy()
+        column[unchanged] = old.links[name][unchanged]
+        view.links[name] = column
+
+    unchanged = np.ones(new.global_links_info.shape[1], dtype=bool)
+    unchanged[global_link_ids] = False
+    unchanged = np.flatnonzero(unchanged)
+    view.global_links_info = new.global_links_info.copy()
+    view.global_links_info[:, unchanged] = old.global_links_info[:, unchanged]
+    return view
+
+
+class PyNetworkHistory:
+    """
+    Snapshots of the last responses of every network, so that clients get deltas against them
+
+    Attributes:
+        - size: Number of snapshots kept per network, older ones get full responses
+        - snapshots: {network: {snapshot ID: PyNetworkSnapshot}}, forgotten with the network
+        - ids: Source of the snapshot IDs, unique across all networks
+        - states: {network: (state, snapshot ID)} of the last full response of every network
+    """
+
+    def __init__(self, size=8):
+        self.size = size
+        self.snapshots = weakref.WeakKeyDictionary()
+        self.ids = itertools.count(1)
+        self.states = weakref.WeakKeyDictionary()
+
+    def get(self, network, snapshot_id):
+        """
+        Snapshot of a network, None if it is unknown or too old
+        """
+        return self.snapshots.get(network, {}).get(snapshot_id)
+
+    def current(self, network, state):
+        """
+        ID of the snapshot recorded for a network in state, None if the state changed since or the
+        snapshot was dropped. Full responses of an unchanged network share one snapshot this way.
+        """
+        recorded = self.states.get(network)
+        if recorded is None or recorded[0] != state or self.get(network, recorded[1]) is None:
+            return None
+        return recorded[1]
+
+    def record(self, network, snapshot, state=None):
+        """
+        Keep the snapshot of a response of a network
+
+            - state: Versions the network and the global information had, for current
+
+        Return:
+            - ID of the snapshot, sent to the client
+        """
+        snapshot_id = next(self.ids)
+        snapshots = self.snapshots.setdefault(network, {})
+        snapshots[snapshot_id] = snapshot
+        while len(snapshots) > self.size:
+            del snapshots[next(iter(snapshots))]
+        if state is not None:
+            self.states[network] = (state, snapshot_id)
+        return snapshot_id
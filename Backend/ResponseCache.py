@@ -0,0 +1,100 @@
+import json
+import weakref
+import numpy as np
+
+
+class PyResponseCache:
+    """
+    JSON of the network responses, encoded once and reused until the network or the global information changes
+
+    Attributes:
+        - dumps: Function encoding an object as a JSON string
+        - networks: {network: {demand encoding: (key, members)}}, the part of a network response
+          that only depends on the network, forgotten with the network
+        - shared: (key, {name: value JSON}) of the global nodes, segments and aggregates that every
+          response carries
+
+    A network entry is current while the network and its segment table have the versions it was
+    encoded from, every edit and every solve bumps them. Members are encoded as `"name":value,...`
+    without braces, so that responses are put together from the cached bytes without decoding them.
+    """
+
+    def __init__(self, dumps):
+        self.dumps = dumps
+        self.networks = weakref.WeakKeyDictionary()
+        self.shared = (None, {})
+
+    @staticmethod
+    def network_key(network):
+        return (network.version, network.m_link.version)
+
+    def get_network(self, network, encoding):
+        """
+        Encoded members of a network response if they are current, else None
+        """
+        entry = self.networks.get(network, {}).get(encoding)
+        if entry is None or entry[0] != self.network_key(network):
+            return None
+        return entry[1]
+
+    def set_network(self, network, encoding, data):
+        """
+        Encode and keep the dict data of a network response
+
+        Return:
+            - The encoded members
+        """
+        members = self.members(data)
+        self.networks.setdefault(network, {})[encoding] = (self.network_key(network), members)
+        return members
+
+    def get_shared(self, key, build):
+        """
+        {name: value JSON} of the global information, build() gives the values when key changed
+        """
+        if self.shared[0] != key:
+            self.shared = (key, {name: self.dumps(value).encode() for name, value in build().items()})
+        return self.shared[1]
+
+    def members(self, data):
+        """
+        Members of the JSON object of the dict data, without the braces
+        """
+        return self.dumps(data).encode()[1:-1]
+
+    @staticmethod
+    def join(*members):
+        """
+        JSON object of encoded members
+        """
+        return b"{" + b",".join(member for member in members if member) + b"}"
+
+
+def column_frame(header, names, shape, dtype="<f4"):
+    """
+    Buffer of a binary column frame and a writable view of its columns, to fill in place
+
+        - header: Dict sent in the JSON header, completed with the dtype, shape and column offsets
+        - names: Name of every column
+        - shape: Shape of every column, stored row-major
+
+    Layout: header length (uint32, little endian), header JSON padded with spaces to 8 bytes, then
+    the columns back to back. Column offsets are counted from the end of the header, so a client
+    makes a typed array view per column without copying.
+
+    Return:
+        - The buffer (bytearray) and the column view [column, *shape]
+    """
+    dtype = np.dtype(dtype)
+    column_size = int(np.prod(shape)) * dtype.itemsize
+    header = dict(header, dtype=dtype.name, byteOrder="little", shape=list(shape),
+                  columns=[{"name": name, "offset": i * column_size} for i, name in enumerate(names)])
+    encoded = json.dumps(header, separators=(",", ":")).encode()
+    encoded += b" " * (-(4 + len(encoded)) % 8)
+    data_start = 4 + len(encoded)
+
+    buffer = bytearray(data_start + len(names) * column_size)
+    buffer[:4] = len(encoded).to_bytes(4, "little")
+    buffer[4:data_start] = encoded
+    columns = np.frombuffer(buffer, dtype=dtype, count=len(names) * int(np.prod(shape)), offset=data_start)
+    return buffer, columns.reshape((len(names),) + tuple(shape))
@@ -0,0 +1,294 @@
+import copy
+import multiprocessing
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Worker pools by number of processes, created on first use
+_pools = {}
+
+# Arguments of every edit of a batch, named as in the query of its own endpoint
+edit_args = {
+    "newLink": ["startPtId", "endPtId", "capacity", "freeFlowTravelTime"],
+    "delLink": ["linksIdx"],
+    "newNode": ["nodeLat", "nodeLng", "formerLinkA", "aFFTT", "formerLinkB", "bFFTT"],
+    "delNode": ["nodeIdx"],
+    "linkReset": ["linkIdx", "freeFlowTravelTime", "capacity"]
+}
+
+
+def invalid_link_values(args, with_inverse=False):
+    """
+    Error message if segment values of an edit are not positive, None if they are valid
+
+        - args: Arguments of a newLink or linkReset edit
+        - with_inverse: Also check the values of the inverse segment of a newLink edit
+
+    A segment with no capacity or no free flow travel time has an infinite or undefined flow
+    ratio and speed, which the solver and the global aggregates cannot handle.
+    """
+    names = ["capacity", "freeFlowTravelTime"] + (["iCapacity", "iFreeFlowTravelTime"] if with_inverse else [])
+    for name in names:
+        if not args[name] > 0:
+            return f"{name} {args[name]} invalid, it must be positive"
+    return None
+
+
+def invalid_edit(edits):
+    """
+    First edit of a batch with an unknown type, a missing argument or invalid segment values, None
+    if they are all valid
+
+        - edits: List of {"edit": <endpoint name>, <arguments of the endpoint>...}
+    """
+    for edit in edits:
+        required = edit_args.get(edit.get("edit"), [])
+        inverse = edit.get("edit") == "newLink" and edit.get("iExist", False)
+        if inverse:
+            required = required + ["iCapacity", "iFreeFlowTravelTime"]
+        if edit.get("edit") not in edit_args or any(arg not in edit for arg in required):
+            return edit
+        if edit["edit"] in ("newLink", "linkReset") and invalid_link_values(edit, inverse) is not None:
+            return edit
+    return None
+
+
+def apply_edits(network, edits):
+    """
+    Apply a batch of edits to a network, then update its paths and solve it once
+
+        - network: Network to edit
+        - edits: List of {"edit": <endpoint name>, <arguments of the endpoint>...}, applied in order,
+          so segment and node IDs refer to the network as left by the previous edits
+
+    Return:
+        - The edit log entries, as the endpoints of the edits log them, None if nothing changed
+    """
+    new_edits = []
+    changed = False
+    kept_paths = True
+    former_cost = network.cost_sum
+    for edit in edits:
+        edit_type = edit["edit"]
+        if edit_type in ("newLink", "linkReset"):
+            error = invalid_link_values(edit, edit_type == "newLink" and edit.get("iExist", False))
+            if error is not None:
+                raise ValueError(error)
+        if edit_type == "newLink":
+            link_id1, new_edits1 = network.add_link(
+                edit["startPtId"], edit["endPtId"], edit["capacity"], edit["freeFlowTravelTime"], False)
+            if edit.get("iExist", False):
+                link_id2, new_edits2 = network.add_link(
+                    edit["endPtId"], edit["startPtId"], edit["iCapacity"], edit["iFreeFlowTravelTime"], False)
+                new_edits1 = list(set(new_edits1).union(new_edits2))
+            new_edits.extend({"edit_type": new_edit_type, "edit_on_this": True} for new_edit_type in new_edits1)
+            changed, kept_paths = True, False
+        elif edit_type == "delLink":
+            links_to_del = edit["linksIdx"]
+            network.del_link([links_to_del] if type(links_to_del) == int else list(links_to_del), False)
+            new_edits.append({"edit_type": 6, "edit_on_this": True})
+            changed, kept_paths = True, False
+        elif edit_type == "newNode":
+            add_node_res = network.add_node(edit["nodeLat"], edit["nodeLng"], edit["formerLinkA"],
+                                            edit["aFFTT"], edit["formerLinkB"], edit["bFFTT"], False)
+            new_edits.append({"edit_type": 3, "edit_on_this": True})
+            changed, kept_paths = True, kept_paths and not add_node_res
+        elif edit_type == "delNode":
+            if network.del_node(edit["nodeIdx"], False):
+                new_edits.append({"edit_type": 4, "edit_on_this": True})
+                changed, kept_paths = True, False
+        else:
+            res1 = network.change_link_free_travel_time(edit["linkIdx"], edit["freeFlowTravelTime"])
+            if res1 >= 1:
+                new_edits.append({"edit_type": res1, "edit_on_this": True})
+            res2 = network.change_link_capcity(edit["linkIdx"], edit["capacity"])
+            if res2 >= 1:
+                new_edits.append({"edit_type": res2, "edit_on_this": True})
+            if res1 >= 1 or res2 >= 1:
+                changed, kept_paths = True, False
+
+    if not changed:
+        return None
+    network.update_paths()
+    network.LogitSUE()
+    # Like /data/newNode, only splitting segments keeps the cost of the network
+    if kept_paths:
+        network.cost_sum = former_cost
+    return new_edits
+
+
+def network_state(network):
+    """
+    Pickled state of a network, to be solved in another process
+
+    The copy owns all its parts and has no progress callback, which would not pickle.
+    """
+    state = copy.copy(network)
+    state.progress = None
+    state.shared_parts = set()
+    return pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _solve_scenario(args):
+    """
+    Edit and solve a pickled network in a worker process
+
+    The convergence traces of the workers are not written to files, as they would all write the
+    same file, and their shortest path searches stay in the worker.
+    """
+    state, edits = args
+    begtime = time.time()
+    scenario = pickle.loads(state)
+    output_path, processes = scenario.output_path, scenario.shortest_path_processes
+    scenario.output_path, scenario.shortest_path_processes = None, 0
+    new_edits = apply_edits(scenario, edits)
+    scenario.output_path, scenario.shortest_path_processes = output_path, processes
+    return pickle.dumps((scenario, new_edits, time.time() - begtime), protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def solve_scenarios(network, edit_sets, processes=0):
+    """
+    Solve one scenario per batch of edits, all branching off the same network
+
+    Parameters:
+        - network: Network the scenarios start from, left unchanged
+        - edit_sets: One list of edits per scenario, see apply_edits
+        - processes: Number of worker processes, 0 solves the scenarios one after another in the
+          calling process
+
+    The scenarios are independent, so each worker gets the pickled network and returns it
+    edited and solved; the speedup is close to the number of processes once every worker has
+    a few scenarios. An edit that fails fails the whole sweep.
+
+    Return:
+        - One (network, edit log entries or None, seconds) per scenario, in order
+    """
+    if processes <= 1 or len(edit_sets) < 2:
+        results = []
+        for edits in edit_sets:
+            begtime = time.time()
+            scenario = network.fork()
+            results.append((scenario, apply_edits(scenario, edits), time.time() - begtime))
+        return results
+
+    if processes not in _pools:
+        # Spawned rather than forked: the server has threads, and a forked worker could inherit
+        # a lock that one of them holds
+        _pools[processes] = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+    state = network_state(network)
+    return [pickle.loads(result)
+            for result in _pools[processes].map(_solve_scenario, [(state, edits) for edits in edit_sets])]
+
+
+def _scenario_summary(base, scenario, seconds):
+    """
+    Measures of a solved scenario, compared with the network it branched off
+    """
+    return {
+        "costSum": float(scenario.cost_sum),
+        "costSumChange": float(scenario.cost_sum - base.cost_sum),
+        "avgSpeed": float(scenario.avg_speed),
+        "avgSpeedChange": float(scenario.avg_speed - base.avg_speed),
+        # Their demand is not assigned, so it is missing from the cost
+        "disconnectedOdPairs": sum(len(od_pair.p_od_path) == 0 for od_pair in scenario.m_od_pairs),
+        "iterations": scenario.solve_report["iterations"],
+        "seconds": seconds
+    }
+
+
+def _evaluate(base, edit_sets, warm_start):
+    """
+    Edit and solve scenarios of a network, keeping only their measures
+
+    Every scenario is a fork of base, warm-started from its equilibrium if warm_start. A failed
+    scenario gets its error instead of measures.
+    """
+    summaries = []
+    for edits in edit_sets:
+        begtime = time.time()
+        scenario = base.fork()
+        scenario.output_path, scenario.shortest_path_processes = None, 0
+        scenario.progress, scenario.warm_start = None, warm_start
+        try:
+            apply_edits(scenario, edits)
+        except Exception as error:
+            summaries.append({"error": f"{type(error).__name__}: {error}"})
+            continue
+        summaries.append(_scenario_summary(base, scenario, time.time() - begtime))
+    return summaries
+
+
+def _evaluate_chunk(args):
+    """
+    Evaluate a chunk of scenarios of a pickled network in a worker process, see _evaluate
+    """
+    state, edit_sets, warm_start = args
+    return _evaluate(pickle.loads(state), edit_sets, warm_start)
+
+
+def evaluate_scenarios(network, edit_sets, processes=0, warm_start=True):
+    """
+    Measures of one scenario per batch of edits, without keeping the solved networks
+
+    Parameters:
+        - network: Solved network the scenarios start from, left unchanged
+        - edit_sets: One list of edits per scenario, see apply_edits
+        - processes: Number of worker processes, 0 solves the scenarios in the calling process
+        - warm_start: Start every solve from the equilibrium of network rather than from free flow
+
+    Unlike solve_scenarios, a worker gets the network once for a chunk of scenarios and only
+    sends back their measures, which keeps sweeps over hundreds of scenarios cheap.
+
+    Return:
+        - One dict per scenario, in order, see _scenario_summary
+    """
+    if processes <= 1 or len(edit_sets) < 2:
+        return _evaluate(network, edit_sets, warm_start)
+
+    if processes not in _pools:
+        _pools[processes] = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+    state = network_state(network)
+    # A few chunks per worker balance scenarios of uneven cost
+    chunk_size = max(1, len(edit_sets) // (processes * 4))
+    chunks = [(state, edit_sets[k:k + chunk_size], warm_start) for k in range(0, len(edit_sets), chunk_size)]
+    return [summary for summaries in _pools[processes].map(_evaluate_chunk, chunks) for summary in summaries]
+
+
+def link_criticality(network, mode="remove", processes=0, link_ids=None):
+    """
+    Rank segments by the impact of closing them, or of halving their capacity
+
+    Parameters:
+        - network: Solved network
+        - mode: "remove" deletes each segment, "halve" halves its capacity
+        - processes: Number of worker processes, 0 solves the scenarios in the calling process
+        - link_ids: Segments to evaluate, None for all of them
+
+    Every segment is a scenario solved from the equilibrium of the network, see evaluate_scenarios.
+
+    Return:
+        - One dict per segment, with its ID, its flow and the measures of its scenario, most
+          critical first: the segments that disconnect OD pairs, then by decreasing cost increase.
+          Failed scenarios come last.
+    """
+    if link_ids is None:
+        link_ids = list(range(network.m_n_link))
+    link_table = network.m_link
+    if mode == "remove":
+        edit_sets = [[{"edit": "delLink", "linksIdx": [link_id]}] for link_id in link_ids]
+    else:
+        edit_sets = [[{"edit": "linkReset", "linkIdx": link_id,
+                       "freeFlowTravelTime": float(link_table.free_flow_travel_time[link_id]),
+                       "capacity": float(link_table.capacity[link_id]) / 2}] for link_id in link_ids]
+
+    rows = []
+    for link_id, summary in zip(link_ids, evaluate_scenarios(network, edit_sets, processes)):
+        rows.append({
+            "linkIdx": link_id,
+            "globalId": int(link_table.global_id[link_id]),
+            "flow": float(network.links_flow[link_id]),
+            "capacity": float(link_table.capacity[link_id]),
+            **summary
+        })
+    rows.sort(key=lambda row: ("error" in row, -row.get("disconnectedOdPairs", 0), -row.get("costSumChange", 0)))
+    return rows
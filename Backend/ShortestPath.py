@@ -0,0 +1,263 @@
+import heapq
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# Process pools shared by all networks, keyed by the number of worker processes
+_pools = {}
+
+
+def build_csr_adjacency(n_node, in_node, out_node, weight):
+    """
+    Build the CSR adjacency of a directed network
+
+    Parameters:
+        - n_node: Number of nodes
+        - in_node: Starting node ID of each segment
+        - out_node: Ending node ID of each segment
+        - weight: Weight of each segment
+
+    Return:
+        - indptr: Row offsets, the segments leaving node i are indptr[i]:indptr[i+1]
+        - heads: Ending node ID of each segment in CSR order
+        - weights: Weight of each segment in CSR order
+    """
+    in_node = np.asarray(in_node, dtype=np.int64)
+    order = np.argsort(in_node, kind='stable')
+    indptr = np.zeros(n_node + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(in_node, minlength=n_node))
+    heads = np.asarray(out_node, dtype=np.int64)[order]
+    weights = np.asarray(weight, dtype=float)[order]
+    return indptr, heads, weights
+
+
+def dijkstra(indptr, heads, weights, source, targets=None):
+    """
+    Heap-based Dijkstra from a single source
+
+    Parameters:
+        - indptr, heads, weights: CSR adjacency (lists or arrays)
+        - source: Node ID of the starting point
+        - targets: Stop once all of these nodes are settled (None: settle every node)
+
+    Return:
+        - List of the shortest distance from source to each node
+    """
+    n_node = len(indptr) - 1
+    dist = [float('inf')] * n_node
+    settled = [False] * n_node
+    dist[source] = 0.0
+    target_set = set(targets) if targets is not None else None
+    remaining = len(target_set) if target_set is not None else n_node
+
+    heap = [(0.0, source)]
+    while heap:
+        now_dist, i = heapq.heappop(heap)
+        if settled[i]:
+            continue
+        settled[i] = True
+        if target_set is None or i in target_set:
+            remaining -= 1
+            if remaining == 0:
+                break
+
+        for pos in range(indptr[i], indptr[i + 1]):
+            j = heads[pos]
+            new_dist = now_dist + weights[pos]
+            if new_dist < dist[j]:
+                dist[j] = new_dist
+                heapq.heappush(heap, (new_dist, j))
+    return dist
+
+
+def distance_bounds(indptr, heads, weights, source, targets, stretch=3.0):
+    """
+    Lower bounds of the shortest distances from a source, exact near the targets
+
+    Parameters:
+        - indptr, heads, weights: CSR adjacency (lists or arrays)
+        - source: Node ID of the starting point
+        - targets: Nodes whose distances must be exact
+        - stretch: Distances are exact up to stretch times the distance of the farthest target
+
+    The nodes left once the search passes that radius get the radius, which they are at least as
+    far as. min(distance, radius) is still a consistent A* heuristic, and on large networks the
+    search stays near the targets instead of settling every node.
+
+    Return:
+        - List of the bound of each node, inf for the nodes that cannot be reached
+    """
+    n_node = len(indptr) - 1
+    dist = [float('inf')] * n_node
+    settled = [False] * n_node
+    dist[source] = 0.0
+    remaining = set(targets)
+    radius = float('inf')
+
+    heap = [(0.0, source)]
+    while heap:
+        now_dist, i = heapq.heappop(heap)
+        if settled[i]:
+            continue
+        if now_dist > radius:
+            heapq.heappush(heap, (now_dist, i))
+            break
+        settled[i] = True
+        remaining.discard(i)
+        if len(remaining) == 0 and radius == float('inf'):
+            radius = stretch * now_dist
+
+        for pos in range(indptr[i], indptr[i + 1]):
+            j = heads[pos]
+            new_dist = now_dist + weights[pos]
+            if new_dist < dist[j]:
+                dist[j] = new_dist
+                heapq.heappush(heap, (new_dist, j))
+
+    if heap:
+        for i in range(n_node):
+            if not settled[i]:
+                dist[i] = radius
+    return dist
+
+
+def _spur_path(outgoing, head_ids, fftt, source, target, dist_to_target, root_len, banned_nodes, banned_links):
+    """
+    A* search of the shortest path from a spur node to the target, see k_shortest_paths
+
+        - root_len: Length of the path up to the spur node, the lengths are summed from there
+        - banned_nodes, banned_links: Nodes and segments the path must not use
+
+    Return:
+        - (length, segments, nodes) of the path, None if there is none
+    """
+    dist = {source: root_len}
+    parent = {}
+    settled = set()
+    heap = [(root_len + dist_to_target[source], 0, source)]
+    pushed = 1
+    while heap:
+        _, _, i = heapq.heappop(heap)
+        if i in settled:
+            continue
+        if i == target:
+            break
+        settled.add(i)
+        for link in outgoing[i]:
+            j = head_ids[link]
+            if j in settled or j in banned_nodes or link in banned_links or dist_to_target[j] == float('inf'):
+                continue
+            new_dist = dist[i] + fftt[link]
+            if new_dist < dist.get(j, float('inf')):
+                dist[j] = new_dist
+                parent[j] = (i, link)
+                heapq.heappush(heap, (new_dist + dist_to_target[j], pushed, j))
+                pushed += 1
+    else:
+        return None
+
+    links, nodes = [], [target]
+    while nodes[-1] != source:
+        i, link = parent[nodes[-1]]
+        links.append(link)
+        nodes.append(i)
+    return dist[target], links[::-1], nodes[::-1]
+
+
+def k_shortest_paths(outgoing, head_ids, fftt, source, target, dist_to_target, found=None):
+    """
+    Loopless paths from a source to a target in order of length (Yen's algorithm)
+
+    Parameters:
+        - outgoing: IDs of the segments leaving each node
+        - head_ids: Ending node ID of each segment
+        - fftt: Length of each segment
+        - source, target: Node IDs of the starting and ending points
+        - dist_to_target: Shortest length from every node to the target, or a lower bound of it
+          as given by distance_bounds. It is the A* heuristic of the spur searches, which then
+          mostly settle nodes on the shortest spur paths
+        - found: List extended with the segments of every distinct path found, including the
+          candidates not yielded yet
+
+    Every yielded path costs one spur search per segment of the previous one, and only the
+    candidates of the yielded paths are kept, so the work and memory grow with the number of
+    paths taken rather than with the size of the network.
+
+    Yield:
+        - (length, segments from source to target) of each path, lengths summed from the source
+    """
+    if dist_to_target[source] == float('inf'):
+        return
+    path = _spur_path(outgoing, head_ids, fftt, source, target, dist_to_target, 0.0, set(), set())
+    accepted = []
+    candidates = []
+    seen = {tuple(path[1])}
+    if found is not None:
+        found.append(path[1])
+    while True:
+        yield path[0], path[1]
+        accepted.append(path)
+        _, links, nodes = path
+        root_len = 0.0
+        for i in range(len(links)):
+            # Deviate from the path at its i-th node, without reusing the root or its former deviations
+            root = links[:i]
+            banned_links = {other[1][i] for other in accepted if len(other[1]) > i and other[1][:i] == root}
+            spur = _spur_path(outgoing, head_ids, fftt, nodes[i], target, dist_to_target, root_len,
+                              set(nodes[:i]), banned_links)
+            root_len += fftt[links[i]]
+            if spur is None or tuple(root + spur[1]) in seen:
+                continue
+            candidate = (spur[0], root + spur[1], nodes[:i] + spur[2])
+            seen.add(tuple(candidate[1]))
+            if found is not None:
+                found.append(candidate[1])
+            heapq.heappush(candidates, (candidate[0], len(seen), candidate))
+        if not candidates:
+            return
+        path = heapq.heappop(candidates)[2]
+
+
+def _dijkstra_chunk(args):
+    """
+    Run dijkstra for a chunk of sources in a worker process
+    """
+    indptr, heads, weights, sources, targets = args
+    return [dijkstra(indptr, heads, weights, source, targets[k]) for k, source in enumerate(sources)]
+
+
+def multi_source_dijkstra(indptr, heads, weights, sources, targets=None, processes=0):
+    """
+    Shortest distances from several sources
+
+    Parameters:
+        - indptr, heads, weights: CSR adjacency
+        - sources: Node IDs of the starting points
+        - targets: For each source, the nodes whose distances are needed (None: all nodes)
+        - processes: Number of worker processes, 0 runs in the calling process
+
+    Return:
+        - Dict mapping each source to the list of its shortest distances
+    """
+    indptr = indptr.tolist() if isinstance(indptr, np.ndarray) else indptr
+    heads = heads.tolist() if isinstance(heads, np.ndarray) else heads
+    weights = weights.tolist() if isinstance(weights, np.ndarray) else weights
+    sources = [int(source) for source in sources]
+    if targets is None:
+        targets = [None] * len(sources)
+
+    if processes <= 1 or len(sources) < 2:
+        dists = _dijkstra_chunk((indptr, heads, weights, sources, targets))
+    else:
+        if processes not in _pools:
+            # Spawned rather than forked, as the pools of Scenarios.py: the server has threads, and
+            # a forked worker could inherit a lock that one of them holds
+            _pools[processes] = ProcessPoolExecutor(max_workers=processes,
+                                                    mp_context=multiprocessing.get_context("spawn"))
+        chunk_size = (len(sources) + processes - 1) // processes
+        chunks = [(indptr, heads, weights, sources[k:k + chunk_size], targets[k:k + chunk_size])
+                  for k in range(0, len(sources), chunk_size)]
+        dists = [dist for chunk_dists in _pools[processes].map(_dijkstra_chunk, chunks)
+                 for dist in chunk_dists]
+
+    return dict(zip(sources, dists))
@@ -0,0 +1,167 @@
+import itertools
+import json
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PySolveCancelled(Exception):
+    """
+    Raised in a cancelled job, by its progress callback or by the job itself, to stop it
+    """
+
+
+class PySolveJob:
+    """
+    An edit and its solve, queued on the worker pool
+
+    Attributes:
+        - id: Job ID
+        - network_idx: Network the edit was requested on
+        - status: "queued", "running", "done", "failed" or "cancelled"
+        - progress: {"iteration", "normD", "ueGap"} of the last LogitSUE iteration, None before the first
+        - snapshot: Last intermediate result published by the job, None before the first
+        - result: Encoded response of the edit once done
+        - error: Error message once failed
+        - cancelled: Set by cancel, the job stops at its next LogitSUE iteration
+        - condition: Notified on every change, for the event streams
+    """
+    finished = ("done", "failed", "cancelled")
+
+    def __init__(self, job_id, network_idx):
+        self.id = job_id
+        self.network_idx = network_idx
+        self.status = "queued"
+        self.progress = None
+        self.snapshot = None
+        self.result = None
+        self.error = None
+        self.cancelled = threading.Event()
+        self.condition = threading.Condition()
+
+    def _set(self, **values):
+        with self.condition:
+            for name, value in values.items():
+                setattr(self, name, value)
+            self.condition.notify_all()
+
+    def report(self, iteration, norm_d, ue_gap):
+        """
+        Progress callback of LogitSUE, see PyNetwork.progress, stops the solve once the job is cancelled
+        """
+        if self.cancelled.is_set():
+            raise PySolveCancelled()
+        self._set(progress={"iteration": iteration, "normD": float(norm_d), "ueGap": float(ue_gap)})
+
+    def publish(self, snapshot):
+        """
+        Publish an intermediate result of the job, sent as a "snapshot" event
+        """
+        self._set(snapshot=snapshot)
+
+    def cancel(self):
+        """
+        Ask the job to stop, it is "cancelled" once it did
+        """
+        self.cancelled.set()
+
+    def info(self):
+        return {
+            "jobId": self.id,
+            "networkIdx": self.network_idx,
+            "status": self.status,
+            "progress": self.progress,
+            "snapshot": self.snapshot,
+            "error": self.error
+        }
+
+    def events(self, keep_alive=15):
+        """
+        Server-Sent Events of the job
+
+        A "status" event whenever the status changes, a "progress" event with the last iteration
+        whenever there were new ones (iterations in between are skipped if the client is slower
+        than the solver), a "snapshot" event with every intermediate result published, and a
+        comment every keep_alive seconds without news. Ends after the "status" event of a finished job.
+        """
+        sent_status, sent_progress, sent_snapshot = None, None, None
+        while True:
+            with self.condition:
+                self.condition.wait_for(
+                    lambda: self.status is not sent_status or self.progress is not sent_progress
+                    or self.snapshot is not sent_snapshot, keep_alive)
+                status, progress, snapshot = self.status, self.progress, self.snapshot
+
+            if progress is sent_progress and status is sent_status and snapshot is sent_snapshot:
+                yield ": keep-alive\n\n"
+                continue
+            if progress is not sent_progress:
+                sent_progress = progress
+                yield f"event: progress\ndata: {json.dumps(progress)}\n\n"
+            if snapshot is not sent_snapshot:
+                sent_snapshot = snapshot
+                yield f"event: snapshot\ndata: {json.dumps(snapshot)}\n\n"
+            if status is not sent_status:
+                sent_status = status
+                yield f"event: status\ndata: {json.dumps(self.info())}\n\n"
+                if status in self.finished:
+                    return
+
+
+class PySolveJobs:
+    """
+    Worker pool running edits and their solves off the request threads
+
+    Attributes:
+        - executor: Thread pool, solves of different networks run concurrently
+        - jobs: {job ID: PySolveJob}, the last `keep` finished jobs are kept for their results
+        - keep: Number of finished jobs kept
+
+    Threads keep the HTTP server responsive and let the NumPy parts of concurrent solves overlap,
+    the pure Python loops of the "loop" solver still share the interpreter lock.
+    """
+
+    def __init__(self, workers=4, keep=64):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="solve")
+        self.jobs = {}
+        self.keep = keep
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def submit(self, network_idx, run):
+        """
+        Queue run(job), which returns the encoded response of the edit
+
+        Return:
+            - The job
+        """
+        with self.lock:
+            job = PySolveJob(next(self.ids), network_idx)
+            self.jobs[job.id] = job
+            finished = [job_id for job_id, other in self.jobs.items() if other.status in PySolveJob.finished]
+            for job_id in finished[:max(0, len(finished) - self.keep)]:
+                del self.jobs[job_id]
+        self.executor.submit(self._run, job, run)
+        return job
+
+    @staticmethod
+    def _run(job, run):
+        if job.cancelled.is_set():
+            job._set(status="cancelled")
+            return
+        job._set(status="running")
+        try:
+            result = run(job)
+        except PySolveCancelled:
+            job._set(status="cancelled")
+        except Exception as error:
+            traceback.print_exc()
+            job._set(status="failed", error=f"{type(error).__name__}: {error}")
+        else:
+            job._set(status="done", result=result)
+
+    def get(self, job_id):
+        """
+        A job, None if it is unknown or was dropped
+        """
+        return self.jobs.get(job_id)
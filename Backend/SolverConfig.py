@@ -0,0 +1,164 @@
+import numpy as np
+
+
+class PyMSAStep:
+    """
+    Method of successive averages: the k-th step is 1/k, i.e. Beta grows by one every iteration
+
+    Attributes:
+        - beta: Inverse of the next step
+    """
+
+    def __init__(self, network, beta):
+        self.beta = beta
+
+    def step(self, link_flow, direction, norm_d, last_norm_d):
+        """
+        Step along the descent direction, link_flow -= step * direction
+
+        Parameters:
+            - link_flow: Current segment flows
+            - direction: Descent direction, the current flows minus the flows loaded on their costs
+            - norm_d, last_norm_d: Norm of the descent direction and of the previous one
+        """
+        step = 1 / self.beta
+        self.beta += 1
+        return step
+
+
+class PyAdaptiveStep:
+    """
+    Self-regulated average, the rule of the original LogitSUE: Beta grows by ita when the descent
+    direction did not shrink, by gama otherwise
+
+    Attributes:
+        - beta: Inverse of the last step
+        - ita, gama: Growths of Beta, see PyNetwork
+    """
+
+    def __init__(self, network, beta):
+        self.beta = beta
+        self.ita = network.ita
+        self.gama = network.gama
+
+    def step(self, link_flow, direction, norm_d, last_norm_d):
+        if norm_d >= last_norm_d:
+            self.beta += self.ita
+        else:
+            self.beta += self.gama
+        return 1 / self.beta
+
+
+class PyBarzilaiBorweinStep(PyAdaptiveStep):
+    """
+    Barzilai-Borwein step on the fixed point residual (the descent direction)
+
+    With s and r the changes of the flows and of the descent direction over the last step, the step
+    is s.r / r.r clipped to [min_step, 1], the inverse of the slope of the residual along the last
+    step. The first step, and any step where the residual did not grow along s, is the adaptive one.
+    """
+    min_step = 1e-3
+
+    def __init__(self, network, beta):
+        super().__init__(network, beta)
+        self.last_flow = None
+        self.last_direction = None
+
+    def step(self, link_flow, direction, norm_d, last_norm_d):
+        link_flow = np.array(link_flow, dtype=float)
+        direction = np.array(direction, dtype=float)
+        step = super().step(link_flow, direction, norm_d, last_norm_d)
+        if self.last_flow is not None:
+            s = link_flow - self.last_flow
+            r = direction - self.last_direction
+            s_r, r_r = float(np.dot(s, r)), float(np.dot(r, r))
+            if s_r > 0 and r_r > 0:
+                step = min(max(s_r / r_r, self.min_step), 1.0)
+        self.last_flow, self.last_direction = link_flow, direction
+        return step
+
+
+# Step rules by name, new rules only need a class with the same constructor and step method
+step_rules = {
+    "msa": PyMSAStep,
+    "adaptive": PyAdaptiveStep,
+    "bb": PyBarzilaiBorweinStep,
+}
+
+
+class PySolverConfig:
+    """
+    Step rule and stopping criteria of LogitSUE
+
+    The stopping criteria add up with those LogitSUE always had: NormD below PyNetwork.max_ue_gap,
+    and NormD not changing. Forks of a network share its configuration, so it is replaced rather
+    than modified (see replace).
+
+    Attributes:
+        - step_rule: Name of the step rule, a key of step_rules
+        - rel_gap: Stop once NormD is below this fraction of the norm of the segment flows, 0 to
+          disable; the UE gap of a logit assignment does not go to zero, so this is the criterion
+          of a "good enough" solve
+        - max_iterations: Stop after this many iterations, 0 for no limit
+        - time_budget: Stop once the solve took this many seconds, 0 for no limit
+    """
+    # Request argument of each attribute, and its type
+    args = {
+        "stepRule": ("step_rule", str),
+        "relGap": ("rel_gap", float),
+        "maxIterations": ("max_iterations", int),
+        "timeBudget": ("time_budget", float),
+    }
+
+    def __init__(self, step_rule="adaptive", rel_gap=0.0, max_iterations=0, time_budget=0.0):
+        if step_rule not in step_rules:
+            raise ValueError(f"step rule {step_rule} invalid. valid step rules: {', '.join(step_rules)}")
+        if rel_gap < 0 or max_iterations < 0 or time_budget < 0:
+            raise ValueError("relGap, maxIterations and timeBudget must not be negative")
+        self.step_rule = step_rule
+        self.rel_gap = rel_gap
+        self.max_iterations = max_iterations
+        self.time_budget = time_budget
+
+    def replace(self, **changes):
+        """
+        Copy of the configuration with some attributes changed, checked as by the constructor
+        """
+        return PySolverConfig(**dict(self.__dict__, **changes))
+
+    def replace_args(self, args):
+        """
+        Copy of the configuration with the attributes given in request arguments (see args) changed
+        """
+        changes = {}
+        for arg, (name, cast) in self.args.items():
+            if arg in args:
+                try:
+                    changes[name] = cast(args[arg])
+                except ValueError:
+                    raise ValueError(f"{arg} {args[arg]} invalid") from None
+        return self.replace(**changes)
+
+    def make_step_rule(self, network, beta):
+        """
+        Step rule of a solve of network, starting from the inverse step beta
+        """
+        return step_rules[self.step_rule](network, beta)
+
+    def stop_reason(self, iterations, rel_gap, elapsed):
+        """
+        Criterion that stops a solve after an iteration, None to go on
+
+            - rel_gap: NormD divided by the norm of the segment flows
+            - elapsed: Seconds since the start of the solve
+        """
+        if self.rel_gap > 0 and rel_gap <= self.rel_gap:
+            return "relGap"
+        if self.max_iterations > 0 and iterations >= self.max_iterations:
+            return "maxIterations"
+        if self.time_budget > 0 and elapsed >= self.time_budget:
+            return "timeBudget"
+        return None
+
+    def to_dict(self):
+        return {arg: getattr(self, name) for arg, (name, _) in self.args.items()}
@@ -1,13 +1,64 @@
 from Network import PyNetwork
-from flask import Flask, jsonify, request
+from GlobalRegistry import PyGlobalRegistry, PyGlobalLinkStats
+from NetworkDelta import (PyNetworkSnapshot, PyNetworkHistory, align_links, changed_links, changed_nodes,
+                          changed_global_links, client_view)
+from ResponseCache import PyResponseCache, column_frame
+from Scenarios import edit_args, invalid_edit, invalid_link_values, apply_edits, solve_scenarios, link_criticality
+from SolveJobs import PySolveJob, PySolveJobs, PySolveCancelled
+from SolverConfig import PySolverConfig, step_rules
+from Metrics import metrics
+from flask import Flask, g, jsonify, request, copy_current_request_context
 from flask_cors import CORS
 import copy
 import argparse
+import functools
+import itertools
+import json
 import os
+import threading
+import time
+import weakref
+import numpy as np
 
 app = Flask(__name__)
 CORS(app)
 
+# Default encoding of the segment demands ("dense" or "sparse"), see _get_links
+demand_encoding = "dense"
+
+# Seconds of the first solve of a progressive edit, and of each round of its refinement, see _refine
+progressive_time_budget = 0.2
+refine_round_time = 1.0
+
+# Held while the networks or the global information are read or changed, edits only take it to
+# adopt their solved network, see _run_edit
+state_lock = threading.RLock()
+
+def _locked(route):
+    """
+    Run a route while holding state_lock, so that it never sees an edit half adopted
+    """
+    @functools.wraps(route)
+    def locked_route(*args, **kwargs):
+        with state_lock:
+            return route(*args, **kwargs)
+    return locked_route
+
+@app.before_request
+def _start_request_timer():
+    g.request_begtime = time.perf_counter()
+
+@app.after_request
+def _observe_request(response):
+    """
+    Record the latency and the body size of every request in the metrics, see /metrics
+    """
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    size = None if response.is_streamed else response.calculate_content_length()
+    metrics.observe_request(route, request.method, response.status_code,
+                            time.perf_counter() - g.request_begtime, size)
+    return response
+
 def parse_args():
     parser = argparse.ArgumentParser(description="Backend script.")
     parser.add_argument(
@@ -17,6 +68,85 @@ def parse_args():
         choices=["data", "data_EasternMassachusetts", "mini_data"],
         help="Folder name for traffic network data.",
     )
+    parser.add_argument(
+        "--solver",
+        type=str,
+        default="loop",
+        choices=["loop", "vectorized"],
+        help="LogitSUE implementation used by the initial network.",
+    )
+    parser.add_argument(
+        "--warm-start",
+        action="store_true",
+        help="Re-solve edited networks starting from their previous segment flows.",
+    )
+    parser.add_argument(
+        "--step-rule",
+        type=str,
+        default="adaptive",
+        choices=list(step_rules),
+        help="LogitSUE step rule: successive averages, the self-regulated average or Barzilai-Borwein.",
+    )
+    parser.add_argument(
+        "--rel-gap",
+        type=float,
+        default=0.0,
+        help="Stop LogitSUE once NormD is below this fraction of the norm of the segment flows, 0 disables it.",
+    )
+    parser.add_argument(
+        "--max-iterations",
+        type=int,
+        default=0,
+        help="Stop LogitSUE after this many iterations, 0 for no limit.",
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        default=0.0,
+        help="Stop LogitSUE after this many seconds, 0 for no limit.",
+    )
+    parser.add_argument(
+        "--demand-encoding",
+        type=str,
+        default="dense",
+        choices=["dense", "sparse"],
+        help="Default JSON encoding of the demand satisfied by each segment.",
+    )
+    parser.add_argument(
+        "--solve-workers",
+        type=int,
+        default=4,
+        help="Threads running the solve jobs of edits requested with async=true.",
+    )
+    parser.add_argument(
+        "--sweep-processes",
+        type=int,
+        default=os.cpu_count(),
+        help="Worker processes solving the scenarios of /data/sweep, 0 solves them in the server process.",
+    )
+    parser.add_argument(
+        "--path-cache",
+        type=str,
+        default=".path_cache",
+        help="Folder of the enumerated path sets, reused on restart while the segments and OD pairs are the same.",
+    )
+    parser.add_argument(
+        "--no-path-cache",
+        action="store_true",
+        help="Always enumerate the paths of the initial network.",
+    )
+    parser.add_argument(
+        "--paths",
+        type=str,
+        default=None,
+        help="Read the paths of the initial network from this path file instead of enumerating them.",
+    )
+    parser.add_argument(
+        "--trace-dir",
+        type=str,
+        default=None,
+        help="Also write the convergence trace of every network to a file of this folder after each solve.",
+    )
     
     args = parser.parse_args()
 
@@ -26,54 +156,87 @@ def parse_args():
     # Get the directory of the current file
     current_directory = os.path.dirname(current_file_path)
     
-    return os.path.join(current_directory, args.dataset)
-
-def _get_links(network_idx: int):
+    path_cache = None if args.no_path_cache else os.path.join(current_directory, args.path_cache)
+    trace_dir = None if args.trace_dir is None else os.path.join(current_directory, args.trace_dir)
+    try:
+        solver_config = PySolverConfig(args.step_rule, args.rel_gap, args.max_iterations, args.time_budget)
+    except ValueError as error:
+        parser.error(str(error))
+    return (os.path.join(current_directory, args.dataset), args.solver, args.warm_start,
+            args.demand_encoding, args.solve_workers, args.sweep_processes, path_cache, args.paths, solver_config,
+            trace_dir)
+
+def _get_links(network_idx: int, sparse_demand=False, link_ids=None):
     """
     Get segment information
+
+        - sparse_demand: Encode the demand of each segment as [[node ID, origin, destination], ...]
+          for the nodes with demand only, instead of an [origin, destination] pair for every node
+        - link_ids: IDs of the segments to get, all segments if None
     """
     tmpNetwork = network
     if network_idx >= 0 and network_idx < len(network_layers):
         tmpNetwork = network_layers[network_idx]
     
+    # Read the columns of the segment table once
+    link_table = tmpNetwork.m_link
+    rows = np.arange(len(link_table)) if link_ids is None else np.asarray(link_ids, dtype=np.int64)
+    in_node_ids = link_table.in_node_ids()[rows].tolist()
+    out_node_ids = link_table.out_node_ids()[rows].tolist()
+    fftt = link_table.free_flow_travel_time[rows].tolist()
+    travel_time = link_table.travel_time[rows].tolist()
+    capacity = link_table.capacity[rows].tolist()
+    global_id = link_table.global_id[rows].tolist()
+    rows = rows.tolist()
+    od_demand_satisfied = [[] for _ in rows]
+    if link_table.od_demand_satisfied is not None:
+        od_demand_satisfied = link_table.od_demand_satisfied.to_lists(sparse_demand, rows)
+
     links = []
-    link_idx = 0
-    for link in tmpNetwork.m_link:
+    for i, link_idx in enumerate(rows):
         links.append({
-            'ID': link.id,
-            'pInNode': link.p_in_node.id,
-            'pOutNode': link.p_out_node.id,
-            'freeFlowTravelTime': link.free_flow_travel_time,
-            'travelTime': link.travel_time,
+            'ID': link_idx,
+            'pInNode': in_node_ids[i],
+            'pOutNode': out_node_ids[i],
+            'freeFlowTravelTime': fftt[i],
+            'travelTime': travel_time[i],
             'flow': tmpNetwork.links_flow[link_idx],
-            'capacity': link.capacity,
-            'globalId': link.global_id,
-            'originDemand': link.od_demand_satisfied
+            'capacity': capacity[i],
+            'globalId': global_id[i],
+            'originDemand': od_demand_satisfied[i]
         })
-        link_idx += 1
     return links
 
-def _get_nodes(network_idx: int):
+def _get_nodes(network_idx: int, node_ids=None):
     """
     Get information about a specific network node
+
+        - node_ids: IDs of the nodes to get, all nodes if None
     """
     tmpNetwork = network
     if network_idx >= 0 and network_idx < len(network_layers):
         tmpNetwork = network_layers[network_idx]
 
+    # Read the columns of the node table once
+    node_table = tmpNetwork.m_node
+    rows = np.arange(len(node_table)) if node_ids is None else np.asarray(node_ids, dtype=np.int64)
+    columns = {name: getattr(node_table, name)[rows].tolist() for name in node_table.columns}
+    out_ptr, out_links, in_ptr, in_links = tmpNetwork.m_link.adjacency()
+    out_ptr, out_links, in_ptr, in_links = out_ptr.tolist(), out_links.tolist(), in_ptr.tolist(), in_links.tolist()
+
     nodes = []
-    for node in tmpNetwork.m_node:
+    for i, node_idx in enumerate(rows.tolist()):
         nodes.append({
-            'id': node.id,
-            'PositionX': node.position_x,
-            'PositionY': node.position_y,
-            'lon': node.lon,
-            'lat': node.lat,
-            'OriginID': node.origin_id,
-            'IncomingLink': node.incoming_link,
-            'OutgoingLink': node.outgoing_link,
-            'globalId': node.global_id,
-            'isOd': node.is_od
+            'id': columns['id'][i],
+            'PositionX': columns['position_x'][i],
+            'PositionY': columns['position_y'][i],
+            'lon': columns['lon'][i],
+            'lat': columns['lat'][i],
+            'OriginID': columns['origin_id'][i],
+            'IncomingLink': in_links[in_ptr[node_idx]:in_ptr[node_idx + 1]],
+            'OutgoingLink': out_links[out_ptr[node_idx]:out_ptr[node_idx + 1]],
+            'globalId': columns['global_id'][i],
+            'isOd': columns['is_od'][i]
         })
     return nodes
 
@@ -85,142 +248,45 @@ def _global_info_set(network_idx: int):
     if network_idx >= 0 and network_idx < len(network_layers):
         tmpNetwork = network_layers[network_idx]
 
+    # Only the nodes and segments without a global ID are registered
+    new_nodes = np.flatnonzero(tmpNetwork.m_node.global_id == -1)
+    new_links = np.flatnonzero(tmpNetwork.m_link.global_id == -1)
+    if len(new_nodes) == 0 and len(new_links) == 0:
+        return
+    tmpNetwork.make_writable("topology")
+
     # node information
-    for i in range(tmpNetwork.m_n_node):
-        if tmpNetwork.m_node[i].global_id == -1:
-            now_node_info = [tmpNetwork.m_node[i].lat, tmpNetwork.m_node[i].lon]
-            try:
-                now_global_idx = nodes_global_info.index(now_node_info)
-            except ValueError as e:
-                # not found
-                now_global_idx = len(nodes_global_info)
-                nodes_global_info.append(now_node_info)
-                tmpNetwork.m_node[i].global_id = now_global_idx
-    
+    node_table = tmpNetwork.m_node
+    node_table.global_id[new_nodes] = [global_registry.node_id(lat, lon)
+                                       for lat, lon in zip(node_table.lat[new_nodes].tolist(),
+                                                           node_table.lon[new_nodes].tolist())]
+
     # global_links_flow_scope
-    for i in range(tmpNetwork.m_n_link):
-        if tmpNetwork.m_link[i].global_id == -1:
-            now_link_info = [tmpNetwork.m_link[i].p_in_node.global_id,
-                             tmpNetwork.m_link[i].p_out_node.global_id]
-            try:
-                now_global_idx = links_global_info.index(now_link_info)
-                tmpNetwork.m_link[i].global_id = now_global_idx
-            except ValueError as e:
-                # not found
-                now_global_idx = len(links_global_info)
-                links_global_info.append(now_link_info)
-                tmpNetwork.m_link[i].global_id = now_global_idx
-
-def _update_global_links_info():
+    link_table = tmpNetwork.m_link
+    in_global_ids = node_table.global_id[link_table.in_node[new_links]].tolist()
+    out_global_ids = node_table.global_id[link_table.out_node[new_links]].tolist()
+    link_table.global_id[new_links] = [global_registry.link_id(in_node, out_node)
+                                       for in_node, out_node in zip(in_global_ids, out_global_ids)]
+    node_table.changed()
+
+def _update_global_links_info(*changed_networks):
     """
     Update global road network information using road information
+
+        - changed_networks: Networks whose segments changed since the last update. Networks
+          duplicated or deleted since then are added or subtracted as well.
     """
-    global_links_val_scope['fftt'] = [[float('inf'), -1, 0]
-                                            for i in range(len(links_global_info))]
-    global_links_val_scope['travelTime'] = [[float('inf'), -1, 0]
-                                            for i in range(len(links_global_info))]
-    global_links_val_scope['speed'] = [[float('inf'), -1, 0]
-                                            for i in range(len(links_global_info))]
-    global_links_val_scope['flow'] = [[float('inf'), -1, 0]
-                                      for i in range(len(links_global_info))]
-    global_links_val_scope['capacity'] = [[float('inf'), -1, 0]
-                                            for i in range(len(links_global_info))]
-    global_links_val_scope['flowRatio'] = [[float('inf'), -1, 0]
-                                       for i in range(len(links_global_info))]
-    
-    global_links_num = [0 for _ in range(len(links_global_info))]
-    
-    # Traverse the information of each road network
-    for network_idx in range(-1, len(network_layers)):
-        tmpNetwork = network
-        if network_idx >= 0 and network_idx < len(network_layers):
-            tmpNetwork = network_layers[network_idx]
-        
-        for i in range(tmpNetwork.m_n_link):
-            global_link_id = tmpNetwork.m_link[i].global_id
-            global_links_num[global_link_id] += 1
-    
-    # Set default values for roads with a count of 0
-    for i in range(len(global_links_num)):
-        if global_links_num[i] == 0:
-            global_links_val_scope['fftt'][i] = [0,0,0]
-            global_links_val_scope['travelTime'][i] = [0,0,0]
-            global_links_val_scope['speed'][i] = [0,0,0]
-            global_links_val_scope['flow'][i] = [0,0,0]
-            global_links_val_scope['capacity'][i] = [0,0,0]
-            global_links_val_scope['flowRatio'][i] = [0,0,0]
-
-    for network_idx in range(-1, len(network_layers)):
-        tmpNetwork = network
-        if network_idx >= 0 and network_idx < len(network_layers):
-            tmpNetwork = network_layers[network_idx]
-        
-        for i in range(tmpNetwork.m_n_link):
-            global_link_id = tmpNetwork.m_link[i].global_id
-            # print(f'global_link_id: {global_link_id}')
-            now_link = tmpNetwork.m_link[i]
-
-            # Organize global segment information
-            # fftt
-            fftt_info = global_links_val_scope['fftt'][global_link_id]
-            if now_link.free_flow_travel_time < fftt_info[0]:
-                fftt_info[0] = now_link.free_flow_travel_time
-            if now_link.free_flow_travel_time > fftt_info[1]:
-                fftt_info[1] = now_link.free_flow_travel_time
-            fftt_info[2] += now_link.free_flow_travel_time / \
-                global_links_num[global_link_id]
-
-            # travel time
-            tt_info = global_links_val_scope['travelTime'][global_link_id]
-            if now_link.travel_time < tt_info[0]:
-                tt_info[0] = now_link.travel_time
-            if now_link.travel_time > tt_info[1]:
-                tt_info[1] = now_link.travel_time
-            tt_info[2] += now_link.travel_time/global_links_num[global_link_id]
-            
-            # speed
-            speed_info = global_links_val_scope['speed'][global_link_id]
-            now_speed = now_link.free_flow_travel_time / now_link.travel_time
-            if now_speed < speed_info[0]:
-                speed_info[0] = now_speed
-            if now_speed > speed_info[1]:
-                speed_info[1] = now_speed
-            speed_info[2] += now_speed / global_links_num[global_link_id]
-
-            # flow
-            flow_info = global_links_val_scope['flow'][global_link_id]
-            if tmpNetwork.links_flow[i] < flow_info[0]:
-                flow_info[0] = tmpNetwork.links_flow[i]
-            if tmpNetwork.links_flow[i] > flow_info[1]:
-                flow_info[1] = tmpNetwork.links_flow[i]
-            flow_info[2] += tmpNetwork.links_flow[i] / \
-                global_links_num[global_link_id]
-
-            # capacity
-            c_info = global_links_val_scope['capacity'][global_link_id]
-            if now_link.capacity < c_info[0]:
-                c_info[0] = now_link.capacity
-            if now_link.capacity > c_info[1]:
-                c_info[1] = now_link.capacity
-            c_info[2] += now_link.capacity/global_links_num[global_link_id]
-
-            # flow_ratio
-            fr_info = global_links_val_scope['flowRatio'][global_link_id]
-            now_fr = tmpNetwork.links_flow[i]/now_link.capacity
-            if now_fr < fr_info[0]:
-                fr_info[0] = now_fr
-            if now_fr > fr_info[1]:
-                fr_info[1] = now_fr
-            fr_info[2] += now_fr/global_links_num[global_link_id]
-
-    return
+    global_link_stats.update([network] + network_layers, changed_networks, len(global_registry.links))
+    global_links_val_scope.update(global_link_stats.scope())
 
 @app.route('/network/center')
+@_locked
 def get_network_center():
     center_node = network.get_network_center()
     return jsonify({"lat": center_node[0], "lon": center_node[1]})
 
 @app.route('/network/del')
+@_locked
 def del_network_layer():
     """
     delete network layer
@@ -260,6 +326,7 @@ def del_network_layer():
     })
 
 @app.route('/network/recursionDel')
+@_locked
 def recursion_del_networks_layer():
     """
     recursion-delete network layers
@@ -300,6 +367,7 @@ def recursion_del_networks_layer():
     })
 
 @app.route('/network/info/all')
+@_locked
 def get_all_networks_info():
     """
     Get basic information about all networks
@@ -322,9 +390,24 @@ def get_all_networks_info():
         })
     return jsonify(networks_info)
 
-def _get_network_data(network_idx: int):
+def _get_global_json():
     """
-    Get all data for a specific network
+    Get the global nodes, segments and segment aggregates, encoded as JSON once per change of them
+    """
+    key = (len(global_registry.nodes), len(global_registry.links), global_link_stats.version)
+    return key, response_cache.get_shared(key, lambda: {
+        "nodes": global_registry.nodes,
+        "links": global_registry.links,
+        "linksInfo": global_links_val_scope
+    })
+
+def _get_network_json(network_idx: int, extra=None):
+    """
+    Get all data for a specific network, encoded as JSON
+
+        - extra: Members added to the response
+
+    The members that only depend on the network are encoded once per version of it, see PyResponseCache.
     """
     tmpNetwork = network
     editLog = []
@@ -332,26 +415,339 @@ def _get_network_data(network_idx: int):
         tmpNetwork = network_layers[network_idx]
         editLog = network_edits[network_idx]
     else: network_idx = -1
+    # Encoding of the segment demands, can be chosen per request
+    encoding = "sparse" if request.args.get('demandEncoding', demand_encoding) == "sparse" else "dense"
+
+    members = response_cache.get_network(tmpNetwork, encoding)
+    if members is None:
+        members = response_cache.set_network(tmpNetwork, encoding, {
+            "title": tmpNetwork.title,
+            "desc": tmpNetwork.desc,
+            "links": _get_links(network_idx, encoding == "sparse"),
+            "demandEncoding": encoding,
+            "nodes": _get_nodes(network_idx),
+            "avgFlow": tmpNetwork.avg_flow,
+            "avgSpeed": tmpNetwork.avg_speed,
+            "costSum": tmpNetwork.cost_sum,
+            "solveReport": tmpNetwork.solve_report,
+            "version": tmpNetwork.version
+        })
+    global_key, global_json = _get_global_json()
+
+    # Full responses of an unchanged network share their snapshot
+    state = (response_cache.network_key(tmpNetwork), global_key)
+    snapshot_id = network_history.current(tmpNetwork, state)
+    if snapshot_id is None:
+        snapshot_id = network_history.record(
+            tmpNetwork, PyNetworkSnapshot(tmpNetwork, global_registry, global_link_stats), state)
+
+    return response_cache.join(
+        response_cache.members({
+            "id": network_idx+1,
+            "father": network_father[network_idx+1],
+            "editLog": editLog,
+            "snapshot": snapshot_id,
+            "delta": False,
+            **(extra or {})
+        }),
+        members,
+        b'"globalNodes":' + global_json["nodes"],
+        b'"globalLinks":' + global_json["links"],
+        b'"globalLinksInfo":' + global_json["linksInfo"])
+
+def _json_response(body, conditional=False):
+    """
+    Response of encoded JSON
+
+        - conditional: Add an ETag, so that clients revalidating unchanged data get a 304 without it
+    """
+    # Same trailing newline as jsonify
+    response = app.response_class(body + b"\n", mimetype=app.json.mimetype)
+    return _conditional(response) if conditional else response
+
+def _conditional(response):
+    """
+    Add an ETag to a response, so that clients revalidating unchanged data get a 304 without it
+    """
+    response.headers["Cache-Control"] = "no-cache"
+    response.add_etag()
+    return response.make_conditional(request)
+
+def _get_network_delta(network_idx: int, since: int, tolerance: float = 0.0):
+    """
+    Get the data of a specific network that changed since a snapshot the client has
+
+        - since: Snapshot ID of a previous response for this network
+        - tolerance: Relative change of times, capacity, flow and global aggregates below which
+          a value is not sent again, 0 sends every change
 
+    The segments, nodes and global segment aggregates that changed are sent with their IDs, plus
+    the current segment / node counts and the global nodes / segments registered since. After
+    segment deletions, linkRemap gives the current ID of every segment of the snapshot (-1 for the
+    deleted ones), and only the segments whose values changed are sent. Falls back to None if the
+    snapshot is unknown or too old.
+    """
+    tmpNetwork = network
+    editLog = []
+    if network_idx >= 0 and network_idx < len(network_layers):
+        tmpNetwork = network_layers[network_idx]
+        editLog = network_edits[network_idx]
+    else: network_idx = -1
+    old = network_history.get(tmpNetwork, since)
+    if old is None:
+        return None
+    new = PyNetworkSnapshot(tmpNetwork, global_registry, global_link_stats)
+    encoding = request.args.get('demandEncoding', demand_encoding)
+
+    old, link_remap = align_links(old, new)
+    link_ids = changed_links(old, new, encoding == "sparse", tolerance)
+    global_link_ids = changed_global_links(old, new, tolerance)
+    if tolerance > 0:
+        new = client_view(old, new, link_ids, global_link_ids)
+    global_link_ids = global_link_ids.tolist()
     network_data = {
         "id": network_idx+1,
         "title": tmpNetwork.title,
         "desc": tmpNetwork.desc,
         "father": network_father[network_idx+1],
-        "links": _get_links(network_idx),
-        "nodes": _get_nodes(network_idx),
+        "links": _get_links(network_idx, encoding == "sparse", link_ids),
+        "linkCount": tmpNetwork.m_n_link,
+        "linkRemap": None if link_remap is None else link_remap.tolist(),
+        "demandEncoding": "sparse" if encoding == "sparse" else "dense",
+        "nodes": _get_nodes(network_idx, changed_nodes(old, new)),
+        "nodeCount": len(tmpNetwork.m_node),
         "editLog": editLog,
-        "globalNodes": nodes_global_info,
-        "globalLinks": links_global_info,
-        "globalLinksInfo": global_links_val_scope,
+        "globalNodesFrom": old.n_global_nodes,
+        "globalNodes": global_registry.nodes[old.n_global_nodes:],
+        "globalLinksFrom": old.n_global_links,
+        "globalLinks": global_registry.links[old.n_global_links:],
+        "globalLinksInfoIds": global_link_ids,
+        "globalLinksInfo": {stat: [rows[i] for i in global_link_ids]
+                            for stat, rows in global_links_val_scope.items()},
         "avgFlow": tmpNetwork.avg_flow,
         "avgSpeed": tmpNetwork.avg_speed,
-        "costSum": tmpNetwork.cost_sum
+        "costSum": tmpNetwork.cost_sum,
+        "solveReport": tmpNetwork.solve_report,
+        "version": tmpNetwork.version,
+        "snapshot": network_history.record(tmpNetwork, new),
+        "since": since,
+        "delta": True
     }
     return network_data
 
+def _edit_response(network_idx: int, extra=None):
+    """
+    Response of an edit: the changes since the snapshot given as `since`, or the full data without it
+
+        - extra: Members added to the response
+    """
+    since = request.args.get('since')
+    if since is not None:
+        network_data = _get_network_delta(network_idx, int(since), float(request.args.get('tolerance', 0)))
+        if network_data is not None:
+            return jsonify({**network_data, **(extra or {})})
+    return _json_response(_get_network_json(network_idx, extra))
+
+def _trace_network(tmp_network):
+    """
+    Give a new network its own file in the trace folder, if the convergence traces are written (--trace-dir)
+    """
+    if trace_files is not None:
+        tmp_network.output_path = next(trace_files)
+
+def _network_lock(tmp_network):
+    """
+    Lock serializing the edits of a network
+    """
+    with state_lock:
+        return network_locks.setdefault(tmp_network, threading.Lock())
+
+def _run_edit(network_idx: int, edit):
+    """
+    Apply an edit to a network and re-solve it, in this request or as a solve job with `async=true`
+
+        - edit: Function applying the edit to a network and solving it, returning the new edit log
+          entries, or None if it left the network unchanged
+
+    The edit runs on a fork of the network, which the network adopts once solved, so that other
+    requests keep reading the previous state meanwhile and a failed edit changes nothing. Edits
+    of one network run one at a time, edits of different networks concurrently. As a job the
+    response is the job ID, the progress is streamed by /job/events and the edit response is
+    fetched from /job/result.
+
+    `stepRule`, `relGap`, `maxIterations` and `timeBudget` override the solver configuration of
+    the network for this solve only (see /network/solverConfig), e.g. `timeBudget=0.2` for a
+    quick approximate answer while the user is still editing.
+
+    With `progressive=true` the solve is warm-started and stops after progressive_time_budget
+    seconds unless these arguments say otherwise, and the response is sent right away. If the
+    solve did not converge, a refinement job keeps solving the network (see _refine) and the
+    response has its job info as `refinement`, None otherwise. Every edit of a network cancels its
+    refinement.
+    """
+    tmp_network = network
+    if network_idx >= 0 and network_idx < len(network_layers):
+        tmp_network = network_layers[network_idx]
+    try:
+        tmp_network.solver_config.replace_args(request.args)
+    except ValueError as error:
+        return jsonify({
+            "static": 0,
+            "result": str(error)
+        })
+    progressive = request.args.get('progressive') == 'true'
+    budget_args = any(arg in request.args for arg in ("relGap", "maxIterations", "timeBudget"))
+    with state_lock:
+        refinement = refinements.pop(tmp_network, None)
+    if refinement is not None:
+        refinement.cancel()
+
+    def run(job=None):
+        with _network_lock(tmp_network):
+            work = tmp_network.fork()
+            work.solver_config = work.solver_config.replace_args(request.args)
+            if progressive:
+                work.warm_start = True
+                if not budget_args:
+                    work.solver_config = work.solver_config.replace(time_budget=progressive_time_budget)
+            if job is not None:
+                work.progress = job.report
+            # Averages the solve starts from, and cost kept by the edits that keep it
+            former_avg, former_cost = (work.avg_flow, work.avg_speed), work.cost_sum
+            new_edits = edit(work)
+            work.progress = None
+
+            with state_lock:
+                networks = [network] + network_layers
+                if not any(tmpNetwork is tmp_network for tmpNetwork in networks):
+                    raise LookupError("the network was deleted during the edit")
+                network_idx = [i for i, tmpNetwork in enumerate(networks) if tmpNetwork is tmp_network][0] - 1
+                if new_edits is None:
+                    return _edit_response(network_idx)
+                tmp_network.adopt(work)
+                network_edits[network_idx].extend(new_edits)
+                _global_info_set(network_idx)
+                _update_global_links_info(tmp_network)
+                if not progressive:
+                    return _edit_response(network_idx)
+                refinement = None
+                if work.solve_report["stopReason"] not in ("converged", "stalled"):
+                    refinement = _refine(tmp_network, network_idx, former_avg,
+                                         former_cost if work.cost_sum == former_cost else None)
+                return _edit_response(network_idx, {"refinement": None if refinement is None else refinement.info()})
+
+    return _run_or_submit(network_idx, run)
+
+def _refine(tmp_network, network_idx: int, former_avg, kept_cost=None):
+    """
+    Keep solving a network after a progressive edit, as a solve job
+
+        - former_avg: Average flow and speed the solve of the edit started from, as every solve
+          of the network folds them into its own
+        - kept_cost: Cost of the network kept by the edit (see /data/newNode), None if the solves set it
+
+    The job solves the network in rounds of refine_round_time seconds, each resuming the solve of
+    the previous round (its flows and step) with the solver configuration of the network otherwise.
+    Every round is adopted by the network, a new version that clients get with /data/network,
+    and published as a "snapshot" event {"round", "version", "solveReport"} of the job. The job
+    ends once a round stops for another reason than its time, or is cancelled if the network
+    changed or was deleted meanwhile. Its result is the last snapshot.
+
+    Return:
+        - The job, also recorded in refinements until the next edit of the network
+    """
+    version = tmp_network.version
+
+    def run(job):
+        nonlocal version
+        snapshot = None
+        while True:
+            with _network_lock(tmp_network):
+                if tmp_network.version != version:
+                    raise PySolveCancelled()
+                work = tmp_network.fork()
+            # Resume the solve of the previous round rather than start over with a large step
+            work.progress, work.warm_start = job.report, True
+            work.warm_start_beta = work.solve_report.get("beta", work.warm_start_beta)
+            work.solver_config = work.solver_config.replace(time_budget=refine_round_time)
+            work.avg_flow, work.avg_speed = former_avg
+            work.LogitSUE()
+            work.progress = None
+            if kept_cost is not None:
+                work.cost_sum = kept_cost
+
+            with _network_lock(tmp_network), state_lock:
+                networks = [network] + network_layers
+                if tmp_network.version != version or not any(tmpNetwork is tmp_network for tmpNetwork in networks):
+                    raise PySolveCancelled()
+                tmp_network.adopt(work)
+                network_idx = [i for i, tmpNetwork in enumerate(networks) if tmpNetwork is tmp_network][0] - 1
+                _global_info_set(network_idx)
+                _update_global_links_info(tmp_network)
+                version = tmp_network.version
+
+            snapshot = {"round": 1 if snapshot is None else snapshot["round"] + 1,
+                        "version": version, "solveReport": work.solve_report}
+            job.publish(snapshot)
+            if work.solve_report["stopReason"] != "timeBudget":
+                return json.dumps({"static": 1, **snapshot})
+
+    refinement = solve_jobs.submit(network_idx, run)
+    refinements[tmp_network] = refinement
+    return refinement
+
+def _run_or_submit(network_idx: int, run):
+    """
+    Call run() for this request, or queue run(job) as a solve job with `async=true`
+
+        - run: Function building the response, given the job to report the progress to if any
+    """
+    if request.args.get('async') != 'true':
+        return run()
+
+    # The response is built in the worker, with the arguments of this request
+    run_in_request = copy_current_request_context(lambda job: run(job).get_data())
+    job = solve_jobs.submit(network_idx, run_in_request)
+    return jsonify({"static": 1, **job.info()})
+
+
+@app.route('/job/status')
+def get_job_status():
+    """
+    Get the status and the last iteration of a solve job
+    """
+    job = solve_jobs.get(int(request.args.get('jobId')))
+    if job is None:
+        return jsonify({"static": 0, "result": "unknown job"})
+    return jsonify({"static": 1, **job.info()})
+
+@app.route('/job/events')
+def get_job_events():
+    """
+    Stream the progress of a solve job as Server-Sent Events, see PySolveJob.events
+    """
+    job = solve_jobs.get(int(request.args.get('jobId')))
+    if job is None:
+        return jsonify({"static": 0, "result": "unknown job"})
+    response = app.response_class(job.events(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+@app.route('/job/result')
+def get_job_result():
+    """
+    Get the response of the edit of a finished solve job, or its status while it is not done
+    """
+    job = solve_jobs.get(int(request.args.get('jobId')))
+    if job is None:
+        return jsonify({"static": 0, "result": "unknown job"})
+    if job.status != "done":
+        return jsonify({"static": 0, "result": f"job {job.status}", **job.info()})
+    return app.response_class(job.result, mimetype=app.json.mimetype)
+
 
 @app.route('/data/global/all')
+@_locked
 def get_global_info():
     """
     Get global information
@@ -414,16 +810,45 @@ def get_global_info():
         "maxDiffAvgSpeed": max_diff_avg_speed,
         "minDiffCostSum": min_diff_cost_sum,
         "maxDiffCostSum": max_diff_cost_sum,
-
-        "nodesPos": nodes_global_info,
-        "linksPos": links_global_info,
-        "globalLinksInfo": global_links_val_scope,
         # "linkSortedIdx": linkSortedIdx,
-        # "nodesPos": 
     }
-    return network_data
+    _, global_json = _get_global_json()
+    return _json_response(response_cache.join(
+        response_cache.members(network_data),
+        b'"nodesPos":' + global_json["nodes"],
+        b'"linksPos":' + global_json["links"],
+        b'"globalLinksInfo":' + global_json["linksInfo"]), conditional=True)
+
+@app.route('/data/global/frame')
+@_locked
+def get_global_links_frame():
+    """
+    Get the segment values of all networks aligned on the global segment IDs, as a binary column frame
+
+    One float32 column [network, global segment] per stat given as `stats` (comma separated, all of
+    PyGlobalLinkStats.stats by default), NaN where a network has no such segment. See column_frame
+    for the layout.
+    """
+    stats = request.args.get('stats')
+    stats = stats.split(',') if stats else list(global_link_stats.stats)
+    unknown = [stat for stat in stats if stat not in global_link_stats.stats]
+    if unknown:
+        return jsonify({
+            "static": 0,
+            "result": f"unknown stats {unknown}. valid stats: {list(global_link_stats.stats)}"
+        })
+
+    networks = [network] + network_layers
+    n_global_link = len(global_registry.links)
+    buffer, columns = column_frame({
+        "networks": list(range(len(networks))),
+        "versions": [tmpNetwork.version for tmpNetwork in networks]
+    }, stats, (len(networks), n_global_link))
+    global_link_stats.frame(networks, stats, n_global_link, out=columns)
+    return _conditional(app.response_class(buffer, mimetype="application/octet-stream"))
 
 @app.route('/data/all')
+@_locked
 def get_all_networks_data():
     """
     Get data for all networks
@@ -431,11 +856,24 @@ def get_all_networks_data():
     network_num = len(network_layers)
     networks_data = []
     for i in range(-1, network_num):
-        networks_data.append(_get_network_data(network_idx=i))
-    return networks_data
+        networks_data.append(_get_network_json(network_idx=i))
+    return _json_response(b"[" + b",".join(networks_data) + b"]", conditional=True)
+
+
+@app.route('/data/network')
+@_locked
+def get_network_data():
+    """
+    Get the data of a network, only what changed since the snapshot given as `since` if any
+
+    Clients poll it for the rounds of a refinement, see _refine.
+    """
+    network_idx = eval(request.args.get('networkIdx'))
+    return _edit_response(network_idx)
 
 
 @app.route('/data/duplicate')
+@_locked
 def duplicate_networks_data():
     """
     Get data for the network and return the network
@@ -446,12 +884,13 @@ def duplicate_networks_data():
 
     tmpNetwork = PyNetwork()
     if copy_origin_idx < 0 or copy_origin_idx >= len(network_layers):
-        tmpNetwork = copy.deepcopy(network)
+        tmpNetwork = network.fork()
         network_father[-1] = 0
     else:
-        tmpNetwork = copy.deepcopy(network_layers[copy_origin_idx])
+        tmpNetwork = network_layers[copy_origin_idx].fork()
 
     tmpNetwork.title += ' copy'
+    _trace_network(tmpNetwork)
     network_layers.append(tmpNetwork)
 
     # edit tree
@@ -463,7 +902,7 @@ def duplicate_networks_data():
         network_edits.append([])
 
     _global_info_set(len(network_layers)-1)
-    return jsonify(_get_network_data(network_idx=len(network_father)-2))
+    return _json_response(_get_network_json(network_idx=len(network_father)-2))
 
 
 @app.route('/data/newLink')
@@ -479,29 +918,27 @@ def new_network_link():
     i_capacity = eval(request.args.get('iCapacity'))
     i_free_flow_travel_time = eval(request.args.get('iFreeFlowTravelTime'))
     i_exist = request.args.get('iExist') == 'true'
-    
+    error = invalid_link_values({"capacity": capacity, "freeFlowTravelTime": free_flow_travel_time,
+                                 "iCapacity": i_capacity, "iFreeFlowTravelTime": i_free_flow_travel_time}, i_exist)
+    if error is not None:
+        return jsonify({
+            "static": 0,
+            "result": error
+        })
 
-    tmp_network = network
-    if network_idx >= 0 and network_idx < len(network_layers):
-        tmp_network = network_layers[network_idx]
+    def edit(tmp_network):
+        link_id1, new_edits1 = tmp_network.add_link(start_pt_id, end_pt_id, capacity, free_flow_travel_time, False)
+        if i_exist:
+            link_id2, new_edits2 = tmp_network.add_link(end_pt_id, start_pt_id, i_capacity, i_free_flow_travel_time, False)
+            new_edits1 = list(set(new_edits1).union(new_edits2))
+        tmp_network.update_paths()
 
-    link_id1, new_edits1 = tmp_network.add_link(start_pt_id, end_pt_id, capacity, free_flow_travel_time, False)
-    if i_exist:
-        link_id2, new_edits2 = tmp_network.add_link(end_pt_id, start_pt_id, i_capacity, i_free_flow_travel_time)
-        new_edits1 = list(set(new_edits1).union(new_edits2))
-    else:
-        tmp_network.compute_path_bfs()
-        
-    tmp_network.LogitSUE()
+        tmp_network.LogitSUE()
 
-    # Modify the edit tree.
-    for new_edit_type in new_edits1:
-        network_edits[network_idx].append(
-            {"edit_type": new_edit_type, "edit_on_this": True})
+        # Modify the edit tree.
+        return [{"edit_type": new_edit_type, "edit_on_this": True} for new_edit_type in new_edits1]
 
-    _global_info_set(network_idx)
-    _update_global_links_info()
-    return jsonify(_get_network_data(network_idx))
+    return _run_edit(network_idx, edit)
 
 @app.route('/data/delLink')
 def del_network_link():
@@ -511,21 +948,17 @@ def del_network_link():
     network_idx = eval(request.args.get('networkIdx'))
     links_to_del = eval(request.args.get('linksIdx'))
 
-    tmp_network = network
-    if network_idx >= 0 and network_idx < len(network_layers):
-        tmp_network = network_layers[network_idx]
+    def edit(tmp_network):
+        if type(links_to_del) == int:
+            tmp_network.del_link([links_to_del])
+        else:
+            tmp_network.del_link(links_to_del)
+        tmp_network.LogitSUE()
 
-    if type(links_to_del) == int:
-        tmp_network.del_link([links_to_del])
-    else:
-        tmp_network.del_link(links_to_del)
-    tmp_network.LogitSUE()
+        # Modify the edit tree
+        return [{"edit_type": 6, "edit_on_this": True}]
 
-    # Modify the edit tree
-    network_edits[network_idx].append({"edit_type": 6, "edit_on_this": True})
-
-    _update_global_links_info()
-    return jsonify(_get_network_data(network_idx))
+    return _run_edit(network_idx, edit)
 
 
 @app.route('/data/newNode')
@@ -541,24 +974,19 @@ def new_network_node():
     former_link_b_id = eval(request.args.get('formerLinkB'))
     linkb_fftt = eval(request.args.get('bFFTT'))
 
-    tmp_network = network
-    if network_idx >= 0 and network_idx < len(network_layers):
-        tmp_network = network_layers[network_idx]
-
-    add_node_res = tmp_network.add_node(node_lat, node_lng, former_link_a_id,
-                         linka_fftt, former_link_b_id, linkb_fftt)
+    def edit(tmp_network):
+        add_node_res = tmp_network.add_node(node_lat, node_lng, former_link_a_id,
+                             linka_fftt, former_link_b_id, linkb_fftt)
 
-    former_cost = tmp_network.cost_sum
-    tmp_network.LogitSUE()
-    if not add_node_res:
-        tmp_network.cost_sum = former_cost
+        former_cost = tmp_network.cost_sum
+        tmp_network.LogitSUE()
+        if not add_node_res:
+            tmp_network.cost_sum = former_cost
 
-    # Modify the edit tree
-    network_edits[network_idx].append({"edit_type": 3, "edit_on_this": True})
+        # Modify the edit tree
+        return [{"edit_type": 3, "edit_on_this": True}]
 
-    _global_info_set(network_idx)
-    _update_global_links_info()
-    return jsonify(_get_network_data(network_idx))
+    return _run_edit(network_idx, edit)
 
 
 @app.route('/data/delNode')
@@ -569,19 +997,16 @@ def del_network_node():
     network_idx = eval(request.args.get('networkIdx'))
     node_to_del = eval(request.args.get('nodeIdx'))
 
-    tmp_network = network
-    if network_idx >= 0 and network_idx < len(network_layers):
-        tmp_network = network_layers[network_idx]
-
-    res = tmp_network.del_node(node_to_del)
-    if res:
+    def edit(tmp_network):
+        res = tmp_network.del_node(node_to_del)
+        if not res:
+            return None
         tmp_network.LogitSUE()
 
         # Modify the edit tree
-        network_edits[network_idx].append({"edit_type": 4, "edit_on_this": True})
+        return [{"edit_type": 4, "edit_on_this": True}]
 
-        _update_global_links_info()
-    return jsonify(_get_network_data(network_idx))
+    return _run_edit(network_idx, edit)
 
 
 @app.route('/data/linkReset')
@@ -593,31 +1018,314 @@ def reset_network_link():
     link_idx = eval(request.args.get('linkIdx'))
     new_free_flow_travel_time = eval(request.args.get('freeFlowTravelTime'))
     new_capacity = eval(request.args.get('capacity'))
+    error = invalid_link_values({"capacity": new_capacity, "freeFlowTravelTime": new_free_flow_travel_time})
+    if error is not None:
+        return jsonify({
+            "static": 0,
+            "result": error
+        })
+
+    def edit(tmp_network):
+        new_edits = []
+        # Modify road attributes
+        res1 = tmp_network.change_link_free_travel_time(link_idx, new_free_flow_travel_time)
+        if res1 >= 1:
+            new_edits.append({"edit_type": res1, "edit_on_this": True})
+            print(f"res: {res1}")
+
+        res2 = tmp_network.change_link_capcity(link_idx, new_capacity)
+        if res2 >= 1:
+            new_edits.append({"edit_type": res2, "edit_on_this": True})
+            print(f"res: {res2}")
+
+        if res1 >= 1 or res2 >= 1:
+            tmp_network.LogitSUE()
+        return new_edits
+
+    return _run_edit(network_idx, edit)
+
+
+@app.route('/data/batch')
+def batch_network_edit():
+    """
+    apply several edits to a network, with a single path update and solve
+
+    `edits` is a JSON list of {"edit": <endpoint name>, <arguments of the endpoint>...}, applied in
+    order (segment and node IDs refer to the network as left by the previous edits). The edits are
+    logged one by one as by their own endpoints, and none of them is kept if one fails.
+    """
+    network_idx = eval(request.args.get('networkIdx'))
+    batch = json.loads(request.args.get('edits'))
+
+    bad_edit = invalid_edit(batch)
+    if bad_edit is not None:
+        return jsonify({
+            "static": 0,
+            "result": f"invalid edit {bad_edit}. valid edits: {edit_args}"
+        })
+
+    return _run_edit(network_idx, lambda tmp_network: apply_edits(tmp_network, batch))
+
+
+@app.route('/data/sweep')
+def sweep_network_scenarios():
+    """
+    solve several what-if scenarios of a network in parallel, each added as a child network
+
+    `editSets` is a JSON list with the edits of every scenario, each one a list as for /data/batch.
+    The scenarios are solved by `processes` worker processes (--sweep-processes by default) and
+    added in order after the other networks, as children of the network `originIdx`.
+    """
+    origin_idx = eval(request.args.get('originIdx'))
+    edit_sets = json.loads(request.args.get('editSets'))
+    processes = int(request.args.get('processes', default_sweep_processes))
+
+    for edits in edit_sets:
+        bad_edit = invalid_edit(edits)
+        if bad_edit is not None:
+            return jsonify({
+                "static": 0,
+                "result": f"invalid edit {bad_edit}. valid edits: {edit_args}"
+            })
+
+    origin = network
+    if origin_idx >= 0 and origin_idx < len(network_layers):
+        origin = network_layers[origin_idx]
+
+    def run(job=None):
+        with _network_lock(origin):
+            base = origin.fork()
+        results = solve_scenarios(base, edit_sets, processes)
+
+        with state_lock:
+            networks = [network] + network_layers
+            if not any(tmpNetwork is origin for tmpNetwork in networks):
+                raise LookupError("the network was deleted during the sweep")
+            origin_idx = [i for i, tmpNetwork in enumerate(networks) if tmpNetwork is origin][0] - 1
+            first_idx = len(network_layers)
+            for k, (scenario, new_edits, _) in enumerate(results):
+                scenario.title = f"{origin.title} scenario {k + 1}"
+                _trace_network(scenario)
+                network_father.append(origin_idx + 1)
+                network_layers.append(scenario)
+
+                # edit tree
+                if origin_idx >= 0:
+                    network_edits.append(copy.deepcopy(network_edits[origin_idx]))
+                    for network_edit_info in network_edits[-1]:
+                        network_edit_info['edit_on_this'] = False
+                else:
+                    network_edits.append([])
+                network_edits[-1].extend(new_edits or [])
+                _global_info_set(len(network_layers)-1)
+
+            _update_global_links_info(*network_layers[first_idx:])
+            return _json_response(b"[" + b",".join(
+                _get_network_json(network_idx=i) for i in range(first_idx, len(network_layers))) + b"]")
+
+    return _run_or_submit(origin_idx, run)
+
+
+@app.route('/data/criticality')
+def get_link_criticality():
+    """
+    Rank the roads of a network by the impact of closing them (mode=remove) or of halving their capacity (mode=halve)
+
+    Every road is a scenario solved from the equilibrium of the network, by `processes` worker
+    processes (--sweep-processes by default). `linksIdx` restricts the analysis to some roads.
+    """
+    network_idx = eval(request.args.get('networkIdx'))
+    mode = request.args.get('mode', 'remove')
+    processes = int(request.args.get('processes', default_sweep_processes))
+    links_idx = request.args.get('linksIdx')
+    link_ids = None if links_idx is None else json.loads(links_idx)
+
+    if mode not in ["remove", "halve"]:
+        return jsonify({
+            "static": 0,
+            "result": "criticality mode invalid. valid modes: remove, halve"
+        })
 
     tmp_network = network
     if network_idx >= 0 and network_idx < len(network_layers):
         tmp_network = network_layers[network_idx]
-    
-    # Modify road attributes
-    res1 = tmp_network.change_link_free_travel_time(link_idx, new_free_flow_travel_time)
-    if res1 >= 1:
-        network_edits[network_idx].append(
-            {"edit_type": res1, "edit_on_this": True})
-        print(f"res: {res1}")
-    
-    res2 = tmp_network.change_link_capcity(link_idx, new_capacity)
-    if res2 >= 1:
-        network_edits[network_idx].append(
-            {"edit_type": res2, "edit_on_this": True})
-        print(f"res: {res2}")
-    
-    if res1 >= 1 or res2 >= 1:
-        tmp_network.LogitSUE()
-    _update_global_links_info()
-    return jsonify(_get_network_data(network_idx))
+
+    def run(job=None):
+        with _network_lock(tmp_network):
+            base = tmp_network.fork()
+        return jsonify({
+            "static": 1,
+            "mode": mode,
+            "costSum": base.cost_sum,
+            "avgSpeed": base.avg_speed,
+            "links": link_criticality(base, mode, processes, link_ids)
+        })
+
+    return _run_or_submit(network_idx, run)
+
+
+@app.route('/network/solverMode')
+@_locked
+def set_network_solver_mode():
+    """
+    Select the LogitSUE implementation of a network ("loop" or "vectorized")
+    """
+    network_idx = eval(request.args.get('networkIdx'))
+    solver_mode = request.args.get('mode')
+
+    tmp_network = network
+    if network_idx >= 0 and network_idx < len(network_layers):
+        tmp_network = network_layers[network_idx]
+
+    if solver_mode not in ["loop", "vectorized"]:
+        return jsonify({
+            "static": 0,
+            "solverMode": tmp_network.solver_mode,
+            "result": "solver mode invalid. valid modes: loop, vectorized",
+        })
+
+    tmp_network.solver_mode = solver_mode
+    return jsonify({
+        "static": 1,
+        "solverMode": tmp_network.solver_mode,
+        "result": "success"
+    })
+
+
+@app.route('/network/warmStart')
+@_locked
+def set_network_warm_start():
+    """
+    Enable or disable warm-started re-solves of a network after edits
+    """
+    network_idx = eval(request.args.get('networkIdx'))
+    warm_start = request.args.get('enable') == 'true'
+
+    tmp_network = network
+    if network_idx >= 0 and network_idx < len(network_layers):
+        tmp_network = network_layers[network_idx]
+
+    tmp_network.warm_start = warm_start
+    return jsonify({
+        "static": 1,
+        "warmStart": tmp_network.warm_start,
+        "solveReport": tmp_network.solve_report,
+        "result": "success"
+    })
+
+
+@app.route('/network/solverConfig')
+@_locked
+def set_network_solver_config():
+    """
+    Set the step rule and stopping criteria of the solves of a network
+
+    `stepRule` is one of msa, adaptive (the default) or bb (Barzilai-Borwein). `relGap` stops once
+    NormD is below this fraction of the norm of the segment flows, `maxIterations` and `timeBudget`
+    (seconds) bound the iterations; 0 disables a criterion. Arguments not given are kept.
+    """
+    network_idx = eval(request.args.get('networkIdx'))
+
+    tmp_network = network
+    if network_idx >= 0 and network_idx < len(network_layers):
+        tmp_network = network_layers[network_idx]
+
+    try:
+        tmp_network.solver_config = tmp_network.solver_config.replace_args(request.args)
+    except ValueError as error:
+        return jsonify({
+            "static": 0,
+            "solverConfig": tmp_network.solver_config.to_dict(),
+            "result": str(error)
+        })
+
+    return jsonify({
+        "static": 1,
+        "solverConfig": tmp_network.solver_config.to_dict(),
+        "solveReport": tmp_network.solve_report,
+        "result": "success"
+    })
+
+
+@app.route('/metrics')
+def get_metrics():
+    """
+    Get the metrics of the server in the Prometheus text format
+
+    Solves (runs, iterations, paths and seconds per phase), path updates and requests (latency
+    and response size per route) are counted since the start; the size and version of every
+    network and the solve jobs per status are read when scraped. Sweeps solve in worker processes
+    whose solves are not counted.
+    """
+    with state_lock:
+        networks = [network] + network_layers
+        network_gauges = [
+            ("trasculptor_network_links", "Segments of each network", "m_n_link"),
+            ("trasculptor_network_paths", "Paths of each network", "m_n_path"),
+            ("trasculptor_network_od_pairs", "OD pairs of each network", "m_n_od_pairs"),
+            ("trasculptor_network_version", "Version of each network, bumped by every edit and solve", "version"),
+        ]
+        gauges = [(name, help_text, [({"network": str(network_idx - 1)}, getattr(tmpNetwork, attr))
+                                     for network_idx, tmpNetwork in enumerate(networks)])
+                  for name, help_text, attr in network_gauges]
+    with solve_jobs.lock:
+        jobs = list(solve_jobs.jobs.values())
+    gauges.append(("trasculptor_solve_jobs", "Solve jobs kept, by status",
+                   [({"status": status}, sum(job.status == status for job in jobs))
+                    for status in ("queued", "running") + PySolveJob.finished]))
+    return app.response_class(metrics.render(gauges), mimetype="text/plain; version=0.0.4")
+
+
+@app.route('/network/metrics')
+@_locked
+def get_network_metrics():
+    """
+    Get the reports of the last solves of a network (see PyNetwork.solve_history) and its size
+
+    Every report has the iterations, stop reason and seconds per phase of the solve, with the
+    version of the network it produced and its wall clock `time`.
+    """
+    network_idx = eval(request.args.get('networkIdx'))
+
+    tmp_network = network
+    if network_idx >= 0 and network_idx < len(network_layers):
+        tmp_network = network_layers[network_idx]
+
+    return jsonify({
+        "static": 1,
+        "version": tmp_network.version,
+        "links": tmp_network.m_n_link,
+        "paths": tmp_network.m_n_path,
+        "odPairs": tmp_network.m_n_od_pairs,
+        "solves": list(tmp_network.solve_history)
+    })
+
+
+@app.route('/network/convergence')
+@_locked
+def get_network_convergence():
+    """
+    Get the convergence trace of the last solve of a network, to plot it
+
+    One list per column (`iteration`, `normD`, `cpuTime`, `ueGap`, `relGap`) with the last
+    iterations kept by the network (PyNetwork.trace_size), and the number of first iterations
+    `dropped` from them.
+    """
+    network_idx = eval(request.args.get('networkIdx'))
+
+    tmp_network = network
+    if network_idx >= 0 and network_idx < len(network_layers):
+        tmp_network = network_layers[network_idx]
+
+    return jsonify({
+        "static": 1,
+        **tmp_network.convergence_trace.to_dict(),
+        "solveReport": tmp_network.solve_report
+    })
 
 
 @app.route('/network/switchPos')
+@_locked
 def switch_network_layer_pos():
     """
     Modify the network ID
@@ -654,14 +1362,48 @@ def switch_network_layer_pos():
 
 
 
-if __name__ == '__main__':
+def init_networks(data_path, solver_mode="loop", warm_start=False, solve_workers=4, sweep_processes=0,
+                  path_cache=None, path_file=None, solver_config=None, trace_dir=None):
+    """
+    Load a dataset as the initial network and reset all networks and global information
+
+        - data_path: Folder of Nodes.txt, Links.txt and ODPairs.txt
+        - solver_mode: LogitSUE implementation of the initial network ("loop" or "vectorized")
+        - warm_start: Whether edited networks are re-solved from their previous segment flows
+        - solve_workers: Threads running the solve jobs of edits requested with `async=true`
+        - sweep_processes: Worker processes solving the scenarios of /data/sweep by default
+        - path_cache: Folder of the cached path sets, None to always enumerate the paths
+        - path_file: Path file read instead of enumerating the paths, see PyNetwork.read_path
+        - solver_config: Step rule and stopping criteria of the initial network (PySolverConfig),
+          None for the default ones
+        - trace_dir: Folder the convergence trace of every network is written to after each of its
+          solves, None to keep the traces in memory only (see /network/convergence)
+    """
+    global network, network_layers, network_father, network_edits
+    global global_registry, global_link_stats, global_links_val_scope, network_history, response_cache
+    global solve_jobs, network_locks, refinements, default_sweep_processes, trace_files
     network_layers = []
     network_father = [-1]
 
     # Global node and segment information.
-    nodes_global_info = []
-    links_global_info = []
+    global_registry = PyGlobalRegistry()
+    global_link_stats = PyGlobalLinkStats()
     global_links_val_scope = {"fftt": [], "travelTime": [], "speed":[], "capacity": [], "flow": [], "flowRatio": []}
+    # Recent versions of each network sent to clients, for the delta responses of the edits
+    network_history = PyNetworkHistory()
+    # JSON of the responses, reused until the networks or the global information change
+    response_cache = PyResponseCache(lambda obj: app.json.dumps(obj, separators=(",", ":")))
+    # Solve jobs of the edits, and the locks serializing the edits of each network
+    solve_jobs = PySolveJobs(solve_workers)
+    network_locks = weakref.WeakKeyDictionary()
+    # Refinement job of the last progressive edit of each network, see _refine
+    refinements = weakref.WeakKeyDictionary()
+    default_sweep_processes = sweep_processes
+    # Trace file of each new network, see _trace_network
+    if trace_dir is not None:
+        os.makedirs(trace_dir, exist_ok=True)
+    trace_files = None if trace_dir is None else (
+        os.path.join(trace_dir, f"network_{serial}.txt") for serial in itertools.count())
 
     # edit_type 
     # 1Increase capacity 2Decrease capacity 3Create a new node 4Delete a node 5Create a new road 6Delete a road 7Decrease fftt 8Increase fftt
@@ -671,22 +1413,36 @@ if __name__ == '__main__':
 
     # Initialize the Net 
     network = PyNetwork()
-    # data_path = "mini_data" # mini batch data for case study
-    # data_path = "data" # SiouxFalls dataset
-    # data_path = "data_EasternMassachusetts"
-    data_path = parse_args()
+    network.solver_mode = solver_mode
+    network.warm_start = warm_start
+    if solver_config is not None:
+        network.solver_config = solver_config
+    _trace_network(network)
 
     # Update the file paths to your data files
     network.read_node(f"{data_path}/Nodes.txt")
     network.read_link(f"{data_path}/Links.txt")
     network.read_od_pairs(f"{data_path}/ODPairs.txt")
-    network.compute_path_bfs()
+    if path_file is not None:
+        network.read_path(path_file)
+    else:
+        network.load_paths(path_cache)
 
     # Run the solution algorithm
     network.LogitSUE()
     _global_info_set(-1)
     _update_global_links_info()
 
+
+if __name__ == '__main__':
+    # data_path = "mini_data" # mini batch data for case study
+    # data_path = "data" # SiouxFalls dataset
+    # data_path = "data_EasternMassachusetts"
+    (data_path, solver_mode, warm_start, demand_encoding, solve_workers, sweep_processes,
+     path_cache, path_file, solver_config, trace_dir) = parse_args()
+    init_networks(data_path, solver_mode, warm_start, solve_workers, sweep_processes, path_cache, path_file,
+                  solver_config, trace_dir)
+
     # Run backend
     # app.run(debug=True, port=8081)
     app.run(port=8081)
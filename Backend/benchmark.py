@@ -0,0 +1,296 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+import app
+from Network import PyNetwork
+
+# Bundled datasets benchmarked by default
+DATASETS = ["mini_data", "data", "data_EasternMassachusetts"]
+
+
+def write_grid(data_path, side, od_span=4, od_ratio=0.1, seed=0):
+    """
+    Write a synthetic side x side grid network in the dataset file format
+
+        - data_path: Folder to write Nodes.txt, Links.txt and ODPairs.txt to
+        - side: Number of nodes per row and column
+        - od_span: Maximum number of grid steps between the origin and destination of an OD pair.
+          The path search enumerates paths, so OD pairs stay local to keep it bounded on large grids
+        - od_ratio: Number of OD pairs per node
+        - seed: Seed of the segment attributes and OD pairs
+
+    Every pair of neighbouring nodes is connected in both directions.
+    """
+    rnd = random.Random(seed)
+    os.makedirs(data_path, exist_ok=True)
+    with open(os.path.join(data_path, "Nodes.txt"), "w") as f:
+        for node in range(side * side):
+            row, col = divmod(node, side)
+            f.write(f"{node + 1}\t{col}\t{row}\t{43.5 + 0.01 * row:.6f}\t{-96.8 + 0.01 * col:.6f}\n")
+
+    with open(os.path.join(data_path, "Links.txt"), "w") as f:
+        for node in range(side * side):
+            row, col = divmod(node, side)
+            neighbors = []
+            if col + 1 < side:
+                neighbors.append(node + 1)
+            if row + 1 < side:
+                neighbors.append(node + side)
+            for neighbor in neighbors:
+                fftt = rnd.choice([2, 3, 4, 5, 6])
+                capacity = rnd.choice([2000, 5000, 10000])
+                f.write(f"{node + 1}\t{neighbor + 1}\t{fftt}\t{capacity}\n")
+                f.write(f"{neighbor + 1}\t{node + 1}\t{fftt}\t{capacity}\n")
+
+    od_pairs = set()
+    n_od_pairs = max(1, int(side * side * od_ratio))
+    while len(od_pairs) < n_od_pairs:
+        row, col = rnd.randrange(side), rnd.randrange(side)
+        d_row = min(max(row + rnd.randint(-od_span, od_span), 0), side - 1)
+        d_col = min(max(col + rnd.randint(-od_span, od_span), 0), side - 1)
+        if (row, col) != (d_row, d_col):
+            od_pairs.add((row * side + col, d_row * side + d_col))
+    with open(os.path.join(data_path, "ODPairs.txt"), "w") as f:
+        for origin, destination in sorted(od_pairs):
+            f.write(f"{origin + 1}\t{destination + 1}\t{rnd.randint(50, 500)}\n")
+
+
+class Benchmark:
+    """
+    Runs the benchmark steps and collects their measurements
+
+    Attributes:
+        - trace_memory: Whether the peak memory of each step is measured with tracemalloc
+        - datasets: Size of each dataset (nodes, links, OD pairs, paths)
+        - results: One dict per step, see run
+    """
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.datasets = {}
+        self.results = []
+
+    def run(self, dataset, step, func, network=None):
+        """
+        Run one step with its output silenced and record it
+
+            - dataset: Name of the dataset
+            - step: Name of the step
+            - func: The step, may return a Flask response to record its payload size
+            - network: Network whose solve iterations are reported, if the step solves it
+
+        Return:
+            - Return value of func, None if it raised
+        """
+        alg_cnt = network.alg_cnt if network is not None else 0
+        if self.trace_memory:
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+        result = {"dataset": dataset, "step": step}
+        value = None
+        begtime = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                value = func()
+        except Exception as e:
+            result["error"] = repr(e)
+        result["wallTime"] = time.perf_counter() - begtime
+        if self.trace_memory:
+            result["peakMemory"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        if network is not None and network.alg_cnt > alg_cnt:
+            result["iterations"] = network.solve_report["iterations"]
+        if hasattr(value, "get_data"):
+            result["payloadBytes"] = len(value.get_data())
+            if value.status_code != 200:
+                result["error"] = f"HTTP {value.status_code}"
+        self.results.append(result)
+        print(f"{dataset:>28} {step:<24} {result['wallTime']:9.3f}s {result.get('error', '')}", file=sys.stderr)
+        return value
+
+
+def bench_network(bench, dataset, data_path, solvers, floyd_max_nodes):
+    """
+    Benchmark the readers, the path search, the solvers and the shortest path backends
+    """
+    tmpNetwork = PyNetwork()
+    bench.run(dataset, "read_node", lambda: tmpNetwork.read_node(f"{data_path}/Nodes.txt"))
+    bench.run(dataset, "read_link", lambda: tmpNetwork.read_link(f"{data_path}/Links.txt"))
+    bench.run(dataset, "read_od_pairs", lambda: tmpNetwork.read_od_pairs(f"{data_path}/ODPairs.txt"))
+    bench.run(dataset, "compute_path_bfs", tmpNetwork.compute_path_bfs)
+    bench.datasets[dataset] = {"nodes": tmpNetwork.m_n_node, "links": tmpNetwork.m_n_link,
+                               "odPairs": tmpNetwork.m_n_od_pairs, "paths": tmpNetwork.m_n_path}
+    with tempfile.TemporaryDirectory() as path_cache:
+        bench.run(dataset, "save_path_cache", lambda: tmpNetwork.save_path_cache(path_cache))
+        bench.run(dataset, "load_path_cache", lambda: tmpNetwork.load_path_cache(path_cache))
+
+    for solver_mode in solvers:
+        tmpNetwork.solver_mode = solver_mode
+        bench.run(dataset, f"LogitSUE[{solver_mode}]", tmpNetwork.LogitSUE, tmpNetwork)
+
+    travel_time = tmpNetwork.m_link.travel_time
+    in_node, out_node = tmpNetwork.m_link.in_node_ids(), tmpNetwork.m_link.out_node_ids()
+    tmpNetwork.shortest_path_backend = "dijkstra"
+    bench.run(dataset, "dijkstra", lambda: tmpNetwork.get_od_shortest_cost(travel_time, in_node, out_node))
+    if tmpNetwork.m_n_node <= floyd_max_nodes:
+        tmpNetwork.shortest_path_backend = "floyd"
+        bench.run(dataset, "floyd_algorithm", lambda: tmpNetwork.get_od_shortest_cost(travel_time, in_node, out_node))
+        tmpNetwork.node_distance_matrix = np.array([])
+
+
+def bench_endpoints(bench, dataset, data_path, solver_mode):
+    """
+    Benchmark the Flask edit endpoints on a duplicate of the initial network, then the data endpoints
+    """
+    bench.run(dataset, "init_networks", lambda: app.init_networks(data_path, solver_mode))
+    client = app.app.test_client()
+    bench.run(dataset, "/data/duplicate", lambda: client.get("/data/duplicate?originIdx=-1"))
+    tmpNetwork = app.network_layers[0]
+    link_table = tmpNetwork.m_link
+
+    # Attribute change of the segment with the largest free flow travel time
+    link_idx = int(np.argmax(link_table.free_flow_travel_time))
+    fftt = float(link_table.free_flow_travel_time[link_idx])
+    capacity = float(link_table.capacity[link_idx])
+    bench.run(dataset, "/data/linkReset", lambda: client.get(
+        f"/data/linkReset?networkIdx=0&linkIdx={link_idx}&freeFlowTravelTime={fftt * 1.5}&capacity={capacity / 2}"),
+        tmpNetwork)
+
+    # New two-way road between two nodes that are not connected, deleted again right after
+    connected = set(zip(link_table.in_node_ids().tolist(), link_table.out_node_ids().tolist()))
+    end_pt = next((node for node in range(tmpNetwork.m_n_node - 1, 0, -1) if (0, node) not in connected
+                   and (node, 0) not in connected), None)
+    if end_pt is not None:
+        bench.run(dataset, "/data/newLink", lambda: client.get(
+            f"/data/newLink?networkIdx=0&startPtId=0&endPtId={end_pt}&capacity={capacity}&freeFlowTravelTime={fftt}"
+            f"&iCapacity={capacity}&iFreeFlowTravelTime={fftt}&iExist=true"), tmpNetwork)
+        n_link = tmpNetwork.m_n_link
+        bench.run(dataset, "/data/delLink", lambda: client.get(
+            f"/data/delLink?networkIdx=0&linksIdx=[{n_link - 2},{n_link - 1}]"), tmpNetwork)
+
+    # New node in the middle of the segment and its opposite, deleted again right after
+    in_node, out_node = tmpNetwork.m_link[link_idx].p_in_node, tmpNetwork.m_link[link_idx].p_out_node
+    link_b_idx = next((link for link in out_node.outgoing_link
+                       if tmpNetwork.m_link[link].p_out_node == in_node), -1)
+    a_fftt = float(tmpNetwork.m_link[link_idx].free_flow_travel_time) / 2
+    b_fftt = float(tmpNetwork.m_link[link_b_idx].free_flow_travel_time) / 2 if link_b_idx != -1 else -1
+    bench.run(dataset, "/data/newNode", lambda: client.get(
+        f"/data/newNode?networkIdx=0&nodeLat={(in_node.lat + out_node.lat) / 2}&nodeLng={(in_node.lon + out_node.lon) / 2}"
+        f"&formerLinkA={link_idx}&aFFTT=[{a_fftt},{a_fftt}]&formerLinkB={link_b_idx}&bFFTT=[{b_fftt},{b_fftt}]"),
+        tmpNetwork)
+    bench.run(dataset, "/data/delNode", lambda: client.get(
+        f"/data/delNode?networkIdx=0&nodeIdx={tmpNetwork.m_n_node - 1}"), tmpNetwork)
+
+    bench.run(dataset, "/data/all", lambda: client.get("/data/all"))
+    bench.run(dataset, "/data/global/all", lambda: client.get("/data/global/all"))
+
+
+def git_commit():
+    """
+    Commit of the working tree, None outside of a git checkout
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(base_path, new_path):
+    """
+    Print the wall time of every step of two benchmark reports side by side
+    """
+    with open(base_path) as f:
+        base = {(r["dataset"], r["step"]): r for r in json.load(f)["results"]}
+    with open(new_path) as f:
+        new = json.load(f)["results"]
+    print(f"{'dataset':>28} {'step':<24} {'base':>9} {'new':>9} {'ratio':>7}")
+    for result in new:
+        base_result = base.get((result["dataset"], result["step"]))
+        if base_result is None:
+            continue
+        ratio = result["wallTime"] / base_result["wallTime"] if base_result["wallTime"] > 0 else float("inf")
+        print(f"{result['dataset']:>28} {result['step']:<24} {base_result['wallTime']:9.3f} "
+              f"{result['wallTime']:9.3f} {ratio:7.2f}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the solver and the API hot paths.")
+    parser.add_argument("--datasets", nargs="*", default=DATASETS,
+                        help="Bundled dataset folders to benchmark.")
+    parser.add_argument("--grid", nargs="*", type=int, default=[10],
+                        help="Sides of the synthetic grids to benchmark, 100 gives 10k nodes.")
+    parser.add_argument("--solvers", nargs="*", default=["loop", "vectorized"], choices=["loop", "vectorized"],
+                        help="LogitSUE implementations to benchmark, the first one is used by the endpoints.")
+    parser.add_argument("--floyd-max-nodes", type=int, default=2000,
+                        help="Skip the Floyd backend on larger networks (it needs n^2 memory and n^3 time).")
+    parser.add_argument("--no-endpoints", action="store_true", help="Skip the Flask endpoints.")
+    parser.add_argument("--demand-encoding", type=str, default="dense", choices=["dense", "sparse"],
+                        help="Encoding of the segment demands in the responses, dense payloads grow with "
+                             "segments x nodes, so use sparse on large grids.")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="Do not trace the peak memory, tracing slows down Python-heavy steps.")
+    parser.add_argument("--output", type=str, default=None, help="Write the JSON report to this file.")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="Compare two JSON reports and exit.")
+    parser.add_argument("--write-grid", nargs=2, metavar=("SIDE", "FOLDER"),
+                        help="Only write a synthetic grid dataset to FOLDER and exit.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.write_grid:
+        write_grid(args.write_grid[1], int(args.write_grid[0]))
+        return
+
+    app.demand_encoding = args.demand_encoding
+    backend_path = os.path.dirname(os.path.abspath(__file__))
+    bench = Benchmark(trace_memory=not args.no_memory)
+    with tempfile.TemporaryDirectory() as grid_root:
+        data_paths = [(dataset, os.path.join(backend_path, dataset)) for dataset in args.datasets]
+        for side in args.grid:
+            grid_path = os.path.join(grid_root, f"grid_{side}x{side}")
+            write_grid(grid_path, side)
+            data_paths.append((f"grid_{side}x{side}", grid_path))
+
+        for dataset, data_path in data_paths:
+            bench_network(bench, dataset, data_path, args.solvers, args.floyd_max_nodes)
+            if not args.no_endpoints:
+                bench_endpoints(bench, dataset, data_path, args.solvers[0])
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "memoryTraced": bench.trace_memory,
+            "argv": sys.argv[1:],
+        },
+        "datasets": bench.datasets,
+        "results": bench.results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1)
+    else:
+        print(json.dumps(report, indent=1))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import argparse
+import json
+import os
+import time
+
+from Network import PyNetwork
+from Scenarios import invalid_edit, solve_scenarios, link_criticality
+from SolverConfig import PySolverConfig, step_rules
+
+
+def load_network(data_path, solver_mode, path_cache=None, solver_config=None):
+    """
+    Read and solve a dataset, as the initial network of the server
+    """
+    network = PyNetwork()
+    network.solver_mode = solver_mode
+    if solver_config is not None:
+        network.solver_config = solver_config
+    network.read_node(f"{data_path}/Nodes.txt")
+    network.read_link(f"{data_path}/Links.txt")
+    network.read_od_pairs(f"{data_path}/ODPairs.txt")
+    network.load_paths(path_cache)
+    network.LogitSUE()
+    return network
+
+
+def closure_scenarios(network, count):
+    """
+    One scenario per closure of the `count` segments with the most flow
+    """
+    busiest = sorted(range(network.m_n_link), key=lambda link_id: -network.links_flow[link_id])[:count]
+    return [[{"edit": "delLink", "linksIdx": [link_id]}] for link_id in busiest]
+
+
+def capacity_scenarios(network, count, factor):
+    """
+    One scenario per capacity change by `factor` of the `count` segments with the most flow
+    """
+    busiest = sorted(range(network.m_n_link), key=lambda link_id: -network.links_flow[link_id])[:count]
+    return [[{"edit": "linkReset", "linkIdx": link_id,
+              "freeFlowTravelTime": float(network.m_link[link_id].free_flow_travel_time),
+              "capacity": float(network.m_link[link_id].capacity) * factor}] for link_id in busiest]
+
+
+def run_sweep(network, edit_sets, processes):
+    """
+    Solve the scenarios and summarize each of them
+
+    Return:
+        - Wall time of the sweep and one summary dict per scenario
+    """
+    begtime = time.time()
+    results = solve_scenarios(network, edit_sets, processes)
+    wall_time = time.time() - begtime
+    return wall_time, [{
+        "edits": edits,
+        "costSum": scenario.cost_sum,
+        "avgFlow": scenario.avg_flow,
+        "avgSpeed": scenario.avg_speed,
+        "changed": new_edits is not None,
+        "solveReport": scenario.solve_report,
+        "seconds": seconds
+    } for edits, (scenario, new_edits, seconds) in zip(edit_sets, results)]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Solve what-if scenarios of a network in parallel.")
+    parser.add_argument("--dataset", type=str, default="data", help="Dataset folder of the base network.")
+    parser.add_argument("--solver", type=str, default="loop", choices=["loop", "vectorized"],
+                        help="LogitSUE implementation.")
+    parser.add_argument("--step-rule", type=str, default="adaptive", choices=list(step_rules),
+                        help="LogitSUE step rule: successive averages, the self-regulated average or Barzilai-Borwein.")
+    parser.add_argument("--rel-gap", type=float, default=0.0,
+                        help="Stop every solve once NormD is below this fraction of the norm of the segment flows.")
+    parser.add_argument("--max-iterations", type=int, default=0, help="Stop every solve after this many iterations.")
+    parser.add_argument("--time-budget", type=float, default=0.0, help="Stop every solve after this many seconds.")
+    parser.add_argument("--edits", type=str, default=None,
+                        help="JSON file with one list of edits per scenario, as for /data/batch.")
+    parser.add_argument("--closures", type=int, default=0,
+                        help="Add one scenario per closure of the N segments with the most flow.")
+    parser.add_argument("--capacity", nargs=2, metavar=("N", "FACTOR"), default=None,
+                        help="Add one scenario per capacity change by FACTOR of the N segments with the most flow.")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(),
+                        help="Worker processes, 0 solves the scenarios one after another.")
+    parser.add_argument("--serial", action="store_true",
+                        help="Also solve the scenarios one after another and report the speedup.")
+    parser.add_argument("--criticality", type=str, default=None, choices=["remove", "halve"],
+                        help="Instead of scenarios, rank all segments by the impact of closing them or of "
+                             "halving their capacity.")
+    parser.add_argument("--top", type=int, default=20, help="Number of segments printed by --criticality.")
+    parser.add_argument("--output", type=str, default=None, help="Write the JSON report to this file.")
+    parser.add_argument("--path-cache", type=str, default=".path_cache",
+                        help="Folder of the enumerated path sets, shared with the server.")
+    parser.add_argument("--no-path-cache", action="store_true", help="Always enumerate the paths.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    backend_path = os.path.dirname(os.path.abspath(__file__))
+    path_cache = None if args.no_path_cache else os.path.join(backend_path, args.path_cache)
+    solver_config = PySolverConfig(args.step_rule, args.rel_gap, args.max_iterations, args.time_budget)
+    network = load_network(os.path.join(backend_path, args.dataset), args.solver, path_cache, solver_config)
+
+    if args.criticality:
+        begtime = time.time()
+        rows = link_criticality(network, args.criticality, args.processes)
+        report = {"dataset": args.dataset, "mode": args.criticality, "baseCostSum": network.cost_sum,
+                  "processes": args.processes, "wallTime": time.time() - begtime, "links": rows}
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=1)
+        for row in rows[:args.top]:
+            print(f"{row['linkIdx']:6d}  flow {row['flow']:10.1f}  cost {row.get('costSumChange', float('nan')):+14.1f}"
+                  f"  speed {row.get('avgSpeedChange', float('nan')):+.4f}"
+                  f"  disconnected OD pairs {row.get('disconnectedOdPairs', 0)}  {row.get('error', '')}")
+        print(f"{len(rows)} segments in {report['wallTime']:.1f} s")
+        return
+
+    edit_sets = []
+    if args.edits:
+        with open(args.edits) as f:
+            edit_sets.extend(json.load(f))
+    if args.closures > 0:
+        edit_sets.extend(closure_scenarios(network, args.closures))
+    if args.capacity:
+        edit_sets.extend(capacity_scenarios(network, int(args.capacity[0]), float(args.capacity[1])))
+    for edits in edit_sets:
+        if invalid_edit(edits) is not None:
+            raise SystemExit(f"invalid edit {invalid_edit(edits)}")
+
+    wall_time, scenarios = run_sweep(network, edit_sets, args.processes)
+    report = {"dataset": args.dataset, "baseCostSum": network.cost_sum, "processes": args.processes,
+              "wallTime": wall_time, "scenarios": scenarios}
+    if args.serial:
+        report["serialWallTime"] = run_sweep(network, edit_sets, 0)[0]
+        report["speedup"] = report["serialWallTime"] / wall_time
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1)
+    else:
+        print(json.dumps(report, indent=1))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,8 @@ import { defineStore } from 'pinia'
 import axios from 'axios'
 
 const backend_url = 'http://localhost:8081'
+// 编辑路段时只请求变化的路段, 相对变化小于该值的数值不再重复发送
+const delta_tolerance = 1e-4
 
 interface tsNode {
   lat: number
@@ -41,6 +43,37 @@ interface tsNetwork {
   avgSpeed: number
   costSum: number
   editLog: tsEditLog[]
+  snapshot?: number
+}
+
+// One edit of /data/batch, with the query arguments of its own endpoint
+interface tsBatchEdit {
+  edit: 'newLink' | 'delLink' | 'newNode' | 'delNode' | 'linkReset'
+  [arg: string]: unknown
+}
+
+// One road of the /data/criticality ranking
+interface tsLinkCriticality {
+  linkIdx: number
+  globalId: number
+  flow: number
+  capacity: number
+  costSum?: number
+  costSumChange?: number
+  avgSpeed?: number
+  avgSpeedChange?: number
+  disconnectedOdPairs?: number
+  iterations?: number
+  seconds?: number
+  error?: string
+}
+
+interface reqNetworkDelta {
+  delta: boolean
+  snapshot: number
+  links: (tsLink & { ID: number })[]
+  linkCount: number
+  linkRemap: number[] | null
 }
 
 interface reqLinksGlobalInfo {
@@ -74,6 +107,14 @@ interface reqGlobalInfo {
   nodesPos: number[][]
 }
 
+export interface tsLinksFrame {
+  networks: number[]
+  versions: number[]
+  shape: number[]
+  // 每个指标一个 [network, global link] 的 Float32Array 视图, 没有该路段的网络为 NaN
+  columns: Record<string, Float32Array>
+}
+
 export interface networkEditNumber {
   edit_links_len: number,
   new_tunnel_num: number,
@@ -797,7 +838,8 @@ export const useNetworksData = defineStore('networksInfo', {
             avgFlow: network_data_req[i].avgFlow,
             avgSpeed: network_data_req[i].avgSpeed,
             editLog: network_data_req[i].editLog,
-            costSum: network_data_req[i].costSum
+            costSum: network_data_req[i].costSum,
+            snapshot: network_data_req[i].snapshot
           })
           // console.log('cost_sum: ', network_data_req[i].costSum)
 
@@ -811,6 +853,33 @@ export const useNetworksData = defineStore('networksInfo', {
         console.log('Network Data Initialization Error: ', error)
       }
     },
+    async linksFrameGet(stats?: string[]) {
+      // 以二进制列格式获取所有网络按 global link 对齐的路段数值, 直接在 ArrayBuffer 上建立视图
+      try {
+        const response = await axios.get(backend_url + '/data/global/frame', {
+          params: { stats: stats ? stats.join(',') : undefined },
+          responseType: 'arraybuffer'
+        })
+        const buffer = response.data as ArrayBuffer
+        const header_len = new DataView(buffer).getUint32(0, true)
+        const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 4, header_len)))
+        const data_start = 4 + header_len
+        const column_len = header.shape[0] * header.shape[1]
+        const columns = {} as Record<string, Float32Array>
+        for (const column of header.columns as { name: string; offset: number }[]) {
+          columns[column.name] = new Float32Array(buffer, data_start + column.offset, column_len)
+        }
+        return {
+          networks: header.networks,
+          versions: header.versions,
+          shape: header.shape,
+          columns: columns
+        } as tsLinksFrame
+      } catch (error) {
+        console.log('Links Frame Get Error: ', error)
+      }
+      return null
+    },
     async originNetworkCenter() {
       const center_req = await axios.get(backend_url + '/network/center') as {data: {lat: number, lon: number}}
       return center_req.data
@@ -836,6 +905,26 @@ export const useNetworksData = defineStore('networksInfo', {
       }
       this.networksInfoArr[network_idx].links = tmp_layers_links
     },
+    linksDeltaSet(network_idx: number, req_layer_info: reqNetworkDelta) {
+      // 增量响应只包含变化的路段, 按ID合并到已有的路段中
+      if (!req_layer_info.delta) {
+        this.linksInfoSet(network_idx, req_layer_info.links)
+      } else {
+        // 删除路段后, linkRemap给出每条旧路段的新ID (-1为已删除), 保留的路段移到新ID上
+        let former_links = this.networksInfoArr[network_idx].links
+        if (req_layer_info.linkRemap) {
+          const remap = req_layer_info.linkRemap
+          former_links = former_links.filter((_, i) => i < remap.length && remap[i] >= 0)
+        }
+        const tmp_layers_links = former_links.slice(0, req_layer_info.linkCount)
+        const changed_links = this.req_links_to_links(req_layer_info.links)
+        for (let j = 0; j < changed_links.length; j++) {
+          tmp_layers_links[req_layer_info.links[j].ID] = changed_links[j]
+        }
+        this.networksInfoArr[network_idx].links = tmp_layers_links
+      }
+      this.networksInfoArr[network_idx].snapshot = req_layer_info.snapshot
+    },
     async newLink(
       network_idx: number,
       start_pt_id: number,
@@ -856,13 +945,14 @@ export const useNetworksData = defineStore('networksInfo', {
             freeFlowTravelTime: free_flow_travel_time,
             iCapacity: i_capacity,
             iFreeFlowTravelTime: i_free_flow_travel_time,
-            iExist: iExist
+            iExist: iExist,
+            since: this.networksInfoArr[network_idx].snapshot,
+            tolerance: delta_tolerance
           }
         })
         await this.globalInfoGet()
         const req_layer_info = response.data as tsNetwork
-        const req_layer_links = req_layer_info.links
-        this.linksInfoSet(network_idx, req_layer_links)
+        this.linksDeltaSet(network_idx, response.data as reqNetworkDelta)
         this.networksInfoArr[network_idx].avgFlow = req_layer_info.avgFlow
         this.networksInfoArr[network_idx].editLog = req_layer_info.editLog
         this.networksInfoArr[network_idx].avgSpeed = req_layer_info.avgSpeed
@@ -878,13 +968,14 @@ export const useNetworksData = defineStore('networksInfo', {
         const response = await axios.get(backend_url + '/data/delLink', {
           params: {
             networkIdx: network_idx - 1,
-            linksIdx: links_id_to_del
+            linksIdx: links_id_to_del,
+            since: this.networksInfoArr[network_idx].snapshot,
+            tolerance: delta_tolerance
           }
         })
         await this.globalInfoGet()
         const req_layer_info = response.data as tsNetwork
-        const req_layer_links = req_layer_info.links
-        this.linksInfoSet(network_idx, req_layer_links)
+        this.linksDeltaSet(network_idx, response.data as reqNetworkDelta)
         this.networksInfoArr[network_idx].avgFlow = req_layer_info.avgFlow
         this.networksInfoArr[network_idx].avgSpeed = req_layer_info.avgSpeed
         this.networksInfoArr[network_idx].editLog = req_layer_info.editLog
@@ -907,13 +998,14 @@ export const useNetworksData = defineStore('networksInfo', {
             networkIdx: network_idx - 1,
             capacity: capacity,
             freeFlowTravelTime: free_flow_travel_time,
-            linkIdx: link_idx
+            linkIdx: link_idx,
+            since: this.networksInfoArr[network_idx].snapshot,
+            tolerance: delta_tolerance
           }
         })
         await this.globalInfoGet()
         const req_layer_info = response.data as tsNetwork
-        const req_layer_links = req_layer_info.links
-        this.linksInfoSet(network_idx, req_layer_links)
+        this.linksDeltaSet(network_idx, response.data as reqNetworkDelta)
         this.networksInfoArr[network_idx].avgFlow = req_layer_info.avgFlow
         this.networksInfoArr[network_idx].avgSpeed = req_layer_info.avgSpeed
         this.networksInfoArr[network_idx].editLog = req_layer_info.editLog
@@ -973,7 +1065,8 @@ export const useNetworksData = defineStore('networksInfo', {
           avgFlow: req_network.avgFlow,
           avgSpeed: req_network.avgSpeed,
           editLog: req_network.editLog,
-          costSum: req_network.costSum
+          costSum: req_network.costSum,
+          snapshot: req_network.snapshot
         }
         this.update_links_global_info()
         return req_network.id
@@ -1003,7 +1096,8 @@ export const useNetworksData = defineStore('networksInfo', {
           avgFlow: req_network.avgFlow,
           avgSpeed: req_network.avgSpeed,
           editLog: req_network.editLog,
-          costSum: req_network.costSum
+          costSum: req_network.costSum,
+          snapshot: req_network.snapshot
         }
         this.update_links_global_info()
         return req_network.id
@@ -1012,6 +1106,41 @@ export const useNetworksData = defineStore('networksInfo', {
       }
       return -1
     },
+    async batchEdit(networkIdx: number, edits: tsBatchEdit[]) {
+      // Apply all edits with a single re-solve
+      try {
+        const response = await axios.get(backend_url + '/data/batch', {
+          params: {
+            networkIdx: networkIdx - 1,
+            edits: JSON.stringify(edits)
+          }
+        })
+        if (response.data.static === 0) {
+          console.log('Batch Edit Error', response.data.result)
+          return -1
+        }
+        await this.globalInfoGet()
+        const req_network = response.data as tsNetwork
+        this.networksInfoArr[networkIdx] = {
+          id: req_network.id,
+          title: req_network.title,
+          desc: req_network.desc,
+          father: req_network.father,
+          nodes: this.req_nodes_to_nodes(req_network.nodes),
+          links: this.req_links_to_links(req_network.links),
+          avgFlow: req_network.avgFlow,
+          avgSpeed: req_network.avgSpeed,
+          editLog: req_network.editLog,
+          costSum: req_network.costSum,
+          snapshot: req_network.snapshot
+        }
+        this.update_links_global_info()
+        return req_network.id
+      } catch (error) {
+        console.log('Batch Edit Error', error)
+      }
+      return -1
+    },
     async networkDuplicate(origin_network_idx: number) {
       // 复制网络内容
       try {
@@ -1031,7 +1160,8 @@ export const useNetworksData = defineStore('networksInfo', {
           avgFlow: req_duplicate_network.avgFlow,
           avgSpeed: req_duplicate_network.avgSpeed,
           editLog: req_duplicate_network.editLog,
-          costSum: req_duplicate_network.costSum
+          costSum: req_duplicate_network.costSum,
+          snapshot: req_duplicate_network.snapshot
         }
         this.networksInfoArr.push(network_to_add)
         this.networksAsFilter.push(true)
@@ -1042,6 +1172,64 @@ export const useNetworksData = defineStore('networksInfo', {
       }
       return -1
     },
+    async scenarioSweep(origin_network_idx: number, edit_sets: tsBatchEdit[][]) {
+      // Solve every scenario on the server in parallel, each one becomes a child network
+      try {
+        const response = await axios.get(backend_url + '/data/sweep', {
+          params: {
+            originIdx: origin_network_idx - 1,
+            editSets: JSON.stringify(edit_sets)
+          }
+        })
+        if (response.data.static === 0) {
+          console.log('Scenario Sweep Error', response.data.result)
+          return []
+        }
+        await this.globalInfoGet()
+        const req_networks = response.data as tsNetwork[]
+        for (const req_network of req_networks) {
+          this.networksInfoArr.push({
+            id: req_network.id,
+            title: req_network.title,
+            desc: req_network.desc,
+            father: req_network.father,
+            nodes: this.req_nodes_to_nodes(req_network.nodes),
+            links: this.req_links_to_links(req_network.links),
+            avgFlow: req_network.avgFlow,
+            avgSpeed: req_network.avgSpeed,
+            editLog: req_network.editLog,
+            costSum: req_network.costSum,
+            snapshot: req_network.snapshot
+          })
+          this.networksAsFilter.push(true)
+          this.networksFatherIdx.push(req_network.father)
+        }
+        this.update_links_global_info()
+        return req_networks.map((req_network) => req_network.id)
+      } catch (error) {
+        console.log('Scenario Sweep Error', error)
+      }
+      return []
+    },
+    async linkCriticality(network_idx: number, mode: 'remove' | 'halve' = 'remove') {
+      // Roads ranked by the impact of closing them or of halving their capacity, most critical first
+      try {
+        const response = await axios.get(backend_url + '/data/criticality', {
+          params: {
+            networkIdx: network_idx - 1,
+            mode: mode
+          }
+        })
+        if (response.data.static === 0) {
+          console.log('Link Criticality Error', response.data.result)
+          return []
+        }
+        return response.data.links as tsLinkCriticality[]
+      } catch (error) {
+        console.log('Link Criticality Error', error)
+      }
+      return []
+    },
     async networkDelete(network_idx: number) {
       if (network_idx == 0) {
         return